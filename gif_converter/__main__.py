@@ -0,0 +1,8 @@
+"""Entry point for ``python -m gif_converter`` (headless conversion)"""
+
+import sys
+
+from gif_converter.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,320 @@
+"""Command-line interface for headless GIF conversion
+
+Examples:
+    python -m gif_converter input.mp4 -o out.gif
+    python -m gif_converter input.mp4@0:10-0:25,1:02-1:08 -o merged.gif --preset small
+    python -m gif_converter a.mp4 b.mp4 --range 5-12 --output-dir gifs/ --preset tiny
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import shutil
+import sys
+import uuid
+from dataclasses import replace
+from typing import Dict, List, Optional
+
+from gif_converter.models.media import (
+    MediaFile,
+    Segment,
+    GifExportProfile,
+    ExportMode,
+    GIF_PRESETS,
+)
+from gif_converter.ffmpeg.engine import ExportEngine, GifExportTask
+from gif_converter.ffmpeg.batch import BatchRunner, build_batch_tasks, DEFAULT_NAME_TEMPLATE
+from gif_converter.ffmpeg.cache import default_cache_dir, default_frame_store_dir
+from gif_converter.ffmpeg.utils import crop_sample_times, detect_crop, probe_keyframes, probe_media_info, format_size_mb
+
+# "START-END" with times in seconds, MM:SS or HH:MM:SS (fractions allowed)
+_TIME = r"\d+(?::\d+){0,2}(?:\.\d+)?"
+_RANGE_RE = re.compile(rf"^({_TIME})-({_TIME})$")
+
+_MODES = {
+    "single": ExportMode.SINGLE_SEGMENT,
+    "full": ExportMode.FULL_VIDEO,
+    "merged": ExportMode.MERGED_SEGMENTS,
+    "batch": ExportMode.BATCH,
+}
+
+
+def parse_time(text: str) -> float:
+    """Parse seconds, MM:SS or HH:MM:SS into seconds"""
+    seconds = 0.0
+    for part in text.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def parse_ranges(text: str) -> List[tuple[float, float]]:
+    """Parse a comma-separated list of START-END ranges"""
+    ranges = []
+    for item in text.split(","):
+        match = _RANGE_RE.match(item.strip())
+        if not match:
+            raise ValueError(f"invalid time range {item!r} (expected START-END)")
+        start, end = parse_time(match.group(1)), parse_time(match.group(2))
+        if end <= start:
+            raise ValueError(f"time range {item!r} ends before it starts")
+        ranges.append((start, end))
+    return ranges
+
+
+def split_input(arg: str) -> tuple[str, Optional[str]]:
+    """Split "path@ranges" into path and range text; plain paths have no ranges"""
+    path, sep, ranges = arg.rpartition("@")
+    if sep and ranges and all(_RANGE_RE.match(r.strip()) for r in ranges.split(",")):
+        return path, ranges
+    return arg, None
+
+
+def find_preset(name: str) -> GifExportProfile:
+    """Look up a preset by its full name or a case-insensitive prefix (e.g. "tiny")"""
+    if name in GIF_PRESETS:
+        return GIF_PRESETS[name]
+    wanted = name.casefold()
+    for key, preset in GIF_PRESETS.items():
+        if key.casefold().startswith(wanted):
+            return preset
+    raise ValueError(f"unknown preset {name!r} (choose from: {', '.join(GIF_PRESETS)})")
+
+
+def find_binary(name: str, explicit: Optional[str]) -> str:
+    """Locate an FFmpeg binary: explicit path, next to the project, or on PATH"""
+    if explicit:
+        return explicit
+    suffix = ".exe" if os.name == "nt" else ""
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for directory in (os.getcwd(), project_dir):
+        candidate = os.path.join(directory, name + suffix)
+        if os.path.isfile(candidate):
+            return candidate
+    return shutil.which(name) or name
+
+
+def detect_crops(ffmpeg: str, files: List[MediaFile], segments: List[Segment]) -> Dict[str, str]:
+    """Scan every input once for black bars, over its ranges (or the whole file), so batch jobs share the result"""
+    crops = {}
+    for media_file in files:
+        spans = [(seg.start, seg.end) for seg in segments if seg.file_id == media_file.id]
+        if not spans and media_file.info:
+            spans = [(0.0, media_file.info.duration)]
+        crop = detect_crop(ffmpeg, media_file.path, crop_sample_times(spans))
+        if crop is not None:
+            crops[media_file.id] = crop
+    return crops
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m gif_converter",
+        description="Convert videos to GIFs without starting the GUI.",
+        epilog="Inputs may carry their own ranges: clip.mp4@0:10-0:25,1:02-1:08",
+    )
+    parser.add_argument("inputs", nargs="+", metavar="INPUT[@RANGES]", help="video files to convert")
+    parser.add_argument("-o", "--output", help="output GIF (single, full and merged modes)")
+    parser.add_argument("--output-dir", help="output directory (batch mode)")
+    parser.add_argument("--name-template", default=DEFAULT_NAME_TEMPLATE,
+                        help="batch file name template (default: %(default)s)")
+    parser.add_argument("--shared-palette", action="store_true",
+                        help="batch mode: build one palette from all ranges and use it for every GIF")
+    parser.add_argument("-r", "--range", action="append", default=[], metavar="START-END",
+                        help="time range for inputs without their own ranges (repeatable)")
+    parser.add_argument("-m", "--mode", choices=sorted(_MODES),
+                        help="export mode (default: batch with --output-dir, else merged or full)")
+    parser.add_argument("-p", "--preset", default="Medium (<5MB)",
+                        help="preset name or prefix from: " + ", ".join(GIF_PRESETS))
+
+    settings = parser.add_argument_group("preset overrides")
+    settings.add_argument("--width", type=int, help="output width in pixels (0 = source)")
+    settings.add_argument("--fps", type=int)
+    settings.add_argument("--colors", type=int, choices=[32, 64, 128, 256])
+    settings.add_argument("--dither", choices=["none", "bayer", "sierra2_4a", "floyd_steinberg"])
+    settings.add_argument("--loop", type=int, help="0 = forever, -1 = play once, N = loop N times")
+    settings.add_argument("--speed", type=float)
+    settings.add_argument("--auto-crop", action="store_true", help="crop away black bars before scaling")
+    settings.add_argument("--reverse", action="store_true")
+    settings.add_argument("--boomerang", action="store_true")
+    settings.add_argument("--lossy", type=int)
+    settings.add_argument("--pipeline", choices=["fused", "stream", "files"])
+    settings.add_argument("--encoder", choices=["auto", "ffmpeg", "builtin"],
+                          help="GIF encoder (auto uses FFmpeg's; --lossy and --optimize-frames need builtin)")
+    settings.add_argument("--palette", choices=["palettegen", "sampled"], dest="palette_engine",
+                          help="palettegen reads every frame; sampled quantizes a fixed sample of "
+                               "frames in NumPy (fast for long videos)")
+    settings.add_argument("--segment-palettes", choices=["off", "on", "auto"],
+                          help="merged mode: one palette per range (auto keeps whichever GIF is smaller)")
+    settings.add_argument("--dedupe", nargs="?", type=int, const=12, dest="dedupe_threshold", metavar="THRESHOLD",
+                          help="drop near-duplicate frames and show the previous frame longer "
+                               "(default THRESHOLD: %(const)s)")
+    settings.add_argument("--optimize-frames", action="store_true",
+                          help="store only the pixels that change between frames")
+
+    runtime = parser.add_argument_group("runtime")
+    runtime.add_argument("-j", "--jobs", type=int, default=0,
+                         help="maximum concurrent FFmpeg processes (default: one per CPU core)")
+    runtime.add_argument("--reverse-memory", type=int, default=1024, metavar="MB",
+                         help="memory for frames held by --reverse/--boomerang (default: %(default)s)")
+    runtime.add_argument("--cache-dir", help="clip and palette cache directory")
+    runtime.add_argument("--no-cache", action="store_true", help="disable the clip and palette cache")
+    runtime.add_argument("--frame-store", nargs="?", const=default_frame_store_dir(), metavar="DIR",
+                         help="decode each range once to raw frames in DIR and export from there "
+                              "(needs NumPy; default DIR: %(const)s)")
+    runtime.add_argument("--frame-store-size", type=int, default=4096, metavar="MB",
+                         help="size cap of the frame store (default: %(default)s)")
+    runtime.add_argument("--ffmpeg", help="path to the ffmpeg executable")
+    runtime.add_argument("--ffprobe", help="path to the ffprobe executable")
+    runtime.add_argument("-v", "--verbose", action="store_true", help="print FFmpeg output")
+    runtime.add_argument("-q", "--quiet", action="store_true", help="only print errors")
+    return parser
+
+
+def build_profile(args: argparse.Namespace, mode: ExportMode) -> GifExportProfile:
+    """Apply command-line overrides to the chosen preset"""
+    profile = replace(find_preset(args.preset), export_mode=mode)
+    overrides = {
+        "fps": args.fps,
+        "colors": args.colors,
+        "dither": args.dither,
+        "loop_count": args.loop,
+        "speed_multiplier": args.speed,
+        "lossy_compression": args.lossy,
+        "pipeline": args.pipeline,
+        "encoder": args.encoder,
+        "palette_engine": args.palette_engine,
+        "dedupe_threshold": args.dedupe_threshold,
+        "segment_palettes": args.segment_palettes,
+    }
+    profile = replace(profile, **{k: v for k, v in overrides.items() if v is not None})
+    if args.width is not None:
+        profile = replace(profile, width=args.width or None)
+    if args.reverse:
+        profile = replace(profile, reverse=True)
+    if args.boomerang:
+        profile = replace(profile, boomerang=True)
+    if args.optimize_frames:
+        profile = replace(profile, optimize_frames=True)
+    if args.auto_crop:
+        profile = replace(profile, auto_crop=True)
+    return profile
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    ffmpeg = find_binary("ffmpeg", args.ffmpeg)
+    ffprobe = find_binary("ffprobe", args.ffprobe)
+
+    def log(line: str) -> None:
+        if args.verbose:
+            print(line, file=sys.stderr)
+
+    def progress(value: int, stage: str) -> None:
+        if not args.quiet and not args.verbose:
+            print(f"\r[{value:3d}%] {stage:<60}", end="", file=sys.stderr, flush=True)
+
+    # Resolve inputs and their segments
+    files: List[MediaFile] = []
+    segments: List[Segment] = []
+    try:
+        default_ranges = parse_ranges(",".join(args.range)) if args.range else []
+        for arg in args.inputs:
+            path, range_text = split_input(arg)
+            if not os.path.isfile(path):
+                parser.error(f"input not found: {path}")
+            media_file = MediaFile(id=str(uuid.uuid4()), path=path)
+            files.append(media_file)
+            ranges = parse_ranges(range_text) if range_text else default_ranges
+            for start, end in ranges:
+                segments.append(Segment.new(media_file.id, start, end, len(segments) + 1))
+        profile_mode = _MODES[args.mode] if args.mode else None
+        find_preset(args.preset)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if profile_mode is None:
+        if args.output_dir:
+            profile_mode = ExportMode.BATCH
+        elif segments:
+            profile_mode = ExportMode.MERGED_SEGMENTS if len(segments) > 1 else ExportMode.SINGLE_SEGMENT
+        else:
+            profile_mode = ExportMode.FULL_VIDEO
+
+    # Whole-file exports need the duration from ffprobe; the filter planner
+    # uses the media info when it is there, and files with segments get a
+    # keyframe index for their seeks
+    needs_probe = profile_mode == ExportMode.FULL_VIDEO or (profile_mode == ExportMode.BATCH and len(segments) < len(files))
+    seeked = {seg.file_id for seg in segments}
+    for media_file in files:
+        media_file.info = probe_media_info(ffprobe, media_file.path)
+        if media_file.info is None and needs_probe:
+            print(f"error: could not read media info for {media_file.path}", file=sys.stderr)
+            return 1
+        if media_file.info and media_file.id in seeked:
+            media_file.info.keyframes = probe_keyframes(ffprobe, media_file.path)
+
+    profile = build_profile(args, profile_mode)
+    cache_dir = None if args.no_cache else (args.cache_dir or default_cache_dir())
+    task_options = {
+        "max_workers": args.jobs,
+        "cache_dir": cache_dir,
+        "reverse_memory_mb": args.reverse_memory,
+        "frame_store_dir": args.frame_store,
+        "frame_store_mb": args.frame_store_size,
+        "source_info": {f.id: f.info for f in files if f.info},
+    }
+    if profile.auto_crop:
+        task_options["crop_filters"] = detect_crops(ffmpeg, files, segments)
+
+    if profile_mode == ExportMode.BATCH:
+        if not args.output_dir:
+            parser.error("batch mode needs --output-dir")
+        os.makedirs(args.output_dir, exist_ok=True)
+        tasks = build_batch_tasks(
+            ffmpeg, files, segments, profile, args.output_dir, args.name_template, **task_options
+        )
+        runner = BatchRunner(
+            tasks,
+            cpu_budget=args.jobs,
+            shared_palette=args.shared_palette,
+            on_progress=progress,
+            on_log=log,
+        )
+    else:
+        if not args.output:
+            parser.error("an output GIF is required (-o/--output)")
+        if profile_mode == ExportMode.FULL_VIDEO:
+            segments = [Segment.new(f.id, 0.0, f.info.duration, i) for i, f in enumerate(files, start=1)]
+        elif not segments:
+            parser.error("no time ranges given (use INPUT@START-END or --range)")
+        elif profile_mode == ExportMode.SINGLE_SEGMENT:
+            segments = segments[:1]
+        task = GifExportTask(
+            ffmpeg=ffmpeg,
+            segments=segments,
+            file_lookup={f.id: f.path for f in files},
+            profile=profile,
+            output_path=args.output,
+            mode=profile_mode,
+            **task_options,
+        )
+        runner = ExportEngine(task, on_progress=progress, on_log=log)
+
+    try:
+        ok, message, size_mb = runner.run()
+    except KeyboardInterrupt:
+        runner.cancel()
+        ok, message, size_mb = False, "Cancelled", 0.0
+
+    if not args.quiet and not args.verbose:
+        print(file=sys.stderr)
+    if not ok:
+        print(f"error: {message}", file=sys.stderr)
+        return 1
+    if not args.quiet:
+        print(f"{message} ({format_size_mb(size_mb)})")
+    return 0
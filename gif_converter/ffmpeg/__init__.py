@@ -1,6 +1,24 @@
 """FFmpeg utilities for GIF Forge"""
 
 from .utils import probe_media_info
-from .gif_exporter import GifExporter, GifExportTask
+from .engine import ExportEngine, GifExportTask
+from .batch import BatchRunner, build_batch_tasks
 
-__all__ = ["probe_media_info", "GifExporter", "GifExportTask"]
+
+def __getattr__(name: str):
+    # The Qt adapters are imported on demand so the engine can run without Qt
+    if name in ("GifExporter", "BatchExporter"):
+        from . import gif_exporter
+        return getattr(gif_exporter, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = [
+    "probe_media_info",
+    "ExportEngine",
+    "GifExportTask",
+    "BatchRunner",
+    "build_batch_tasks",
+    "GifExporter",
+    "BatchExporter",
+]
@@ -0,0 +1,342 @@
+"""Batch export: one GIF per segment or file, several exports at a time"""
+
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import Callable, Dict, List, Optional
+
+from gif_converter.models.media import (
+    MediaFile,
+    MediaInfo,
+    Segment,
+    GifExportProfile,
+    ExportMode,
+)
+from gif_converter.ffmpeg.engine import ExportEngine, GifExportTask
+from gif_converter.ffmpeg.scheduler import default_worker_count
+
+DEFAULT_NAME_TEMPLATE = "{name}_{index:03d}"
+
+# Characters that are not allowed in file names on Windows
+_INVALID_NAME_CHARS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+
+def format_output_name(template: str, media_file: MediaFile, seg: Segment, index: int, file_index: int) -> str:
+    """
+    Build an output file name from a template.
+
+    Available fields: name (source file name without extension), index (1-based
+    position in the batch), file_index (1-based position within the source
+    file), start and end (seconds).
+    """
+    stem = os.path.splitext(os.path.basename(media_file.path))[0]
+    try:
+        name = template.format(
+            name=stem,
+            index=index,
+            file_index=file_index,
+            start=seg.start,
+            end=seg.end,
+        )
+    except (KeyError, IndexError, ValueError):
+        name = DEFAULT_NAME_TEMPLATE.format(name=stem, index=index)
+
+    name = _INVALID_NAME_CHARS.sub("_", name).strip() or f"gif_{index:03d}"
+    if not name.lower().endswith(".gif"):
+        name += ".gif"
+    return name
+
+
+def split_cpu_budget(job_count: int, budget: int = 0) -> tuple[int, int]:
+    """
+    Share a CPU budget between concurrent exports.
+
+    Args:
+        job_count: Number of exports in the batch
+        budget: Maximum number of FFmpeg processes overall (0 = one per CPU core)
+
+    Returns:
+        (exports to run at once, FFmpeg processes per export)
+    """
+    budget = budget or default_worker_count()
+    concurrent = max(1, min(job_count, budget))
+    return concurrent, max(1, budget // concurrent)
+
+
+def build_batch_tasks(
+    ffmpeg: str,
+    files: List[MediaFile],
+    segments: List[Segment],
+    profile: GifExportProfile,
+    output_dir: str,
+    name_template: str = DEFAULT_NAME_TEMPLATE,
+    **task_options,
+) -> List[GifExportTask]:
+    """
+    Build one export task per segment, plus one per file that has no segments.
+
+    Segments are taken in global order; files without segments are exported
+    in full, which makes a batch over plain files a full-video batch.
+    """
+    lookup = {f.id: f.path for f in files}
+    by_id = {f.id: f for f in files}
+
+    jobs: List[tuple[MediaFile, Segment]] = []
+    for seg in segments:
+        if seg.file_id in by_id:
+            jobs.append((by_id[seg.file_id], seg))
+
+    used_files = {seg.file_id for _, seg in jobs}
+    for media_file in files:
+        if media_file.id not in used_files and media_file.info:
+            jobs.append((media_file, Segment.new(media_file.id, 0.0, media_file.info.duration, 0)))
+
+    tasks = []
+    seen_names: Dict[str, int] = {}
+    per_file_count: Dict[str, int] = {}
+    for index, (media_file, seg) in enumerate(jobs, start=1):
+        per_file_count[media_file.id] = per_file_count.get(media_file.id, 0) + 1
+        name = format_output_name(name_template, media_file, seg, index, per_file_count[media_file.id])
+
+        # Keep names unique within the batch
+        key = name.lower()
+        if key in seen_names:
+            seen_names[key] += 1
+            stem, ext = os.path.splitext(name)
+            name = f"{stem}_{seen_names[key]}{ext}"
+        else:
+            seen_names[key] = 1
+
+        tasks.append(GifExportTask(
+            ffmpeg=ffmpeg,
+            segments=[seg],
+            file_lookup=lookup,
+            profile=replace(profile, export_mode=ExportMode.BATCH),
+            output_path=os.path.join(output_dir, name),
+            mode=ExportMode.BATCH,
+            **task_options,
+        ))
+
+    return tasks
+
+
+def _output_frame_size(profile: GifExportProfile, source: MediaInfo, crop: str = "") -> tuple[int, int]:
+    """Width and height of the frames the segment filters produce, after crop and scale"""
+    if crop:
+        width, height = (int(v) for v in crop[len("crop="):].split(":")[:2])
+    else:
+        width, height = source.display_size
+    if profile.width and width and profile.width != width:
+        # scale=W:-1 keeps the aspect ratio, rounding the height to the nearest pixel
+        width, height = profile.width, int(profile.width * height / width + 0.5)
+    return width, height
+
+
+def shared_palette_conflicts(tasks: List[GifExportTask]) -> List[str]:
+    """
+    Reasons the jobs cannot share one palette, or an empty list if they can.
+
+    The shared palette is built with the first job's settings from one
+    stream of every job's frames, so all jobs need the same settings and
+    the same frame size. Sizes come from the media info; sources without
+    it (or without a detected crop, when auto-cropping) are not checked.
+    """
+    if not tasks:
+        return []
+    conflicts = []
+    if any(task.profile != tasks[0].profile for task in tasks):
+        conflicts.append("the GIFs use different export settings")
+
+    sizes = set()
+    for task in tasks:
+        for seg in task.segments:
+            info = task.source_info.get(seg.file_id)
+            crop = task.crop_filters.get(seg.file_id) if task.profile.auto_crop else ""
+            if info and crop is not None:
+                sizes.add(_output_frame_size(task.profile, info, crop))
+    if len(sizes) > 1:
+        listed = ", ".join(f"{w}x{h}" for w, h in sorted(sizes))
+        conflicts.append(f"the GIFs have different frame sizes ({listed})")
+    return conflicts
+
+
+class BatchRunner:
+    """
+    Runs many export jobs, at most ``max_concurrent`` at a time.
+
+    The CPU budget is shared: each running export gets an equal share of the
+    FFmpeg processes, so the batch as a whole keeps every core busy without
+    oversubscribing them.
+
+    With ``shared_palette``, one palette is built from the segments of every
+    job (with the first job's profile) before the jobs start, and each job
+    maps its frames to it instead of generating its own. Colors then match
+    across the set, and palette work is done once for the whole batch. Jobs
+    that cannot share a palette (see shared_palette_conflicts) are checked
+    first, and then each builds its own.
+
+    Callbacks:
+        on_progress(int, str): Overall progress percentage and stage description
+        on_log(str): Log message, prefixed with the job number
+    """
+
+    def __init__(
+        self,
+        tasks: List[GifExportTask],
+        cpu_budget: int = 0,
+        shared_palette: bool = False,
+        on_progress: Optional[Callable[[int, str], None]] = None,
+        on_log: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self._cpu_budget = cpu_budget or default_worker_count()
+        self._shared_palette = shared_palette
+        self._max_concurrent, per_job = split_cpu_budget(len(tasks), cpu_budget)
+        # Jobs that run at once also share the memory for reversed frames
+        self._tasks = [
+            replace(
+                task,
+                max_workers=per_job,
+                reverse_memory_mb=max(1, task.reverse_memory_mb // self._max_concurrent),
+            )
+            for task in tasks
+        ]
+        self._on_progress = on_progress
+        self._on_log = on_log
+
+        self._lock = threading.Lock()
+        self._engines: Dict[int, ExportEngine] = {}
+        self._progress = [0] * len(tasks)
+        self._done = 0
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        """Cancel all running jobs and skip the ones not started yet"""
+        with self._lock:
+            self._cancelled = True
+            engines = list(self._engines.values())
+        for engine in engines:
+            engine.cancel()
+
+    def run(self) -> tuple[bool, str, float]:
+        """
+        Run every job and wait for all of them.
+
+        Returns:
+            (True if every job succeeded, summary, total size in MB)
+        """
+        if not self._tasks:
+            return False, "Nothing to export", 0.0
+
+        self._log(
+            f"Batch: {len(self._tasks)} GIF(s), {self._max_concurrent} at a time, "
+            f"{self._tasks[0].max_workers} FFmpeg process(es) each"
+        )
+
+        shared = self._shared_palette
+        if shared:
+            conflicts = shared_palette_conflicts(self._tasks)
+            if conflicts:
+                self._log(f"No shared palette: {'; '.join(conflicts)}. Every GIF builds its own palette")
+                shared = False
+        palette_dir = tempfile.mkdtemp(prefix="gifforge_batch_") if shared else None
+        try:
+            if palette_dir:
+                self._build_shared_palette(os.path.join(palette_dir, "palette.png"))
+            with ThreadPoolExecutor(max_workers=self._max_concurrent) as executor:
+                results = list(executor.map(self._run_job, range(len(self._tasks))))
+        finally:
+            if palette_dir:
+                shutil.rmtree(palette_dir, ignore_errors=True)
+
+        if self._cancelled:
+            return False, "Cancelled", 0.0
+
+        total_mb = sum(size for ok, _, size in results if ok)
+        failures = [
+            f"{os.path.basename(task.output_path)}: {msg}"
+            for task, (ok, msg, _) in zip(self._tasks, results) if not ok
+        ]
+        total = len(self._tasks)
+        output_dir = os.path.dirname(self._tasks[0].output_path)
+        summary = f"{total - len(failures)} of {total} GIF(s) saved to:\n{output_dir}"
+        if failures:
+            summary += "\n\nFailed:\n" + "\n".join(failures[:10])
+        return not failures, summary, total_mb
+
+    def _build_shared_palette(self, output: str) -> None:
+        """Build one palette over every job's segments and hand it to all jobs"""
+        first = self._tasks[0]
+        lookup: Dict[str, str] = {}
+        for task in self._tasks:
+            lookup.update(task.file_lookup)
+        task = replace(
+            first,
+            segments=[seg for task in self._tasks for seg in task.segments],
+            file_lookup=lookup,
+            mode=ExportMode.MERGED_SEGMENTS,
+            max_workers=self._cpu_budget,
+        )
+
+        with self._lock:
+            if self._cancelled:
+                return
+            engine = ExportEngine(task, on_log=lambda line: self._log("[palette] " + line))
+            self._engines[-1] = engine
+        if self._on_progress:
+            self._on_progress(0, "Building shared palette...")
+
+        ok, err = engine.build_palette(output)
+
+        with self._lock:
+            self._engines.pop(-1, None)
+        if not ok:
+            if not self._cancelled:
+                self._log(f"Shared palette failed ({err}); every GIF builds its own palette")
+            return
+        self._log(f"Built one palette from {len(task.segments)} segment(s) for all {len(self._tasks)} GIF(s)")
+        self._tasks = [replace(t, palette_path=output) for t in self._tasks]
+
+    def _run_job(self, idx: int) -> tuple[bool, str, float]:
+        task = self._tasks[idx]
+        prefix = f"[job {idx + 1}] "
+
+        with self._lock:
+            if self._cancelled:
+                return False, "Cancelled", 0.0
+            engine = ExportEngine(
+                task,
+                on_progress=lambda value, _stage: self._job_progress(idx, value),
+                on_log=lambda line: self._log(prefix + line),
+            )
+            self._engines[idx] = engine
+
+        ok, message, size_mb = engine.run()
+
+        with self._lock:
+            self._engines.pop(idx, None)
+            self._done += 1
+        name = os.path.basename(task.output_path)
+        if ok:
+            self._log(f"{prefix}Saved {name} ({size_mb:.2f} MB)")
+        else:
+            self._log(f"{prefix}Failed: {message}")
+        self._job_progress(idx, 100)
+        return ok, message, size_mb
+
+    def _job_progress(self, idx: int, value: int) -> None:
+        with self._lock:
+            self._progress[idx] = value
+            overall = sum(self._progress) // len(self._tasks)
+            done = self._done
+        if self._on_progress:
+            self._on_progress(overall, f"Exporting {done}/{len(self._tasks)} GIFs...")
+
+    def _log(self, line: str) -> None:
+        if self._on_log:
+            self._on_log(line)
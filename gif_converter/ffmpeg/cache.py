@@ -0,0 +1,150 @@
+"""Persistent on-disk caches for intermediate export artifacts"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, Iterable, Optional
+
+
+def default_cache_dir() -> str:
+    """Per-user cache directory for GIF Forge"""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        return os.path.join(base, "GifForge", "cache")
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "gifforge")
+
+
+def default_frame_store_dir() -> str:
+    """Scratch directory for decoded frames, shared by the exports of a session"""
+    return os.path.join(tempfile.gettempdir(), "gifforge_frames")
+
+
+def source_fingerprint(path: str) -> str:
+    """Identify a source file by path, size and modification time"""
+    try:
+        st = os.stat(path)
+        return f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    except OSError:
+        return os.path.abspath(path)
+
+
+def make_cache_key(*parts: object) -> str:
+    """Hash the given parts into a stable cache key"""
+    digest = hashlib.sha256("\0".join(str(p) for p in parts).encode("utf-8"))
+    return digest.hexdigest()[:40]
+
+
+class FileCache:
+    """
+    Content-addressed file cache with a size cap and LRU eviction.
+
+    Entries are plain files named after their key. A file's modification time
+    is bumped on every hit, so eviction removes the least recently used
+    entries first. Entries held by a running export are never evicted, by
+    any instance. Hit and miss counters are kept per instance.
+    """
+
+    # Cached paths that running exports still read -> number of holders
+    _held: Dict[str, int] = {}
+    _held_lock = threading.Lock()
+
+    def __init__(self, root: str, max_bytes: int) -> None:
+        # Absolute, so cached paths stay valid from any working directory
+        # (FFmpeg resolves concat list entries against the list's own folder)
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, key: str, suffix: str) -> str:
+        return os.path.join(self.root, key + suffix)
+
+    def get(self, key: str, suffix: str) -> Optional[str]:
+        """Return the cached file for key, or None on a miss"""
+        path = self.path_for(key, suffix)
+        with self._lock:
+            if os.path.isfile(path):
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                self.hits += 1
+                return path
+            self.misses += 1
+            return None
+
+    def contains(self, key: str, suffix: str) -> bool:
+        """Check for an entry without touching it or the counters"""
+        return os.path.isfile(self.path_for(key, suffix))
+
+    def put(self, key: str, suffix: str, src_path: str, keep: Iterable[str] = ()) -> str:
+        """
+        Move a finished file into the cache and return its cached path.
+
+        Args:
+            keep: Cached paths the caller still reads, which eviction must
+                not delete (the new entry is always kept)
+        """
+        path = self.path_for(key, suffix)
+        tmp_path = path + ".part"
+        shutil.move(src_path, tmp_path)
+        os.replace(tmp_path, path)
+        self.evict(keep=[path, *keep])
+        return path
+
+    def hold(self, paths: Iterable[str]) -> None:
+        """Protect cached paths from eviction until they are released"""
+        with FileCache._held_lock:
+            for path in paths:
+                FileCache._held[path] = FileCache._held.get(path, 0) + 1
+
+    def release(self, paths: Iterable[str]) -> None:
+        """Undo a hold() on the same paths"""
+        with FileCache._held_lock:
+            for path in paths:
+                count = FileCache._held.get(path, 0) - 1
+                if count > 0:
+                    FileCache._held[path] = count
+                else:
+                    FileCache._held.pop(path, None)
+
+    def evict(self, keep: Iterable[str] = ()) -> None:
+        """Delete least recently used entries until the cache fits its size cap, except held ones and those in keep"""
+        with FileCache._held_lock:
+            keep = set(keep) | set(FileCache._held)
+        # Other caches hold their own paths; only this root's count here
+        keep = {path for path in keep if os.path.dirname(path) == self.root}
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                if name.endswith(".part") or path in keep:
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+            total = sum(size for _, size, _ in entries) + sum(
+                os.path.getsize(p) for p in keep if os.path.exists(p)
+            )
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def stats_text(self, name: str) -> str:
+        """One-line hit/miss summary for the export log"""
+        return f"{name} cache: {self.hits} hit(s), {self.misses} miss(es)"
@@ -0,0 +1,1961 @@
+"""GIF export engine using FFmpeg (no Qt dependency)"""
+
+from __future__ import annotations
+
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from dataclasses import dataclass, field, replace
+from typing import BinaryIO, Callable, List, Dict, Optional
+
+from gif_converter.models.media import (
+    Segment,
+    GifExportProfile,
+    MediaInfo,
+    TextOverlay,
+    TextPosition,
+    ExportMode,
+)
+from gif_converter.ffmpeg.scheduler import ProcessPool, ProcessJob, default_worker_count
+from gif_converter.ffmpeg.cache import FileCache, make_cache_key, source_fingerprint
+from gif_converter.ffmpeg.gif_blocks import pad_gif_duration, read_gif_blocks, retime_gif, stitch_gifs
+from gif_converter.ffmpeg.utils import crop_sample_times, detect_crop
+from gif_converter.ffmpeg.filters import (
+    DecodePlan,
+    ExtractPlan,
+    FilterPlan,
+    SeekPlan,
+    plan_decode_groups,
+    plan_decoder,
+    plan_extraction,
+    plan_seek,
+    plan_segment_filters,
+)
+
+
+# Palettes are a few KB each, so a fixed cap keeps thousands of them
+_PALETTE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Encoder settings for intermediate clips (part of the clip cache key)
+_CLIP_CODEC_ARGS = ["-c:v", "libx264", "-preset", "ultrafast", "-crf", "18", "-pix_fmt", "yuv420p"]
+
+# Stream-copied clips keep the source codec, which Matroska can hold whatever it is
+_COPY_CLIP_EXT = ".mkv"
+
+# Shortest stretch of output worth its own GIF encoding process
+_CHUNK_MIN_SECONDS = 10.0
+
+# Frames the sampled palette engine decodes: this many evenly spaced ones,
+# plus up to this many keyframes
+_PALETTE_SAMPLE_FRAMES = 32
+
+# Bytes per pixel assumed for frames held by the reverse filter (covers
+# 4:4:4 YUV and the BGRA frames of decoded GIF parts)
+_REVERSE_BYTES_PER_PIXEL = 4
+
+
+def _dedupe_limits(threshold: int) -> tuple[int, int, float]:
+    """
+    mpdecimate limits for a dedupe threshold in pixel levels.
+
+    A frame is a duplicate when no 8x8 block differs by more than hi in
+    total and at most frac of the blocks differ by more than lo. FFmpeg's
+    defaults (hi=768, lo=320) are threshold 12.
+    """
+    return 64 * threshold, round(64 * threshold * 5 / 12), 0.33
+
+
+def _concat_entry(path: str) -> str:
+    """A concat demuxer list line for path, with single quotes escaped"""
+    return "file '" + path.replace("'", "'\\''") + "'\n"
+
+
+def _y4m_geometry(header: bytes) -> tuple:
+    """Frame size and rate fields of a yuv4mpegpipe stream header"""
+    return tuple(sorted(tok for tok in header.split() if tok[:1] in (b"W", b"H", b"F", b"C")))
+
+
+@dataclass(slots=True)
+class _EncodeChunk:
+    """A time range of one input that is encoded to its own GIF part"""
+    src: str
+    start: float  # Input seconds
+    end: float
+    filters: str  # Filter chain applied before paletteuse ("" for none)
+    duration: float  # Output seconds (for progress)
+    decode_args: List[str] = field(default_factory=list)  # Decoder options for src
+    keyframes: Optional[List[float]] = None  # Keyframe index of src, for the seek
+
+
+@dataclass(slots=True)
+class _Clip:
+    """An extracted segment of the clip-file pipeline, and how the later passes read it"""
+    path: str
+    start: float  # Clip seconds where the segment starts
+    end: float
+    filters: str = ""  # Segment filters still to apply ("" for re-encoded clips, which have them)
+    decode_args: List[str] = field(default_factory=list)  # Decoder options for a copied clip
+    keyframes: Optional[List[float]] = None  # Keyframes of a copied clip, None for re-encoded ones
+
+    @property
+    def copied(self) -> bool:
+        """True for a stream-copied clip"""
+        return self.keyframes is not None
+
+
+class _PipedParts:
+    """Reads the stdout of several commands, run one after another, as one stream"""
+
+    def __init__(self, pool: ProcessPool, jobs: List[ProcessJob]) -> None:
+        self._pool = pool
+        self._jobs = list(jobs)
+        self._proc: Optional[subprocess.Popen] = None
+
+    def read(self, size: int = -1) -> bytes:
+        while True:
+            if self._proc is None:
+                if not self._jobs:
+                    return b""
+                self._proc = self._pool.spawn(self._jobs.pop(0), stdout=subprocess.PIPE)
+                if self._proc is None:
+                    raise OSError("Cancelled")
+            data = self._proc.stdout.read(size)
+            if data:
+                return data
+            self._finish()
+
+    def close(self) -> None:
+        if self._proc is not None:
+            self._proc.kill()
+            try:
+                self._finish()
+            except OSError:
+                pass
+        self._jobs.clear()
+
+    def _finish(self) -> None:
+        proc, self._proc = self._proc, None
+        proc.stdout.close()
+        code = self._pool.reap(proc)
+        if code != 0:
+            raise OSError(f"exit code {code}")
+
+
+@dataclass(slots=True)
+class GifExportTask:
+    """GIF export task configuration"""
+    ffmpeg: str
+    segments: List[Segment]
+    file_lookup: Dict[str, str]  # file_id -> path
+    profile: GifExportProfile
+    output_path: str
+    mode: ExportMode = ExportMode.SINGLE_SEGMENT
+    max_workers: int = 0  # Concurrent FFmpeg jobs (0 = one per CPU core)
+    cache_dir: Optional[str] = None  # Persistent cache root (None = caching disabled)
+    cache_max_mb: int = 2048  # Size cap for cached clips
+    retime_from: Optional[str] = None  # Earlier GIF of the same frames; only the loop count is rewritten
+    reverse_memory_mb: int = 1024  # Frames held for reverse/boomerang, across all FFmpeg processes
+    frame_store_dir: Optional[str] = None  # Decoded frame store root (None = decode for every stage)
+    frame_store_mb: int = 4096  # Size cap for decoded frames
+    palette_path: Optional[str] = None  # Prebuilt palette shared with other exports (skips palette generation)
+    crop_filters: Dict[str, str] = field(default_factory=dict)  # file_id -> detected crop for auto_crop (MediaInfo.crop)
+    source_info: Dict[str, MediaInfo] = field(default_factory=dict)  # file_id -> probed media info, for filter planning and the shared palette check
+
+
+class ExportEngine:
+    """
+    GIF export engine.
+
+    Runs synchronously in the calling thread and reports through plain
+    callbacks, so it can be used from worker processes without loading Qt.
+
+    Callbacks:
+        on_progress(int, str): Progress percentage (0-100) and stage description
+        on_log(str): Log message from FFmpeg
+    """
+
+    def __init__(
+        self,
+        task: GifExportTask,
+        on_progress: Optional[Callable[[int, str], None]] = None,
+        on_log: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self._task = task
+        self._on_progress = on_progress
+        self._on_log = on_log
+        self._cancelled = False
+        self._pool = ProcessPool(task.max_workers or None, on_log=self._log)
+        self._builtin_encoder = False
+        self._encoder = None
+        self._sub_engine: Optional[ExportEngine] = None
+        self._chunk_limit = 0  # Most output frames per final-stage part (0 = one pass)
+        self._crops: Dict[str, str] = {}  # file_id -> crop filter ("" = nothing to crop)
+        self._clip_cache: Optional[FileCache] = None
+        self._palette_cache: Optional[FileCache] = None
+        self._held_clips: List[str] = []  # Cached clip paths this export still reads
+        self._frame_store = None  # FrameStore of a stored export
+        self._held_frames: List[str] = []  # Frame store entries this export still reads
+        if task.cache_dir:
+            self._clip_cache = FileCache(
+                os.path.join(task.cache_dir, "clips"), task.cache_max_mb * 1024 * 1024
+            )
+            self._palette_cache = FileCache(
+                os.path.join(task.cache_dir, "palettes"), _PALETTE_CACHE_MAX_BYTES
+            )
+
+    def cancel(self) -> None:
+        """Cancel the export operation and stop every running FFmpeg process"""
+        self._cancelled = True
+        self._pool.cancel()
+        if self._encoder is not None:
+            self._encoder.cancel()
+        if self._sub_engine is not None:
+            self._sub_engine.cancel()
+
+    def run(self) -> tuple[bool, str, float]:
+        """
+        Execute the export task.
+
+        Returns:
+            (success, output path or error message, file size in MB)
+        """
+        return self._run()
+
+    def build_palette(self, output: str) -> tuple[bool, str]:
+        """
+        Generate only the palette for this task's segments, e.g. to share it between exports.
+
+        Uses the profile's palette engine and the palette cache like a full export.
+
+        Returns:
+            (success, error message)
+        """
+        tmp_dir = tempfile.mkdtemp(prefix="gifforge_")
+        try:
+            self._resolve_crops()
+            ok, err, palette_path = self._generate_raw_palette(tmp_dir)
+            if ok:
+                shutil.copyfile(palette_path, output)
+            return ok, err
+        except OSError as e:
+            return False, str(e)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _progress(self, value: int, stage: str) -> None:
+        if self._on_progress:
+            self._on_progress(value, stage)
+
+    def _log(self, line: str) -> None:
+        if self._on_log:
+            self._on_log(line)
+
+    def _run(self) -> tuple[bool, str, float]:
+        """Main export logic"""
+        tmp_dir = tempfile.mkdtemp(prefix="gifforge_")
+        try:
+            profile = self._task.profile
+
+            if self._cancelled:
+                return False, "Cancelled", 0.0
+
+            self._builtin_encoder = self._use_builtin_encoder()
+            retimed = bool(self._task.retime_from) and self._retime_previous()
+            if not retimed:
+                self._resolve_crops()
+                self._log_filter_plans()
+            split = self._segment_palettes_mode() if not retimed else "off"
+            stored = not retimed and split != "on" and self._use_frame_store()
+            if not retimed and not stored and split != "on":
+                self._chunk_limit = self._chunk_frames()
+
+            if retimed:
+                ok, err = True, ""
+            elif split == "on":
+                ok, err = self._run_segment_palettes(tmp_dir, self._task.output_path)
+                if not ok and not self._cancelled:
+                    self._log(f"Per-segment palettes failed ({err}), using one palette")
+                    ok, err = self._run_files(tmp_dir)
+            elif stored:
+                ok, err = self._run_store(tmp_dir)
+                if not ok and not self._cancelled:
+                    self._log(f"Export from stored frames failed ({err}), falling back to clip files")
+                    ok, err = self._run_files(tmp_dir)
+            elif self._all_clips_cached():
+                # Nothing to decode from the sources; go straight to palette and GIF
+                self._log("All segment clips are cached, skipping extraction")
+                ok, err = self._run_files(tmp_dir)
+            elif self._chunk_limit and profile.pipeline != "files":
+                ok, err = self._run_chunked(tmp_dir)
+                if not ok and not self._cancelled:
+                    self._log(f"Export in parts failed ({err}), falling back to clip files")
+                    ok, err = self._run_files(tmp_dir)
+            elif profile.pipeline == "fused":
+                self._progress(5, "Rendering GIF in a single pass...")
+                ok, err = self._run_fused(tmp_dir, self._task.output_path)
+                if not ok and not self._cancelled:
+                    # The fused graph needs all segments to share one frame size;
+                    # the clip pipeline is more forgiving, so retry with it
+                    self._log(f"Single-pass export failed ({err}), falling back to clip files")
+                    ok, err = self._run_files(tmp_dir)
+            elif profile.pipeline == "stream":
+                ok, err = self._run_stream(tmp_dir)
+            else:
+                ok, err = self._run_files(tmp_dir)
+
+            if self._cancelled:
+                return False, "Cancelled", 0.0
+            if not ok:
+                return False, err, 0.0
+            if (profile.reverse or profile.boomerang) and not (retimed or stored or split == "on"):
+                self._log_peak_memory()
+            if split == "auto":
+                self._keep_smaller_segment_palettes(tmp_dir)
+                if self._cancelled:
+                    return False, "Cancelled", 0.0
+            if profile.dedupe_threshold and not (retimed or split == "on" or self._builtin_encoder):
+                self._finish_dedupe()
+
+            # Verify and get file size
+            if not os.path.exists(self._task.output_path):
+                return False, "Output file was not created", 0.0
+
+            file_size_bytes = os.path.getsize(self._task.output_path)
+            file_size_mb = file_size_bytes / (1024 * 1024)
+
+            self._progress(100, "Done")
+            return True, self._task.output_path, file_size_mb
+
+        except Exception as e:
+            return False, f"Export error: {str(e)}", 0.0
+        finally:
+            if self._clip_cache:
+                self._clip_cache.release(self._held_clips)
+                self._held_clips = []
+            if self._frame_store:
+                self._frame_store.release(self._held_frames)
+                self._held_frames = []
+            try:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            except Exception:
+                pass
+
+    def _retime_previous(self) -> bool:
+        """Rewrite the loop count of an earlier export instead of re-encoding"""
+        src = self._task.retime_from
+        self._progress(5, "Rewriting loop count...")
+        try:
+            frames = retime_gif(src, self._task.output_path, self._task.profile.loop_count)
+        except (ValueError, OSError) as e:
+            self._log(f"Cannot reuse {src} ({e}), exporting again")
+            return False
+        self._log(f"Only the loop count changed; rewrote {frames} frames of {src} without re-encoding")
+        return True
+
+    def _run_files(self, tmp_dir: str) -> tuple[bool, str]:
+        """Three-pass export through intermediate clip files"""
+        # Step 1: Extract and prepare video segments
+        self._progress(5, "Preparing video segments...")
+        video_clips = self._extract_segments(tmp_dir)
+        if self._cancelled:
+            return False, "Cancelled"
+        if not video_clips:
+            return False, "Failed to extract video segments"
+
+        # Step 2: Generate optimized palette (unless an identical one is cached)
+        palette_key = self._palette_cache_key("clips")
+        palette_path = self._reuse_palette(tmp_dir, palette_key)
+        if not palette_path:
+            self._progress(30, "Generating color palette...")
+            palette_path = os.path.join(tmp_dir, "palette.png")
+            ok, err = self._generate_palette(video_clips, palette_path)
+            if self._cancelled:
+                return False, "Cancelled"
+            if not ok:
+                return False, f"Palette generation failed: {err}"
+            palette_path = self._store_palette(palette_key, palette_path)
+
+        # Step 3: Create GIF using palette, in parts for long or reversed exports
+        self._progress(60, "Creating GIF...")
+        if self._chunk_limit:
+            # Re-encoded clips already play at the output speed; copied ones are still source time
+            speed = self._task.profile.speed_multiplier or 1.0
+            chunks = []
+            for clip in video_clips:
+                clip_input = (clip.path, clip.start, clip.end, clip.filters, clip.decode_args, clip.keyframes)
+                chunks += self._plan_chunks([clip_input], speed if clip.copied else 1.0, self._chunk_limit)
+            ok, err = self._encode_chunked(chunks, palette_path, tmp_dir, self._task.output_path)
+        else:
+            ok, err = self._create_gif(video_clips, palette_path, self._task.output_path)
+        if not ok:
+            return False, f"GIF creation failed: {err}"
+
+        return True, ""
+
+    def _run_fused(self, tmp_dir: str, output: str) -> tuple[bool, str]:
+        """
+        Render the GIF with one FFmpeg process.
+
+        Every segment is opened as its own seeked input and filtered in a single
+        filter graph (segment filters -> concat -> split -> palettegen/paletteuse),
+        so each source frame is decoded once and no intermediate clip is encoded.
+        Consecutive segments of one source that overlap or nearly touch share
+        an input, split into one branch per segment. With a cached palette the
+        palettegen branch is dropped entirely.
+        """
+        input_args: List[str] = []
+        graph: List[str] = []
+
+        for seg in self._task.segments:
+            if not self._task.file_lookup.get(seg.file_id):
+                self._log(f"Warning: Missing source for segment {seg.id}")
+
+        sources = self._segment_sources()
+        labels = [f"[s{idx}]" for idx in range(len(sources))]
+        runs = []  # Consecutive segments of one decode group, which concat takes one after another
+        for group in self._decode_groups([seg for _, seg in sources]):
+            run = group[:1]
+            for pos in group[1:]:
+                if pos != run[-1] + 1:
+                    runs.append(run)
+                    run = []
+                run.append(pos)
+            runs.append(run)
+
+        for idx, run in enumerate(sorted(runs)):
+            src, first = sources[run[0]]
+            if len(run) == 1:
+                seek_args, trim = self._seek_input(src, first.start, first.end, self._keyframes(first.file_id))
+                input_args += self._decode_args(first.file_id) + seek_args
+                chain = ",".join(trim + self._build_segment_filters(first.file_id)) or "null"
+                graph.append(f"[{idx}:v]{chain}{labels[run[0]]}")
+                continue
+            segs = [sources[pos][1] for pos in run]
+            run_args, run_graph = self._read_together(src, segs, idx, [labels[pos] for pos in run])
+            input_args += run_args
+            graph += run_graph
+            start, end = min(seg.start for seg in segs), max(seg.end for seg in segs)
+            self._log(f"Segments {', '.join(str(pos + 1) for pos in run)}: decoded together ({start:g}s to {end:g}s)")
+
+        if not labels:
+            return False, "No segments to export"
+
+        if len(labels) > 1:
+            graph.append(f"{''.join(labels)}concat=n={len(labels)}:v=1:a=0[cat]")
+            stream = "[cat]"
+        else:
+            stream = labels[0]
+
+        palette_key = self._palette_cache_key("raw")
+        cached_palette = self._reuse_palette(tmp_dir, palette_key)
+        new_palette = None
+        output_args = []
+
+        if cached_palette:
+            input_args += ["-i", cached_palette]
+            palette = f"[{len(runs)}:v]"
+        else:
+            # The palette is built from forward playback, like the other pipelines,
+            # and also written out so later exports can reuse it
+            graph.append(f"{stream}split[pg][pu]")
+            graph.append(f"[pg]{self._build_palettegen_filter()},split[pal][palout]")
+            stream = "[pu]"
+            palette = "[pal]"
+            new_palette = os.path.join(tmp_dir, "palette.png")
+            output_args = ["-map", "[palout]", "-update", "1", new_palette]
+
+        playback = self._build_playback_graph(stream, "[v]")
+        if playback:
+            graph.append(playback)
+            stream = "[v]"
+
+        dedupe = self._build_dedupe_filter()
+        if dedupe:
+            graph.append(f"{stream}{dedupe}[dd]")
+            stream = "[dd]"
+
+        graph.append(f"{stream}{palette}{self._build_paletteuse_filter()}[out]")
+
+        cmd = [
+            self._task.ffmpeg,
+            "-y",
+        ] + input_args + [
+            "-filter_complex", ";".join(graph),
+            "-map", "[out]",
+        ]
+
+        ok, err = self._run_output_cmd(cmd, output, output_args)
+        if ok and new_palette:
+            self._store_palette(palette_key, new_palette)
+        return ok, err
+
+    def _run_stream(self, tmp_dir: str) -> tuple[bool, str]:
+        """
+        Two-pass export that streams raw frames between FFmpeg processes.
+
+        Segment extraction writes uncompressed yuv4mpegpipe frames to a pipe
+        that palettegen, and then paletteuse, read from stdin. Frames never
+        touch disk or pass through a codec; only the palette is written.
+        """
+        ok, err, palette_path = self._generate_raw_palette(tmp_dir)
+        if not ok:
+            return False, f"Palette generation failed: {err}"
+
+        cmd = self._build_output_cmd([
+            self._task.ffmpeg,
+            "-y",
+            "-f", "yuv4mpegpipe",
+            "-i", "pipe:0",
+            "-i", palette_path,
+            "-filter_complex", self._build_paletteuse_graph(),
+        ], self._task.output_path)
+        ok, err = self._stream_segments(
+            cmd, "Streaming frames to GIF encoder", 50, 95, output=self._task.output_path
+        )
+        if not ok:
+            return False, f"GIF creation failed: {err}"
+
+        return True, ""
+
+    def _segment_palettes_mode(self) -> str:
+        """Per-segment palette mode that applies to this export ("off" unless merging several segments)"""
+        mode = self._task.profile.segment_palettes
+        if mode == "off" or self._task.mode != ExportMode.MERGED_SEGMENTS or len(self._segment_sources()) < 2:
+            return "off"
+        return mode
+
+    def _run_segment_palettes(self, tmp_dir: str, output: str) -> tuple[bool, str]:
+        """
+        Export a merged GIF whose segments each get their own palette.
+
+        Every segment is exported on its own (palette, dither and encoder as
+        usual) and the GIFs are stitched block by block. Frames after the
+        first segment carry their palette as a local color table; that costs
+        up to 768 bytes per frame, which pays off when segments look very
+        different.
+        """
+        profile = self._task.profile
+        segments = [seg for _, seg in self._segment_sources()]
+        # Reverse plays the segments backwards in reverse order; boomerang adds that after the forward run
+        playback = [(seg, profile.reverse and not profile.boomerang) for seg in segments]
+        if profile.reverse and not profile.boomerang:
+            playback.reverse()
+        if profile.boomerang:
+            playback += [(seg, True) for seg in reversed(segments)]
+
+        parts = []
+        for idx, (seg, backward) in enumerate(playback, start=1):
+            if self._cancelled:
+                return False, "Cancelled"
+            part = os.path.join(tmp_dir, f"segment_{idx:03d}.gif")
+            task = replace(
+                self._task,
+                segments=[seg],
+                output_path=part,
+                mode=ExportMode.SINGLE_SEGMENT,
+                profile=replace(profile, reverse=backward, boomerang=False, segment_palettes="off"),
+                retime_from=None,
+                palette_path=None,
+                crop_filters={**self._task.crop_filters, **self._crops},
+            )
+            lo = 5 + int(85 * (idx - 1) / len(playback))
+            hi = 5 + int(85 * idx / len(playback))
+            self._sub_engine = ExportEngine(
+                task,
+                on_progress=lambda value, stage, lo=lo, hi=hi: self._progress(lo + value * (hi - lo) // 100, stage),
+                on_log=lambda line, idx=idx: self._log(f"[segment {idx}] {line}"),
+            )
+            ok, err, _ = self._sub_engine.run()
+            self._sub_engine = None
+            if not ok:
+                return False, f"segment {idx}: {err}"
+            parts.append(part)
+
+        self._progress(92, "Joining segments...")
+        try:
+            frames = stitch_gifs(parts, output)
+        except (OSError, ValueError) as e:
+            return False, str(e)
+        tables = len(parts) - 1
+        self._log(f"Per-segment palettes: {len(parts)} palettes over {frames} frames ({tables} as local color tables)")
+        return True, ""
+
+    def _keep_smaller_segment_palettes(self, tmp_dir: str) -> None:
+        """Also export with per-segment palettes and keep that GIF if it is smaller than the one-palette GIF"""
+        output = self._task.output_path
+        candidate = os.path.join(tmp_dir, "segment_palettes.gif")
+        ok, err = self._run_segment_palettes(tmp_dir, candidate)
+        if not ok:
+            if not self._cancelled:
+                self._log(f"Per-segment palettes failed ({err}), keeping one palette")
+            return
+
+        one = os.path.getsize(output)
+        split = os.path.getsize(candidate)
+        mb = 1024 * 1024
+        keep = split < one
+        self._log(
+            f"Size comparison: one palette {one / mb:.2f} MB, per-segment palettes {split / mb:.2f} MB "
+            f"({100 * (split - one) / one:+.1f}%); keeping {'per-segment palettes' if keep else 'one palette'}"
+        )
+        if keep:
+            shutil.move(candidate, output)
+
+    def _use_frame_store(self) -> bool:
+        """Check whether this export reads its frames from the decoded frame store"""
+        if not self._task.frame_store_dir:
+            return False
+        try:
+            import gif_converter.ffmpeg.frame_store  # noqa: F401 (needs NumPy)
+        except ImportError:
+            self._log("NumPy is not installed; decoding frames for every stage")
+            return False
+        return True
+
+    def _run_store(self, tmp_dir: str) -> tuple[bool, str]:
+        """
+        Two-pass export from decoded frames kept in the frame store.
+
+        Each segment is decoded once to raw 4:4:4 frames on disk; palettegen and
+        paletteuse read them through a memory map, so re-exports with other
+        colors, dither or loop settings decode nothing. Reverse and
+        boomerang just feed the stored frames backwards, so nothing is held
+        in memory however long the export is.
+        """
+        from gif_converter.ffmpeg.frame_store import FrameStore, write_frames
+
+        store = FrameStore(self._task.frame_store_dir, self._task.frame_store_mb * 1024 * 1024)
+        self._frame_store = store
+        spans = self._stored_frames(store)
+        if self._cancelled:
+            return False, "Cancelled"
+        if not spans:
+            return False, "Failed to decode segments"
+
+        sizes = {(frame_set.width, frame_set.height) for frame_set, _, _ in spans}
+        if len(sizes) > 1:
+            return False, "segments have different frame sizes"
+        width, height = sizes.pop()
+        profile = self._task.profile
+        input_args = [
+            "-f", "rawvideo",
+            "-pix_fmt", "yuv444p",
+            "-s", f"{width}x{height}",
+            "-framerate", f"{profile.fps}",
+            "-i", "pipe:0",
+        ]
+
+        def feed(backward: bool) -> Callable[[BinaryIO], tuple[bool, str]]:
+            def write_spans(stdin: BinaryIO) -> tuple[bool, str]:
+                for frame_set, first, last in (reversed(spans) if backward else spans):
+                    if self._cancelled:
+                        return False, "Cancelled"
+                    write_frames(stdin, frame_set.frames()[first:last], reverse=backward)
+                return True, ""
+            return write_spans
+
+        def feed_playback(stdin: BinaryIO) -> tuple[bool, str]:
+            ok, err = feed(profile.reverse and not profile.boomerang)(stdin)
+            if ok and profile.boomerang:
+                ok, err = feed(True)(stdin)
+            return ok, err
+
+        # Palette from forward playback, like the other pipelines
+        palette_key = self._palette_cache_key("store")
+        palette_path = self._reuse_palette(tmp_dir, palette_key)
+        if not palette_path:
+            self._progress(30, "Generating color palette from stored frames...")
+            palette_path = os.path.join(tmp_dir, "palette.png")
+            cmd = [self._task.ffmpeg, "-y"] + input_args + ["-vf", self._build_palettegen_filter(), palette_path]
+            ok, err = self._pipe_into(cmd, feed(False))
+            if not ok:
+                return False, f"Palette generation failed: {err}"
+            palette_path = self._store_palette(palette_key, palette_path)
+
+        self._progress(60, "Creating GIF from stored frames...")
+        cmd = self._build_output_cmd([self._task.ffmpeg, "-y"] + input_args + [
+            "-i", palette_path,
+            "-filter_complex", f"[0:v]{self._build_dedupe_filter() or 'null'}[v];[v][1:v]{self._build_paletteuse_filter()}",
+        ], self._task.output_path)
+        ok, err = self._pipe_into(cmd, feed_playback, output=self._task.output_path)
+        if not ok:
+            return False, f"GIF creation failed: {err}"
+        return True, ""
+
+    def _stored_frames(self, store) -> List[tuple]:
+        """
+        Find or decode the frames of every segment in the frame store.
+
+        Returns:
+            (FrameSet, first, last) per segment in playback order, or [] if a
+            decode failed
+        """
+        speed = self._task.profile.speed_multiplier or 1.0
+        found = []
+        jobs = []
+        pending = []  # (index in found, source, segment, decode path, final path)
+
+        for idx, (src, seg) in enumerate(self._segment_sources(), start=1):
+            filters = ",".join(self._build_segment_filters(seg.file_id))
+            group = make_cache_key(source_fingerprint(src), " ".join(self._decode_args(seg.file_id)), filters)
+            frame_set = store.find(group, seg.start, seg.end)
+            if frame_set:
+                self._held_frames.append(frame_set.path)
+                found.append(frame_set)
+                continue
+
+            path = store.path_for(group, seg.start, seg.end)
+            fd, part = tempfile.mkstemp(suffix=".part", dir=store.root)
+            os.close(fd)
+            seek_args, trim = self._seek_input(src, seg.start, seg.end, self._keyframes(seg.file_id))
+            cmd = [self._task.ffmpeg, "-y"] + self._decode_args(seg.file_id) + seek_args
+            if trim or filters:
+                cmd += ["-vf", ",".join(trim + ([filters] if filters else []))]
+            cmd += ["-pix_fmt", "yuv444p", "-an", "-f", "rawvideo", part]
+            jobs.append(ProcessJob(cmd=cmd, duration=seg.duration / speed, label=f"seg {idx}"))
+            pending.append((len(found), src, seg, part, path))
+            found.append(None)
+
+        self._log(store.stats_text())
+
+        def on_progress(fraction: float, done: int) -> None:
+            self._progress(5 + int(fraction * 20), f"Decoding segments ({done}/{len(jobs)})...")
+
+        results = self._pool.run(jobs, on_progress=on_progress) if jobs else []
+        try:
+            for (slot, src, seg, part, path), (ok, err) in zip(pending, results):
+                if not ok:
+                    self._log(f"Failed to decode segment: {err}")
+                    return []
+                size = self._frame_size(src, seg)
+                if not size:
+                    return []
+                store.hold([path])
+                self._held_frames.append(path)
+                os.replace(part, path)
+                found[slot] = store.add(path, seg.start, seg.end, size[0], size[1], self._task.profile.fps)
+        finally:
+            for _, _, _, part, _ in pending:
+                if os.path.exists(part):
+                    os.remove(part)
+
+        store.evict()
+        spans = []
+        for frame_set, (_, seg) in zip(found, self._segment_sources()):
+            first, last = frame_set.span((seg.start - frame_set.start) / speed, (seg.end - frame_set.start) / speed)
+            spans.append((frame_set, first, last))
+        return spans
+
+    def _run_chunked(self, tmp_dir: str) -> tuple[bool, str]:
+        """
+        Two-pass export whose final stage runs in parts.
+
+        After a streamed palette pass, the timeline is cut into chunks that
+        are each decoded, mapped to the shared palette and encoded on their
+        own, so long exports keep every core busy and reversed playback only
+        ever holds one chunk of frames.
+        """
+        ok, err, palette_path = self._generate_raw_palette(tmp_dir)
+        if not ok:
+            return False, f"Palette generation failed: {err}"
+
+        # Same 4:4:4 frames the palette was built from
+        inputs = [
+            (
+                src,
+                seg.start,
+                seg.end,
+                ",".join(self._build_segment_filters(seg.file_id) + ["format=yuv444p"]),
+                self._decode_args(seg.file_id),
+                self._keyframes(seg.file_id),
+            )
+            for src, seg in self._segment_sources()
+        ]
+        speed = self._task.profile.speed_multiplier or 1.0
+        chunks = self._plan_chunks(inputs, speed, self._chunk_limit)
+        ok, err = self._encode_chunked(chunks, palette_path, tmp_dir, self._task.output_path)
+        if not ok:
+            return False, f"GIF creation failed: {err}"
+        return True, ""
+
+    def _generate_raw_palette(self, tmp_dir: str) -> tuple[bool, str, str]:
+        """
+        Build the palette from unencoded frames, unless an identical one is cached.
+
+        Returns:
+            (success, error message, palette path)
+        """
+        palette_key = self._palette_cache_key("raw")
+        palette_path = self._reuse_palette(tmp_dir, palette_key)
+        if palette_path:
+            return True, "", palette_path
+
+        palette_path = os.path.join(tmp_dir, "palette.png")
+        cmd = [
+            self._task.ffmpeg,
+            "-y",
+            "-f", "yuv4mpegpipe",
+            "-i", "pipe:0",
+            "-vf", self._build_palettegen_filter(),
+            palette_path,
+        ]
+        ok, err = self._stream_segments(cmd, "Streaming frames to palette generator", 5, 45)
+        if not ok:
+            return False, err, ""
+        return True, "", self._store_palette(palette_key, palette_path)
+
+    def _chunk_frames(self) -> int:
+        """
+        Most output frames per final-stage part, or 0 to encode in one pass.
+
+        Long exports are split so FFmpeg's GIF encoder runs on every core (the
+        built-in encoder already does). Reverse and boomerang are also split
+        so the frames held by the reverse filter fit reverse_memory_mb, shared
+        by the parts that run at once.
+        """
+        profile = self._task.profile
+        speed = profile.speed_multiplier or 1.0
+        duration = sum(seg.duration for _, seg in self._segment_sources()) / speed
+        total_frames = math.ceil(duration * profile.fps)
+        workers = 1 if self._builtin_encoder else (self._task.max_workers or default_worker_count())
+
+        limit = 0
+        parts = min(workers, int(duration // _CHUNK_MIN_SECONDS))
+        if parts > 1 and not self._builtin_encoder:
+            limit = math.ceil(total_frames / parts)
+
+        if profile.reverse or profile.boomerang:
+            frame_bytes = self._frame_bytes()
+            budget = self._task.reverse_memory_mb * 1024 * 1024 // max(1, workers)
+            budget_frames = max(1, budget // frame_bytes)
+            if budget_frames < total_frames:
+                limit = min(limit or budget_frames, budget_frames)
+                self._log(
+                    f"Reversing in parts of at most {budget_frames} frames "
+                    f"({budget_frames * frame_bytes / (1024 * 1024):.0f} MB each, "
+                    f"{self._task.reverse_memory_mb} MB budget)"
+                )
+        return limit
+
+    def _frame_bytes(self) -> int:
+        """Memory of one output frame, measured from the first segment's filtered frames"""
+        for src, seg in self._segment_sources()[:1]:
+            size = self._frame_size(src, seg)
+            if size:
+                return size[0] * size[1] * _REVERSE_BYTES_PER_PIXEL
+
+        # Unknown: assume 16:9 at the output width, or 1080p
+        width = self._task.profile.width or 1920
+        return width * (width * 9 // 16) * _REVERSE_BYTES_PER_PIXEL
+
+    def _frame_size(self, src: str, seg: Segment) -> Optional[tuple[int, int]]:
+        """Width and height of a segment's filtered frames, from decoding one frame"""
+        cmd = self._build_stream_cmd(src, seg)
+        cmd[-1:-1] = ["-frames:v", "1"]
+        proc = self._pool.spawn(ProcessJob(cmd=cmd, label="probe"), stdout=subprocess.PIPE)
+        if proc is None:
+            return None
+        try:
+            header = proc.stdout.readline()
+            proc.stdout.read()
+        finally:
+            proc.stdout.close()
+            self._pool.reap(proc)
+        fields = {tok[:1]: tok[1:] for tok in header.split()}
+        try:
+            return int(fields[b"W"]), int(fields[b"H"])
+        except (KeyError, ValueError):
+            return None
+
+    def _finish_dedupe(self) -> None:
+        """
+        Give the output the full playing time and report how many frames mpdecimate removed.
+
+        The muxer takes each delay from the next frame's timestamp, so the
+        time of frames dropped after the last kept one is added back to it.
+        """
+        profile = self._task.profile
+        speed = profile.speed_multiplier or 1.0
+        expected = sum(round(seg.duration / speed * profile.fps) for _, seg in self._segment_sources())
+        expected *= 2 if profile.boomerang else 1
+        try:
+            pad_gif_duration(self._task.output_path, math.floor(100 * expected / profile.fps + 0.5))
+            with open(self._task.output_path, "rb") as f:
+                kept = len(read_gif_blocks(f.read()).images)
+        except (OSError, ValueError):
+            return
+        self._log(f"Dedupe: removed {max(0, expected - kept)} of {expected} frames")
+
+    def _log_peak_memory(self) -> None:
+        """Report the largest FFmpeg process of this export, where the OS tells"""
+        peak = self._pool.peak_memory_mb
+        if peak is not None:
+            self._log(f"Peak FFmpeg memory: {peak:.0f} MB (reverse budget {self._task.reverse_memory_mb} MB)")
+
+    def _segment_sources(self) -> List[tuple[str, Segment]]:
+        """(source path, segment) for every segment whose source is known"""
+        return [
+            (self._task.file_lookup[seg.file_id], seg)
+            for seg in self._task.segments
+            if self._task.file_lookup.get(seg.file_id)
+        ]
+
+    def _plan_chunks(
+        self,
+        inputs: List[tuple[str, float, float, str, List[str], Optional[List[float]]]],
+        scale: float,
+        max_frames: int,
+    ) -> List[_EncodeChunk]:
+        """
+        Cut inputs into chunks of at most ``max_frames`` whole output frames.
+
+        Chunks never span two inputs, and each input is cut into equal parts
+        so no tiny leftover chunk is made.
+
+        Args:
+            inputs: (path, start, end, filters, decoder options, keyframe
+                index) in playback order; start and end are input seconds,
+                filters turn input frames into output frames
+            scale: Input seconds per output second (the speed multiplier for
+                sources, 1.0 for clips that already have it applied)
+            max_frames: Most output frames per chunk
+        """
+        fps = self._task.profile.fps
+        chunks = []
+        for src, start, end, filters, decode_args, keyframes in inputs:
+            frames = max(1, round((end - start) / scale * fps))
+            pieces = math.ceil(frames / max_frames)
+            step = math.ceil(frames / pieces) / fps * scale  # Input seconds per chunk
+            for k in range(pieces):
+                lo = start + k * step
+                hi = end if k == pieces - 1 else start + (k + 1) * step
+                chunks.append(_EncodeChunk(src, lo, hi, filters, (hi - lo) / scale, decode_args, keyframes))
+        return chunks
+
+    def _encode_chunked(
+        self, chunks: List[_EncodeChunk], palette_path: str, tmp_dir: str, output: str
+    ) -> tuple[bool, str]:
+        """
+        Encode chunks into output, reversing each one on its own for backward playback.
+
+        FFmpeg's encoder writes a GIF part per chunk, in parallel, and the
+        parts are stitched. For boomerang the backward half is made from the
+        forward parts, so the source is decoded and filtered only once. The
+        built-in encoder reads the chunks one after another from a single
+        stream instead.
+        """
+        profile = self._task.profile
+        forward = [] if profile.reverse and not profile.boomerang else list(chunks)
+        backward = list(reversed(chunks)) if profile.reverse or profile.boomerang else []
+
+        if self._builtin_encoder:
+            jobs = [
+                ProcessJob(cmd=self._build_chunk_cmd(chunk, palette_path, False), label=f"part {idx}")
+                for idx, chunk in enumerate(forward, start=1)
+            ] + [
+                ProcessJob(cmd=self._build_chunk_cmd(chunk, palette_path, True), label=f"part {idx}")
+                for idx, chunk in enumerate(backward, start=len(forward) + 1)
+            ]
+            self._log(f"Encoding {len(jobs)} parts in sequence")
+            self._progress(60, f"Encoding {len(jobs)} parts...")
+            stream = _PipedParts(self._pool, jobs)
+            try:
+                ok, err = self._encode_frames(stream, output)
+            finally:
+                stream.close()
+            if self._cancelled:
+                return False, "Cancelled"
+            return ok, err
+
+        paths: List[str] = []
+
+        def part_job(cmd: List[str], duration: float) -> ProcessJob:
+            paths.append(os.path.join(tmp_dir, f"part_{len(paths) + 1:03d}.gif"))
+            return ProcessJob(
+                cmd=cmd + self._build_gif_output_args() + [paths[-1]],
+                duration=duration,
+                label=f"part {len(paths)}",
+            )
+
+        stages = [[part_job(self._build_chunk_cmd(chunk, palette_path, False), chunk.duration) for chunk in forward]]
+        if profile.boomerang:
+            # The backward half replays the forward parts' frames, which the
+            # palette maps back to the same colors exactly
+            forward_paths = list(paths)
+            stages.append([
+                part_job(self._build_reverse_part_cmd(path, palette_path), chunk.duration)
+                for path, chunk in zip(reversed(forward_paths), backward)
+            ])
+        else:
+            stages[0] += [part_job(self._build_chunk_cmd(chunk, palette_path, True), chunk.duration) for chunk in backward]
+
+        self._log(f"Encoding {len(paths)} GIF parts in parallel")
+        done_before = 0
+        for idx, jobs in enumerate(stages):
+            lo = 60 + 35 * idx // len(stages)
+            hi = 60 + 35 * (idx + 1) // len(stages)
+
+            def on_progress(fraction: float, done: int) -> None:
+                self._progress(lo + int(fraction * (hi - lo)), f"Encoding GIF parts ({done_before + done}/{len(paths)})...")
+
+            results = self._pool.run(jobs, on_progress=on_progress)
+            if self._cancelled:
+                return False, "Cancelled"
+            for job, (ok, err) in zip(jobs, results):
+                if not ok:
+                    return False, f"{job.label}: {err}"
+            if self._build_dedupe_filter():
+                for job in jobs:
+                    pad_gif_duration(job.cmd[-1], math.floor(100 * round(job.duration * profile.fps) / profile.fps + 0.5))
+            done_before += len(jobs)
+
+        self._progress(95, "Joining GIF parts...")
+        try:
+            frames = stitch_gifs(paths, output)
+        except (ValueError, OSError) as e:
+            return False, f"could not join GIF parts ({e})"
+        self._log(f"Joined {len(paths)} GIF parts ({frames} frames)")
+        return True, ""
+
+    def _build_chunk_cmd(self, chunk: _EncodeChunk, palette_path: str, reverse: bool) -> List[str]:
+        """Build the command that maps one chunk to the shared palette (output args follow)"""
+        seek_args, trim = self._seek_input(chunk.src, chunk.start, chunk.end, chunk.keyframes)
+        chain = ",".join(trim + [f for f in (chunk.filters, "reverse" if reverse else "", self._build_dedupe_filter()) if f])
+        chain = chain or "null"
+        cmd = [self._task.ffmpeg, "-y"] + chunk.decode_args + seek_args + [
+            "-i", palette_path,
+            "-filter_complex", f"[0:v]{chain}[v];[v][1:v]{self._build_paletteuse_filter()}",
+        ]
+        if self._builtin_encoder:
+            from gif_converter.gif import FRAME_PIPE_ARGS
+            cmd += FRAME_PIPE_ARGS
+        return cmd
+
+    def _build_reverse_part_cmd(self, part_path: str, palette_path: str) -> List[str]:
+        """Build the command that plays an encoded GIF part backwards (output args follow)"""
+        chain = "reverse"
+        dedupe = self._build_dedupe_filter()
+        if dedupe:
+            # Deduplicated parts have variable frame delays; back to a constant rate
+            # first, so every frame keeps its own delay when played backwards
+            chain = f"fps={self._task.profile.fps},reverse,{dedupe}"
+        return [
+            self._task.ffmpeg,
+            "-y",
+            "-i", part_path,
+            "-i", palette_path,
+            "-filter_complex", f"[0:v]{chain}[v];[v][1:v]paletteuse=dither=none",
+        ]
+
+    def _stream_segments(
+        self,
+        consumer_cmd: List[str],
+        stage: str,
+        lo: int,
+        hi: int,
+        output: Optional[str] = None,
+    ) -> tuple[bool, str]:
+        """
+        Pipe every segment, in order, as one yuv4mpegpipe stream into the consumer's stdin.
+
+        With the built-in encoder, ``output`` is the GIF it writes from the
+        consumer's stdout while frames are still being fed in.
+        """
+        def feed(stdin: BinaryIO) -> tuple[bool, str]:
+            header = None
+            total = len(self._task.segments)
+            for idx, seg in enumerate(self._task.segments, start=1):
+                src = self._task.file_lookup.get(seg.file_id)
+                if not src:
+                    self._log(f"Warning: Missing source for segment {seg.id}")
+                    continue
+
+                self._progress(lo + int((idx - 1) / max(1, total) * (hi - lo)), f"{stage} ({idx}/{total})...")
+                producer = self._pool.spawn(
+                    ProcessJob(cmd=self._build_stream_cmd(src, seg), label=f"seg {idx}"),
+                    stdout=subprocess.PIPE,
+                )
+                if producer is None:
+                    return False, "Cancelled"
+
+                ok, err = True, ""
+                try:
+                    # Each producer starts with its own stream header; only the first
+                    # one is forwarded, the rest must describe the same geometry
+                    seg_header = producer.stdout.readline()
+                    if not seg_header:
+                        ok, err = False, f"segment {idx} produced no frames"
+                    elif header is None:
+                        header = seg_header
+                        stdin.write(header)
+                    elif _y4m_geometry(seg_header) != _y4m_geometry(header):
+                        ok, err = False, f"segment {idx} has a different frame size or rate"
+
+                    if ok:
+                        shutil.copyfileobj(producer.stdout, stdin, 1 << 20)
+                finally:
+                    producer.stdout.close()
+                    code = self._pool.reap(producer)
+
+                if ok and code != 0:
+                    ok, err = False, f"segment {idx} extraction exit code {code}"
+                if not ok:
+                    return ok, err
+            return True, ""
+
+        return self._pipe_into(consumer_cmd, feed, output)
+
+    def _pipe_into(
+        self,
+        consumer_cmd: List[str],
+        feed: Callable[[BinaryIO], tuple[bool, str]],
+        output: Optional[str] = None,
+    ) -> tuple[bool, str]:
+        """
+        Run a consumer process while ``feed`` writes frames to its stdin.
+
+        With the built-in encoder, ``output`` is the GIF it writes from the
+        consumer's stdout while frames are still being fed in.
+        """
+        encode = output is not None and self._builtin_encoder
+        consumer = self._pool.spawn(
+            ProcessJob(cmd=consumer_cmd, label="encode"),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE if encode else subprocess.DEVNULL,
+        )
+        if consumer is None:
+            return False, "Cancelled"
+
+        encode_result = [(True, "")]
+        encode_thread = None
+        if encode:
+            def run_encoder() -> None:
+                encode_result[0] = self._encode_frames(consumer.stdout, output)
+                consumer.stdout.close()
+
+            encode_thread = threading.Thread(target=run_encoder, daemon=True)
+            encode_thread.start()
+
+        try:
+            ok, err = feed(consumer.stdin)
+        except (BrokenPipeError, OSError) as e:
+            ok, err = False, f"encoder stopped reading frames ({e})"
+        finally:
+            try:
+                consumer.stdin.close()
+            except OSError:
+                pass
+            if encode_thread is not None:
+                encode_thread.join()
+            code = self._pool.reap(consumer)
+
+        if self._cancelled:
+            return False, "Cancelled"
+        if ok and code != 0:
+            ok, err = False, f"exit code {code}"
+        if ok and not encode_result[0][0]:
+            ok, err = encode_result[0]
+        return ok, err
+
+    def _build_stream_cmd(self, src: str, seg: Segment) -> List[str]:
+        """Build the command that writes a filtered segment as raw frames to stdout"""
+        seek_args, trim = self._seek_input(src, seg.start, seg.end, self._keyframes(seg.file_id))
+        cmd = [self._task.ffmpeg] + self._decode_args(seg.file_id) + seek_args
+
+        filter_str = ",".join(trim + self._build_segment_filters(seg.file_id))
+        if filter_str:
+            cmd += ["-vf", filter_str]
+
+        # 4:4:4 keeps full chroma resolution, so nothing is lost before paletteuse
+        cmd += [
+            "-pix_fmt", "yuv444p",
+            "-an",
+            "-f", "yuv4mpegpipe",
+            "pipe:1",
+        ]
+        return cmd
+
+    def _extract_segments(self, tmp_dir: str) -> List[_Clip]:
+        """
+        Extract video segments and apply basic filters, several at a time.
+
+        Segments that start on a keyframe are stream-copied instead, and their
+        filters are left to the passes that read the clips. Re-encoded
+        segments of one source that overlap or nearly touch are decoded in
+        one run that writes all of their clips.
+        """
+        output_clips = []
+        pending = []  # (clip index, cache key, extension) of clips extracted by this run
+        jobs = []
+        encode = []  # (segment number, source, segment, clip path) of clips to re-encode
+        total = len(self._task.segments)
+        speed = self._task.profile.speed_multiplier or 1.0
+        cache = self._clip_cache
+
+        for idx, seg in enumerate(self._task.segments, start=1):
+            src = self._task.file_lookup.get(seg.file_id)
+            if not src:
+                self._log(f"Warning: Missing source for segment {seg.id}")
+                continue
+
+            plan = self._extract_plan(seg)
+            self._log(f"Segment {idx}: {plan.describe()}")
+            ext = _COPY_CLIP_EXT if plan.copy else ".mp4"
+            key = self._clip_cache_key(src, seg)
+            cached = cache.get(key, ext) if cache else None
+            if cached:
+                output_clips.append(self._clip_for(cached, seg, plan))
+                continue
+
+            clip_path = os.path.join(tmp_dir, f"clip_{idx:03d}{ext}")
+            if plan.copy:
+                cmd = self._build_copy_cmd(src, seg, clip_path)
+                jobs.append(ProcessJob(cmd=cmd, duration=seg.duration, label=f"seg {idx}"))
+            else:
+                encode.append((idx, src, seg, clip_path))
+            pending.append((len(output_clips), key, ext))
+            output_clips.append(self._clip_for(clip_path, seg, plan))
+
+        for group in self._decode_groups([seg for _, _, seg, _ in encode]):
+            members = [encode[i] for i in group]
+            numbers = "+".join(f"{idx}" for idx, _, _, _ in members)
+            src, segs, paths = members[0][1], [m[2] for m in members], [m[3] for m in members]
+            if len(members) == 1:
+                cmd = self._build_extract_cmd(src, segs[0], paths[0])
+            else:
+                cmd = self._build_group_extract_cmd(src, segs, paths)
+                start, end = min(seg.start for seg in segs), max(seg.end for seg in segs)
+                self._log(f"Segments {numbers.replace('+', ', ')}: decoded together ({start:g}s to {end:g}s)")
+            span = max(seg.end for seg in segs) - min(seg.start for seg in segs)
+            jobs.append(ProcessJob(cmd=cmd, duration=span / speed, label=f"seg {numbers}"))
+
+        if cache:
+            self._log(cache.stats_text("Clip"))
+            # Keep this export's clips, cached or about to be, until the GIF is written
+            extracted = {clip_idx for clip_idx, _, _ in pending}
+            held = [clip.path for i, clip in enumerate(output_clips) if i not in extracted]
+            held += [cache.path_for(key, ext) for _, key, ext in pending]
+            cache.hold(held)
+            self._held_clips += held
+
+        def on_progress(fraction: float, done: int) -> None:
+            self._progress(
+                5 + int(fraction * 20),
+                f"Extracting segments ({done}/{len(jobs)})..."
+            )
+
+        self._progress(5, f"Extracting segments (0/{len(jobs)} of {total})...")
+        results = self._pool.run(jobs, on_progress=on_progress)
+
+        for job, (ok, err) in zip(jobs, results):
+            if not ok:
+                self._log(f"Failed to extract {job.label}: {err}")
+                return []
+
+        if cache:
+            for clip_idx, key, ext in pending:
+                clip = output_clips[clip_idx]
+                clip.path = cache.put(key, ext, clip.path)
+
+        # Clip order follows segment order, independent of completion order
+        return output_clips
+
+    def _frames_key(self, src: str, seg: Segment) -> str:
+        """Identity of a segment's filtered frames: source file, range and filters"""
+        return make_cache_key(
+            source_fingerprint(src),
+            f"{seg.start}",
+            f"{seg.end}",
+            " ".join(self._decode_args(seg.file_id)),
+            ",".join(self._build_segment_filters(seg.file_id)),
+        )
+
+    def _clip_cache_key(self, src: str, seg: Segment) -> str:
+        """
+        Cache key of an extracted clip: its frames plus the intermediate codec.
+
+        A stream-copied clip holds source packets, so only the source and the
+        copied range count, and any profile can reuse it.
+        """
+        plan = self._extract_plan(seg)
+        if plan.copy:
+            return make_cache_key(source_fingerprint(src), "copy", f"{plan.keyframe}", f"{seg.end}")
+        return make_cache_key(self._frames_key(src, seg), " ".join(_CLIP_CODEC_ARGS))
+
+    def _palette_cache_key(self, frames: str) -> str:
+        """
+        Cache key of the palette for this export.
+
+        Args:
+            frames: "clips" when the palette is built from encoded intermediate
+                clips, "raw" when it is built from unencoded frames, "store"
+                when it is built from frames in the frame store, "sampled"
+                when it is quantized from sampled source frames
+        """
+        parts = [frames]
+        for seg in self._task.segments:
+            src = self._task.file_lookup.get(seg.file_id)
+            if not src:
+                continue
+            key = self._clip_cache_key(src, seg) if frames == "clips" else self._frames_key(src, seg)
+            if frames == "clips" and self._extract_plan(seg).copy:
+                key = make_cache_key(key, self._frames_key(src, seg))  # Copied clips are filtered when read
+            parts.append(key)
+        parts.append(self._build_palettegen_filter())
+        return make_cache_key(*parts)
+
+    def _reuse_palette(self, tmp_dir: str, key: str) -> Optional[str]:
+        """Return a palette that needs no palettegen run: the task's shared one, a sampled one or a cached one"""
+        if self._task.palette_path:
+            self._log("Using the shared batch palette, skipping palette generation")
+            return self._task.palette_path
+        return self._sampled_palette(tmp_dir) or self._lookup_palette(key)
+
+    def _lookup_palette(self, key: str) -> Optional[str]:
+        """Return a cached palette for key, logging the palette cache counters"""
+        cache = self._palette_cache
+        if cache is None:
+            return None
+        path = cache.get(key, ".png")
+        self._log(cache.stats_text("Palette"))
+        if path:
+            self._log("Reusing cached palette, skipping palette generation")
+        return path
+
+    def _store_palette(self, key: str, palette_path: str) -> str:
+        """Move a freshly generated palette into the cache, returning its new path"""
+        if self._palette_cache is None or not os.path.exists(palette_path):
+            return palette_path
+        return self._palette_cache.put(key, ".png", palette_path)
+
+    def _all_clips_cached(self) -> bool:
+        """Check whether every segment already has a cached clip"""
+        cache = self._clip_cache
+        if cache is None:
+            return False
+        for seg in self._task.segments:
+            src = self._task.file_lookup.get(seg.file_id)
+            ext = _COPY_CLIP_EXT if self._extract_plan(seg).copy else ".mp4"
+            if not src or not cache.contains(self._clip_cache_key(src, seg), ext):
+                return False
+        return bool(self._task.segments)
+
+    def _extract_plan(self, seg: Segment) -> ExtractPlan:
+        """Plan whether the clip-file pipeline stream-copies a segment or re-encodes it"""
+        info = self._task.source_info.get(seg.file_id)
+        return plan_extraction(self._keyframes(seg.file_id), seg.start, info.fps if info else 0.0)
+
+    def _clip_for(self, path: str, seg: Segment, plan: ExtractPlan) -> _Clip:
+        """Describe how the later passes read the clip extracted for seg"""
+        if not plan.copy:
+            return _Clip(path, 0.0, seg.duration / (self._task.profile.speed_multiplier or 1.0))
+        # The copy starts at the seek point, where the clip's timestamps start at zero
+        seek = plan_seek(self._keyframes(seg.file_id), seg.start)
+        keyframes = [
+            round(k - seek.start, 6) for k in self._keyframes(seg.file_id) if plan.keyframe <= k < seg.end
+        ]
+        return _Clip(
+            path,
+            seek.trim,
+            seek.trim + seg.duration,
+            ",".join(self._build_segment_filters(seg.file_id)),
+            self._decode_args(seg.file_id),
+            [max(0.0, k) for k in keyframes],
+        )
+
+    def _build_copy_cmd(self, src: str, seg: Segment, output: str) -> List[str]:
+        """Build the command that stream-copies a segment from the keyframe it starts on"""
+        seek_args, _ = self._seek_input(src, seg.start, seg.end, self._keyframes(seg.file_id))
+        return [self._task.ffmpeg, "-y"] + seek_args + [
+            "-map", "0:v:0",
+            "-c", "copy",
+            "-copypriorss", "0",  # Open-GOP frames that display before the keyframe stay out
+            "-an",
+            output,
+        ]
+
+    def _decode_groups(self, segments: List[Segment]) -> List[List[int]]:
+        """
+        Group the segments that are decoded in one read (see plan_decode_groups).
+
+        Returns:
+            Groups of indexes into segments, each in playback order, ordered by
+            their first segment
+        """
+        by_file: Dict[str, List[int]] = {}
+        for pos, seg in enumerate(segments):
+            by_file.setdefault(seg.file_id, []).append(pos)
+        groups = []
+        for file_id, positions in by_file.items():
+            spans = [(segments[pos].start, segments[pos].end) for pos in positions]
+            for group in plan_decode_groups(spans, self._keyframes(file_id)):
+                groups.append(sorted(positions[i] for i in group))
+        return sorted(groups)
+
+    def _read_together(
+        self, src: str, segs: List[Segment], idx: int, outputs: List[str]
+    ) -> tuple[List[str], List[str]]:
+        """
+        Input options and filter graph that decode several segments of one source in a single read.
+
+        The source is read once from the first start to the last end and
+        split; each branch is trimmed to its segment, with the timestamps a
+        seek of its own would give, and filtered. The read starts on a
+        keyframe, or else on a whole second: both fall exactly on the time
+        base, so every branch gets the same frames as a separate read.
+
+        Args:
+            idx: Input number the source gets
+            outputs: Output label of each segment's branch
+
+        Returns:
+            (input options ending in -i src, filter graph parts)
+        """
+        file_id = segs[0].file_id
+        seek = plan_seek(self._keyframes(file_id), min(seg.start for seg in segs))
+        if seek.trim is None:
+            seek = SeekPlan(float(math.floor(seek.start)))
+        filters = self._build_segment_filters(file_id)
+
+        graph = [f"[{idx}:v]split={len(segs)}" + "".join(f"[in{idx}_{i}]" for i in range(len(segs)))]
+        for i, (seg, label) in enumerate(zip(segs, outputs)):
+            trim = SeekPlan(seek.start, round(seg.start - seek.start, 6), round(seg.duration, 6)).filters()
+            graph.append(f"[in{idx}_{i}]{','.join(trim + filters)}{label}")
+
+        input_args = self._decode_args(file_id) + [
+            "-ss", f"{seek.start}",
+            "-to", f"{max(seg.end for seg in segs)}",
+            "-i", src,
+        ]
+        return input_args, graph
+
+    def _build_group_extract_cmd(self, src: str, segs: List[Segment], outputs: List[str]) -> List[str]:
+        """Build the command that extracts several segments of one source, each to its own clip, from one decode"""
+        labels = [f"[out{i}]" for i in range(len(segs))]
+        input_args, graph = self._read_together(src, segs, 0, labels)
+        cmd = [self._task.ffmpeg, "-y"] + input_args + ["-filter_complex", ";".join(graph)]
+        for label, output in zip(labels, outputs):
+            cmd += ["-map", label] + _CLIP_CODEC_ARGS + ["-an", output]
+        return cmd
+
+    def _build_extract_cmd(self, src: str, seg: Segment, output: str) -> List[str]:
+        """Build the command that extracts a single segment with filters applied"""
+        seek_args, trim = self._seek_input(src, seg.start, seg.end, self._keyframes(seg.file_id))
+        filter_str = ",".join(trim + self._build_segment_filters(seg.file_id)) or None
+
+        # Build FFmpeg command
+        cmd = [self._task.ffmpeg, "-y"] + self._decode_args(seg.file_id) + seek_args
+
+        if filter_str:
+            cmd += ["-vf", filter_str]
+
+        cmd += _CLIP_CODEC_ARGS + [
+            "-an",  # No audio for intermediate files
+            output
+        ]
+
+        return cmd
+
+    def _resolve_crops(self) -> None:
+        """
+        Look up the black-bar crop of every source when the profile auto-crops.
+
+        Crops detected with the media info come with the task; the others are
+        detected here, sampling the file's segments, and logged.
+        """
+        self._crops = {}
+        if not self._task.profile.auto_crop:
+            return
+        ranges: Dict[str, List[tuple[float, float]]] = {}
+        for seg in self._task.segments:
+            ranges.setdefault(seg.file_id, []).append((seg.start, seg.end))
+
+        for file_id, spans in ranges.items():
+            src = self._task.file_lookup.get(file_id)
+            if not src:
+                continue
+            crop = self._task.crop_filters.get(file_id)
+            if crop is None:
+                crop = detect_crop(self._task.ffmpeg, src, crop_sample_times(spans))
+                if crop is None:
+                    self._log(f"Auto-crop: could not scan {os.path.basename(src)}, keeping the full frame")
+                    continue
+            self._crops[file_id] = crop
+            self._log(f"Auto-crop {os.path.basename(src)}: {crop or 'no black bars'}")
+
+    def _log_filter_plans(self) -> None:
+        """Log the keyframe index, decoder options and filter chain planned for each source"""
+        logged = set()
+        for seg in self._task.segments:
+            src = self._task.file_lookup.get(seg.file_id)
+            if src and seg.file_id not in logged:
+                logged.add(seg.file_id)
+                name = os.path.basename(src)
+                keyframes = self._keyframes(seg.file_id)
+                if keyframes:
+                    gap = max(b - a for a, b in zip(keyframes, keyframes[1:])) if len(keyframes) > 1 else 0.0
+                    self._log(f"Keyframe index for {name}: {len(keyframes)} keyframes, at most {gap:.2f}s apart")
+                self._log(f"Decoder for {name}: {self._decode_plan(seg.file_id).describe()}")
+                self._log(f"Filter plan for {name}: {self._filter_plan(seg.file_id).describe()}")
+
+    def _keyframes(self, file_id: str) -> Optional[List[float]]:
+        """Keyframe index of a source, if it was probed with one"""
+        info = self._task.source_info.get(file_id)
+        return info.keyframes if info else None
+
+    def _seek_input(
+        self, src: str, start: float, end: Optional[float] = None, keyframes: Optional[List[float]] = None
+    ) -> tuple[List[str], List[str]]:
+        """
+        Open src at start, in two stages when a keyframe index is known.
+
+        The input seeks to the keyframe before start and the returned filters
+        trim the segment out, ahead of any other filter; without an index
+        FFmpeg's input seek finds the start and the filters only cut the end.
+
+        Returns:
+            (input options ending in -i src, trim filters)
+        """
+        plan = plan_seek(keyframes, start, end)
+        args = ["-ss", f"{plan.start}"]
+        if end is not None:
+            args += ["-to", f"{end}"]
+        return args + ["-i", src], plan.filters()
+
+    def _decode_plan(self, file_id: str) -> DecodePlan:
+        """Plan the decoder options (frame skipping, reduced size) for a source"""
+        duration = sum(seg.duration for seg in self._task.segments if seg.file_id == file_id)
+        return plan_decoder(
+            self._task.profile, self._task.source_info.get(file_id), self._crops.get(file_id, ""), duration
+        )
+
+    def _decode_args(self, file_id: str, skip_frames: bool = True) -> List[str]:
+        """
+        Decoder options to put before a source's -i.
+
+        Without skip_frames, only the size reduction is kept, which the filter
+        chain depends on; single-frame seeks must not skip the frame they want.
+        """
+        plan = self._decode_plan(file_id)
+        if skip_frames:
+            return plan.args
+        return ["-lowres", f"{plan.lowres}"] if plan.lowres else []
+
+    def _filter_plan(self, file_id: str, timing: bool = True) -> FilterPlan:
+        """Plan the per-segment filter chain (crop, speed, scale, fps, text) for a source"""
+        profile = self._task.profile
+        text_filter = None
+        if profile.text_overlay and profile.text_overlay.enabled and profile.text_overlay.text:
+            text_filter = self._build_text_filter(profile.text_overlay)
+        return plan_segment_filters(
+            profile,
+            source=self._task.source_info.get(file_id),
+            crop=self._crops.get(file_id, ""),
+            text_filter=text_filter,
+            timing=timing,
+            lowres=self._decode_plan(file_id).lowres,
+        )
+
+    def _build_segment_filters(self, file_id: str, timing: bool = True) -> List[str]:
+        """Build the per-segment filter chain; without timing, no speed or fps"""
+        return self._filter_plan(file_id, timing).chain()
+
+    def _build_text_filter(self, overlay: TextOverlay) -> Optional[str]:
+        """Build FFmpeg drawtext filter for text overlay"""
+        if not overlay.text:
+            return None
+
+        # Escape text for FFmpeg
+        text = overlay.text.replace(":", r"\:").replace("'", r"\'")
+
+        # Get position
+        x, y = overlay.get_ffmpeg_position(0, 0)  # Dimensions don't matter for expressions
+
+        # Build drawtext filter
+        parts = [
+            f"text='{text}'",
+            f"fontsize={overlay.font_size}",
+            f"fontcolor={overlay.font_color}",
+            f"x={x}",
+            f"y={y}",
+        ]
+
+        # Font family
+        if overlay.font_family:
+            parts.append(f"font='{overlay.font_family}'")
+
+        # Bold
+        if overlay.bold:
+            parts.append("bold=1")
+
+        # Outline/border
+        if overlay.outline_enabled:
+            parts.append(f"borderw={overlay.outline_width}")
+            parts.append(f"bordercolor={overlay.outline_color}")
+
+        # Background box
+        if overlay.background_enabled:
+            # Convert opacity (0.0-1.0) to alpha (0-255)
+            alpha = int(overlay.background_opacity * 255)
+            bg_color = overlay.background_color
+            parts.append(f"box=1")
+            parts.append(f"boxcolor={bg_color}@{alpha/255:.2f}")
+            parts.append(f"boxborderw={overlay.padding_x//2}")
+
+        return "drawtext=" + ":".join(parts)
+
+    def _build_palettegen_filter(self) -> str:
+        """Build the palettegen filter for the current profile"""
+        profile = self._task.profile
+        palette_filter = f"palettegen=max_colors={profile.colors}"
+        if profile.optimize_palette:
+            palette_filter += ":stats_mode=diff"
+        return palette_filter
+
+    def _build_paletteuse_filter(self) -> str:
+        """Build the paletteuse filter for the current profile"""
+        dither_map = {
+            "none": "none",
+            "bayer": "bayer:bayer_scale=5",
+            "sierra2_4a": "sierra2_4a",
+            "floyd_steinberg": "floyd_steinberg",
+        }
+        dither = dither_map.get(self._task.profile.dither, "sierra2_4a")
+        return f"paletteuse=dither={dither}"
+
+    def _build_playback_graph(self, src: str, out: str) -> Optional[str]:
+        """Build the reverse/boomerang part of a filter graph, or None for normal playback"""
+        profile = self._task.profile
+        if profile.boomerang:
+            # Boomerang: play forward, then backward
+            return f"{src}split[fwd][bwd];[bwd]reverse[rev];[fwd][rev]concat=n=2:v=1{out}"
+        if profile.reverse:
+            return f"{src}reverse{out}"
+        return None
+
+    def _build_paletteuse_graph(self, frames: str = "[0:v]", palette: str = "[1:v]") -> str:
+        """Build the final-stage graph for the frames and palette streams (inputs 0 and 1 by default)"""
+        paletteuse_filter = self._build_paletteuse_filter()
+        dedupe = self._build_dedupe_filter()
+
+        # Reverse/Boomerang handling
+        playback = self._build_playback_graph(frames, "[v]")
+        if playback:
+            if dedupe:
+                return f"{playback};[v]{dedupe}[dd];[dd]{palette}{paletteuse_filter}"
+            return f"{playback};[v]{palette}{paletteuse_filter}"
+        # Normal playback
+        if dedupe:
+            return f"{frames}{dedupe}[dd];[dd]{palette}{paletteuse_filter}"
+        return f"{frames}{palette}{paletteuse_filter}"
+
+    def _build_dedupe_filter(self) -> Optional[str]:
+        """
+        Build the mpdecimate filter that drops near-duplicate frames, or None.
+
+        FFmpeg's GIF muxer takes frame delays from timestamps, so the time of
+        a dropped frame is added to the frame before it. The built-in encoder
+        gets no timestamps and deduplicates on its own instead.
+        """
+        threshold = self._task.profile.dedupe_threshold
+        if not threshold or self._builtin_encoder:
+            return None
+        hi, lo, frac = _dedupe_limits(threshold)
+        return f"mpdecimate=hi={hi}:lo={lo}:frac={frac}"
+
+    def _use_builtin_encoder(self) -> bool:
+        """Decide between FFmpeg's GIF muxer and the built-in (lossy-capable) encoder"""
+        profile = self._task.profile
+        if profile.encoder != "builtin":
+            # The built-in encoder compresses in Python, many times slower than FFmpeg's,
+            # so only an explicit choice turns it on
+            if profile.lossy_compression:
+                self._log("FFmpeg's GIF encoder has no lossy mode; lossy compression is ignored "
+                          "(choose the built-in encoder to use it)")
+            if profile.optimize_frames:
+                self._log("FFmpeg's GIF encoder cannot store only changed pixels; frame optimization "
+                          "is ignored (choose the built-in encoder to use it)")
+            return False
+        try:
+            import gif_converter.gif  # noqa: F401 (needs NumPy)
+        except ImportError:
+            self._log("NumPy is not installed; using FFmpeg's GIF encoder without lossy compression "
+                      "or frame optimization")
+            return False
+        return True
+
+    def _build_output_cmd(
+        self, cmd: List[str], output: str, extra_outputs: Optional[List[str]] = None
+    ) -> List[str]:
+        """
+        Finish a final-stage command with its GIF output.
+
+        FFmpeg either writes the GIF itself or, for the built-in encoder,
+        pipes paletted frames to stdout. Extra outputs go after the GIF.
+        """
+        if self._builtin_encoder:
+            from gif_converter.gif import FRAME_PIPE_ARGS
+            return cmd + FRAME_PIPE_ARGS + (extra_outputs or [])
+        return cmd + self._build_gif_output_args() + [output] + (extra_outputs or [])
+
+    def _run_output_cmd(
+        self, cmd: List[str], output: str, extra_outputs: Optional[List[str]] = None
+    ) -> tuple[bool, str]:
+        """Run a final-stage command, feeding the built-in encoder if it is used"""
+        cmd = self._build_output_cmd(cmd, output, extra_outputs)
+        if not self._builtin_encoder:
+            return self._run_cmd(cmd)
+
+        proc = self._pool.spawn(ProcessJob(cmd=cmd), stdout=subprocess.PIPE)
+        if proc is None:
+            return False, "Cancelled"
+        try:
+            ok, err = self._encode_frames(proc.stdout, output)
+            if not ok:
+                proc.kill()
+        finally:
+            proc.stdout.close()
+            code = self._pool.reap(proc)
+
+        if self._cancelled:
+            return False, "Cancelled"
+        if ok and code != 0:
+            return False, f"exit code {code}"
+        return ok, err
+
+    def _encode_frames(self, stream, output: str) -> tuple[bool, str]:
+        """Encode paletted BMP frames from an FFmpeg pipe into the output GIF"""
+        from gif_converter.gif import GifEncoder
+
+        profile = self._task.profile
+        self._encoder = GifEncoder(
+            output,
+            fps=profile.fps,
+            loop_count=profile.loop_count,
+            colors=profile.colors,
+            lossy=profile.lossy_compression or 0,
+            optimize=profile.optimize_frames,
+            dedupe=_dedupe_limits(profile.dedupe_threshold) if profile.dedupe_threshold else None,
+            max_workers=self._task.max_workers or default_worker_count(),
+            on_log=self._log,
+        )
+        if self._cancelled:
+            return False, "Cancelled"
+        return self._encoder.encode(stream)
+
+    def _build_gif_output_args(self) -> List[str]:
+        """Build GIF muxer options (loop count)"""
+        profile = self._task.profile
+        args = []
+
+        # Loop settings
+        if profile.loop_count == 0:
+            args += ["-loop", "0"]  # Infinite loop
+        elif profile.loop_count > 0:
+            args += ["-loop", str(profile.loop_count)]
+        else:
+            args += ["-loop", "-1"]  # No loop
+
+        return args
+
+    def _sampled_palette(self, tmp_dir: str) -> Optional[str]:
+        """
+        Quantize the palette in NumPy from a sample of frames, if the profile asks for it.
+
+        The sample is a fixed number of evenly spaced frames plus the
+        keyframes of every segment (encoders place keyframes on scene cuts),
+        thinned to the same count. Only keyframes are decoded for the latter,
+        so palette time follows the sample size rather than the duration.
+
+        Returns:
+            Palette path, or None to build the palette with palettegen
+        """
+        if self._task.profile.palette_engine != "sampled":
+            return None
+        try:
+            from gif_converter.gif import quantize, read_ppm_frames, write_palette_png
+        except ImportError:
+            self._log("NumPy is not installed; generating the palette with palettegen")
+            return None
+
+        palette_key = self._palette_cache_key("sampled")
+        cached = self._lookup_palette(palette_key)
+        if cached:
+            return cached
+
+        sources = self._segment_sources()
+        total = sum(seg.duration for _, seg in sources)
+        if total <= 0:
+            return None
+
+        sample_dir = os.path.join(tmp_dir, "palette_samples")
+        os.makedirs(sample_dir, exist_ok=True)
+        jobs = []
+
+        # Evenly spaced frames: every Nth frame of the whole selection
+        for i in range(_PALETTE_SAMPLE_FRAMES):
+            offset = (i + 0.5) * total / _PALETTE_SAMPLE_FRAMES
+            for src, seg in sources:
+                if offset <= seg.duration or seg is sources[-1][1]:
+                    break
+                offset -= seg.duration
+            seek_args, trim = self._seek_input(
+                src, seg.start + min(offset, seg.duration), keyframes=self._keyframes(seg.file_id)
+            )
+            cmd = [self._task.ffmpeg, "-y"] + self._decode_args(seg.file_id, skip_frames=False) + seek_args
+            filters = trim + self._build_segment_filters(seg.file_id, timing=False)
+            if filters:
+                cmd += ["-vf", ",".join(filters)]
+            cmd += ["-frames:v", "1", "-an", os.path.join(sample_dir, f"even_{i:03d}.ppm")]
+            jobs.append(ProcessJob(cmd=cmd, label=f"sample {i + 1}"))
+
+        # Keyframes, at most one per gap so long segments do not dominate
+        gap = total / _PALETTE_SAMPLE_FRAMES
+        select = f"select='isnan(prev_selected_t)+gte(t-prev_selected_t,{gap:.3f})'"
+        for idx, (src, seg) in enumerate(sources, start=1):
+            jobs.append(ProcessJob(
+                cmd=[
+                    self._task.ffmpeg,
+                    "-y",
+                    "-skip_frame", "nokey",
+                    *self._decode_args(seg.file_id, skip_frames=False),
+                    "-ss", f"{seg.start}",
+                    "-to", f"{seg.end}",
+                    "-i", src,
+                    "-vf", ",".join([select] + self._build_segment_filters(seg.file_id, timing=False)),
+                    "-fps_mode", "passthrough",
+                    "-frames:v", f"{_PALETTE_SAMPLE_FRAMES}",
+                    "-an",
+                    os.path.join(sample_dir, f"key_{idx:03d}_%03d.ppm"),
+                ],
+                label=f"keyframes {idx}",
+            ))
+
+        self._progress(30, "Sampling frames for the palette...")
+        for job, (ok, err) in zip(jobs, self._pool.run(jobs)):
+            if not ok:
+                self._log(f"Palette sample {job.label} failed: {err}")
+        if self._cancelled:
+            return None
+
+        frames = []
+        keyframes = 0
+        for name in sorted(os.listdir(sample_dir)):
+            try:
+                with open(os.path.join(sample_dir, name), "rb") as f:
+                    found = list(read_ppm_frames(f.read()))
+            except (OSError, ValueError) as e:
+                self._log(f"Could not read palette sample {name}: {e}")
+                continue
+            frames += found
+            keyframes += len(found) if name.startswith("key_") else 0
+        if not frames:
+            self._log("No frames could be sampled; generating the palette with palettegen")
+            return None
+
+        colors = self._task.profile.colors
+        palette = quantize(frames, colors)
+        palette_path = os.path.join(tmp_dir, "palette_sampled.png")
+        write_palette_png(palette_path, palette)
+        self._log(
+            f"Sampled palette: {len(palette)} colors from {len(frames)} frames "
+            f"({keyframes} keyframes), palettegen skipped"
+        )
+        return self._store_palette(palette_key, palette_path)
+
+    def _clip_inputs(self, video_clips: List[_Clip], concat_file: str) -> tuple[List[str], List[str], str]:
+        """
+        Input options and filter graph that read the clips as one stream.
+
+        Re-encoded clips are joined by the concat demuxer (written to
+        concat_file when there are several). Once a clip was stream-copied,
+        every clip is its own input instead, copied ones seeked and filtered
+        like a source, and the concat filter joins them.
+
+        Returns:
+            (input options, filter graph parts, label of the joined stream)
+        """
+        if not any(clip.copied for clip in video_clips):
+            if len(video_clips) == 1:
+                return ["-i", video_clips[0].path], [], "[0:v]"
+            with open(concat_file, "w", encoding="utf-8") as f:
+                for clip in video_clips:
+                    f.write(_concat_entry(clip.path))
+            return ["-f", "concat", "-safe", "0", "-i", concat_file], [], "[0:v]"
+
+        input_args: List[str] = []
+        graph: List[str] = []
+        for idx, clip in enumerate(video_clips):
+            if clip.copied:
+                seek_args, trim = self._seek_input(clip.path, clip.start, clip.end, clip.keyframes)
+                input_args += clip.decode_args + seek_args
+                chain = ",".join(trim + ([clip.filters] if clip.filters else [])) or "null"
+            else:
+                input_args += ["-i", clip.path]
+                chain = "null"
+            graph.append(f"[{idx}:v]{chain}[c{idx}]")
+        if len(video_clips) == 1:
+            return input_args, graph, "[c0]"
+        labels = "".join(f"[c{idx}]" for idx in range(len(video_clips)))
+        graph.append(f"{labels}concat=n={len(video_clips)}:v=1:a=0[clips]")
+        return input_args, graph, "[clips]"
+
+    def _generate_palette(self, video_clips: List[_Clip], palette_path: str) -> tuple[bool, str]:
+        """Generate optimized color palette for GIF"""
+        concat_file = palette_path + ".concat.txt"
+        input_args, graph, stream = self._clip_inputs(video_clips, concat_file)
+        palette_filter = self._build_palettegen_filter()
+        if graph:
+            filter_args = ["-filter_complex", ";".join(graph + [f"{stream}{palette_filter}"])]
+        else:
+            filter_args = ["-vf", palette_filter]
+
+        cmd = [
+            self._task.ffmpeg,
+            "-y",
+        ] + input_args + filter_args + [
+            palette_path
+        ]
+
+        ok, err = self._run_cmd(cmd)
+
+        # Clean up concat file
+        if os.path.exists(concat_file):
+            try:
+                os.remove(concat_file)
+            except:
+                pass
+
+        return ok, err
+
+    def _create_gif(self, video_clips: List[_Clip], palette_path: str, output: str) -> tuple[bool, str]:
+        """Create GIF using video clips and palette"""
+        concat_file = output + ".concat.txt"
+        input_args, graph, stream = self._clip_inputs(video_clips, concat_file)
+        palette = f"[{len(video_clips)}:v]" if graph else "[1:v]"
+
+        cmd = [
+            self._task.ffmpeg,
+            "-y",
+        ] + input_args + [
+            "-i", palette_path,
+            "-filter_complex", ";".join(graph + [self._build_paletteuse_graph(stream, palette)]),
+        ]
+
+        ok, err = self._run_output_cmd(cmd, output)
+
+        # Clean up concat file
+        if os.path.exists(concat_file):
+            try:
+                os.remove(concat_file)
+            except:
+                pass
+
+        return ok, err
+
+    def _run_cmd(self, cmd: List[str]) -> tuple[bool, str]:
+        """Run FFmpeg command and capture output"""
+        return self._pool.run([ProcessJob(cmd=cmd)])[0]
@@ -0,0 +1,268 @@
+"""GIF size estimation from trial encodes of short sample windows"""
+
+from __future__ import annotations
+
+import math
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, List, Optional
+
+from gif_converter.models.media import Segment, GifExportProfile, ExportMode, MediaInfo
+from gif_converter.ffmpeg.engine import ExportEngine, GifExportTask
+from gif_converter.ffmpeg.gif_blocks import read_gif_blocks
+from gif_converter.ffmpeg.scheduler import default_worker_count
+
+# Two-sided 95% Student's t quantiles for 1-10 degrees of freedom
+_T95 = [12.71, 4.30, 3.18, 2.78, 2.57, 2.45, 2.36, 2.31, 2.26, 2.23]
+
+# Each window gets its own palette, which the full export does not; never
+# claim to be more precise than that
+_MIN_RELATIVE_MARGIN = 0.05
+
+# Margin used when only one window could be sampled
+_SINGLE_SAMPLE_MARGIN = 0.25
+
+
+@dataclass(slots=True)
+class SizeEstimate:
+    """Predicted GIF size with a 95% confidence interval"""
+    size_mb: float
+    low_mb: float
+    high_mb: float
+    samples: int  # Number of trial encodes the estimate is based on
+    exact: bool = False  # True when the whole selection was encoded
+
+    @property
+    def margin_mb(self) -> float:
+        return (self.high_mb - self.low_mb) / 2
+
+
+def output_duration(segments: List[Segment], profile: GifExportProfile) -> float:
+    """Playback duration of the exported GIF in seconds"""
+    duration = sum(seg.duration for seg in segments) / (profile.speed_multiplier or 1.0)
+    return duration * 2 if profile.boomerang else duration
+
+
+def sample_windows(segments: List[Segment], count: int, window: float) -> List[Segment]:
+    """
+    Pick evenly spaced sample windows across the concatenated segments.
+
+    Args:
+        segments: Segments in playback order
+        count: Number of windows
+        window: Window length in source seconds
+
+    Returns:
+        Segments covering the windows, in playback order
+    """
+    total = sum(seg.duration for seg in segments)
+    if total <= 0 or count <= 0:
+        return []
+
+    windows = []
+    for i in range(count):
+        center = (i + 0.5) * total / count
+        for seg in segments:
+            if center <= seg.duration or seg is segments[-1]:
+                break
+            center -= seg.duration
+        start = max(seg.start, seg.start + center - window / 2)
+        end = min(seg.end, start + window)
+        start = max(seg.start, end - window)
+        if end > start:
+            windows.append(Segment.new(seg.file_id, start, end, i + 1))
+    return windows
+
+
+def gif_frame_sizes(path: str) -> tuple[int, List[int]]:
+    """
+    Measure a GIF's structure.
+
+    Returns:
+        (bytes before the first frame, bytes per frame). Extensions such as the
+        graphic control block count towards the frame that follows them.
+    """
+    with open(path, "rb") as f:
+        blocks = read_gif_blocks(f.read())
+    return blocks.header_size, [image.size for image in blocks.images]
+
+
+class SizeEstimator:
+    """
+    Predicts the size of a GIF export by encoding a few sample windows.
+
+    Each window is a short, evenly spaced excerpt of the selection, encoded
+    with the real profile. The first frame of every window is measured apart
+    from the inter frames that follow it, since GIF only stores what changed
+    between frames; the estimate is extrapolated from both to the full frame
+    count, with a confidence interval from the spread between windows.
+    Short selections are simply encoded in full.
+
+    With a frame store, windows are sliced from frames decoded earlier, so
+    estimating again with other colors or dither decodes nothing.
+    """
+
+    def __init__(
+        self,
+        ffmpeg: str,
+        segments: List[Segment],
+        file_lookup: Dict[str, str],
+        samples: int = 5,
+        window: float = 1.0,
+        max_workers: int = 0,
+        frame_store_dir: Optional[str] = None,
+        crop_filters: Optional[Dict[str, str]] = None,
+        source_info: Optional[Dict[str, MediaInfo]] = None,
+        on_log: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self._ffmpeg = ffmpeg
+        self._segments = segments
+        self._file_lookup = file_lookup
+        self._samples = samples
+        self._window = window
+        self._max_workers = max_workers or default_worker_count()
+        self._frame_store_dir = frame_store_dir
+        self._crop_filters = crop_filters or {}
+        self._source_info = source_info or {}
+        self._on_log = on_log
+
+        self._lock = threading.Lock()
+        self._engines: List[ExportEngine] = []
+        self._cancelled = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self) -> None:
+        """Stop every running trial encode"""
+        with self._lock:
+            self._cancelled = True
+            engines = list(self._engines)
+        for engine in engines:
+            engine.cancel()
+
+    def estimate(self, profile: GifExportProfile) -> Optional[SizeEstimate]:
+        """
+        Estimate the GIF size for a profile.
+
+        Returns:
+            The estimate, or None if cancelled or no trial encode succeeded
+        """
+        duration = output_duration(self._segments, profile)
+        if duration <= 0:
+            return None
+
+        tmp_dir = tempfile.mkdtemp(prefix="gifforge_est_")
+        try:
+            if duration <= self._samples * self._window * 1.5:
+                return self._encode_all(profile, tmp_dir)
+            return self._encode_samples(profile, duration, tmp_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _encode_all(self, profile: GifExportProfile, tmp_dir: str) -> Optional[SizeEstimate]:
+        """Encode the whole selection; its size is the answer"""
+        path = self._trial(profile, self._segments, os.path.join(tmp_dir, "full.gif"))
+        if path is None:
+            return None
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        return SizeEstimate(size_mb, size_mb, size_mb, samples=1, exact=True)
+
+    def _encode_samples(
+        self, profile: GifExportProfile, duration: float, tmp_dir: str
+    ) -> Optional[SizeEstimate]:
+        """Encode sample windows and extrapolate to the full selection"""
+        speed = profile.speed_multiplier or 1.0
+        windows = sample_windows(self._segments, self._samples, self._window * speed)
+
+        # Windows are encoded forward only; boomerang is accounted for in the frame count
+        trial_profile = replace(profile, reverse=False, boomerang=False)
+
+        def work(idx: int) -> Optional[tuple[int, List[int]]]:
+            path = self._trial(trial_profile, [windows[idx]], os.path.join(tmp_dir, f"sample_{idx}.gif"))
+            if path is None:
+                return None
+            try:
+                return gif_frame_sizes(path)
+            except (OSError, ValueError) as e:
+                self._log(f"Could not measure sample {idx + 1}: {e}")
+                return None
+
+        workers = min(self._max_workers, len(windows))
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            results = [r for r in executor.map(work, range(len(windows))) if r and r[1]]
+
+        if self._cancelled or not results:
+            return None
+
+        header = max(h for h, _ in results)
+        first_frames = [frames[0] for _, frames in results]
+        inter_rates = [
+            sum(frames[1:]) / (len(frames) - 1) if len(frames) > 1 else frames[0]
+            for _, frames in results
+        ]
+
+        # Every segment boundary starts a new scene, which costs about as much
+        # as a window's first frame
+        total_frames = max(1, round(duration * profile.fps))
+        cuts = min(total_frames, len(self._segments) * (2 if profile.boomerang else 1))
+        first_mean = statistics.fmean(first_frames)
+        inter_mean = statistics.fmean(inter_rates)
+        inter_frames = total_frames - cuts
+
+        size = header + cuts * first_mean + inter_frames * inter_mean
+
+        n = len(results)
+        if n > 1:
+            t = _T95[n - 2] if n - 2 < len(_T95) else 1.96
+            margin = t * inter_frames * statistics.stdev(inter_rates) / math.sqrt(n)
+        else:
+            margin = size * _SINGLE_SAMPLE_MARGIN
+        margin = max(margin, size * _MIN_RELATIVE_MARGIN)
+
+        mb = 1024 * 1024
+        self._log(
+            f"Size estimate from {n} sample(s): {size / mb:.2f} MB ±{margin / mb:.2f} "
+            f"({total_frames} frames, {inter_mean:.0f} bytes/frame)"
+        )
+        return SizeEstimate(size / mb, max(0.0, size - margin) / mb, (size + margin) / mb, samples=n)
+
+    def _trial(self, profile: GifExportProfile, segments: List[Segment], output: str) -> Optional[str]:
+        """Run one trial export, returning the output path on success"""
+        task = GifExportTask(
+            ffmpeg=self._ffmpeg,
+            segments=segments,
+            file_lookup=self._file_lookup,
+            profile=profile,
+            output_path=output,
+            mode=ExportMode.MERGED_SEGMENTS,
+            max_workers=1,
+            frame_store_dir=self._frame_store_dir,
+            crop_filters=self._crop_filters,
+            source_info=self._source_info,
+        )
+        with self._lock:
+            if self._cancelled:
+                return None
+            engine = ExportEngine(task, on_log=None)
+            self._engines.append(engine)
+
+        ok, message, _ = engine.run()
+
+        with self._lock:
+            self._engines.remove(engine)
+        if not ok:
+            if not self._cancelled:
+                self._log(f"Trial encode failed: {message}")
+            return None
+        return output
+
+    def _log(self, line: str) -> None:
+        if self._on_log:
+            self._on_log(line)
@@ -0,0 +1,359 @@
+"""Per-segment seeks, extraction, decoder options and filter chains, planned as data from the media info"""
+
+from __future__ import annotations
+
+import bisect
+import itertools
+import math
+from dataclasses import dataclass, field, replace
+from typing import List, Optional
+
+from gif_converter.models.media import GifExportProfile, MediaInfo
+
+# Work per input pixel of each filter, relative to scaling; only the ratios matter
+_PIXEL_COST = {
+    "crop": 0.0,  # Moves plane pointers
+    "setpts": 0.0,
+    "fps": 0.01,  # Passes frames on or drops them
+    "scale": 1.0,
+    "drawtext": 0.2,
+}
+
+# Filters that may trade places: they commute, so any order gives the same frames
+_MOVABLE = ("fps", "scale")
+
+# Decoders that can decode at 1/2, 1/4 or 1/8 size (FFmpeg's -lowres), by codec name
+_LOWRES_CODECS = {"mjpeg", "mpeg1video", "mpeg2video", "mpeg4", "h263", "h263p", "dvvideo", "jpeg2000"}
+_MAX_LOWRES = 3
+
+# Source frames per GIF frame from which non-reference frames are not decoded
+# at all: in IPB streams they are about half of the frames, so enough are left
+# for the fps filter to pick from
+_SKIP_NOREF_RATIO = 3.0
+
+# Skipped frames leave gaps the fps filter fills from the frame before, which
+# moves some GIF frames by one source frame. Below this many seconds of
+# segments the jitter shows and the decoding saved is small, so nothing is skipped
+_SKIP_NOREF_MIN_SECONDS = 10.0
+
+# Keyframes this close after a segment start count as on it (timestamp rounding)
+_SEEK_TOLERANCE = 0.0005
+
+# Gaps between segments of one source that are decoded through rather than
+# seeked over, in seconds, when no keyframe index tells what a seek would cost
+_COALESCE_GAP = 1.0
+
+
+@dataclass(slots=True)
+class FilterStep:
+    """One filter of a chain"""
+    name: str  # FFmpeg filter name
+    text: str  # The filter as written in the graph
+
+    def __str__(self) -> str:
+        return self.text
+
+
+@dataclass(slots=True)
+class FilterPlan:
+    """The chosen filter chain of a segment and the rewrites that produced it"""
+    steps: List[FilterStep]
+    notes: List[str] = field(default_factory=list)
+    cost: Optional[float] = None  # Relative cost, None without media info
+
+    def chain(self) -> List[str]:
+        """The filters in order, ready to join with commas"""
+        return [step.text for step in self.steps]
+
+    def describe(self) -> str:
+        """One-line summary for the export log"""
+        names = [step.name if step.name == "drawtext" else step.text for step in self.steps]
+        text = " -> ".join(names) or "no filters"
+        return f"{text} ({'; '.join(self.notes)})" if self.notes else text
+
+
+@dataclass(slots=True)
+class DecodePlan:
+    """Decoder options for a source, given before its -i"""
+    args: List[str] = field(default_factory=list)
+    lowres: int = 0  # Frames are decoded at 1 / 2**lowres of their size
+    notes: List[str] = field(default_factory=list)
+
+    def describe(self) -> str:
+        """One-line summary for the export log"""
+        text = " ".join(self.args) or "full decode"
+        return f"{text} ({'; '.join(self.notes)})" if self.notes else text
+
+
+@dataclass(slots=True)
+class SeekPlan:
+    """Where a source is seeked (-ss before -i), and how much is trimmed after that to reach the start"""
+    start: float  # Input seek in seconds, on a keyframe when the index is known
+    trim: Optional[float] = None  # Seconds from the seek point to the segment start; None leaves the cut to FFmpeg
+    duration: Optional[float] = None  # Segment length, None for open-ended reads
+
+    def filters(self) -> List[str]:
+        """
+        Filters that cut the segment out exactly and give it the timestamps of a plain seek.
+
+        The shift is rounded to whole time base units, as FFmpeg rounds an
+        input seek, so frames on the segment start land on zero exactly.
+        """
+        if self.trim is None:
+            return []
+        end = f"end={self.trim + self.duration:.6f}" if self.duration is not None else ""
+        if not self.trim:
+            return [f"trim={end}"] if end else []
+        return [f"trim=start={self.trim:.6f}:{end}".rstrip(":"), f"setpts=PTS-round({self.trim:.6f}/TB)"]
+
+
+def plan_seek(keyframes: Optional[List[float]], start: float, end: Optional[float] = None) -> SeekPlan:
+    """
+    Seek to the keyframe at or before start, then trim the segment exactly.
+
+    Any demuxer can seek straight to a keyframe, so the input seek does no
+    guesswork, and the trim filter cuts at the exact frames whatever the
+    container's index is like; the end is exclusive, unlike -to, which goes
+    by packet timestamps. Without a keyframe index FFmpeg's own input seek
+    finds the start and only the end is trimmed, so every read of a segment
+    ends on the same frame.
+
+    Args:
+        keyframes: Sorted keyframe times of the source (MediaInfo.keyframes)
+        start: Segment start in seconds
+        end: Segment end in seconds, if the read is bounded
+    """
+    idx = bisect.bisect_right(keyframes, start + _SEEK_TOLERANCE) - 1 if keyframes else -1
+    duration = round(end - start, 6) if end is not None else None
+    if idx < 0:
+        return SeekPlan(start, 0.0, duration) if duration is not None else SeekPlan(start)
+    # Rounded up, so the seek cannot fall just short of the keyframe and land on the one before
+    seek = math.ceil(keyframes[idx] * 1e6) / 1e6
+    trim = max(0.0, round(start - seek, 6))
+    return SeekPlan(seek, trim, duration)
+
+
+def plan_decode_groups(
+    spans: List[tuple[float, float]],
+    keyframes: Optional[List[float]] = None,
+    max_gap: float = _COALESCE_GAP,
+) -> List[List[int]]:
+    """
+    Group the (start, end) spans of one source that are cheaper to decode in one read.
+
+    Spans that overlap or touch are merged, so shared frames are decoded
+    once. So are spans with a gap that a separate seek would decode anyway:
+    with a keyframe index, a gap without a keyframe in it, as the seek would
+    start before the gap; without one, gaps of up to max_gap seconds.
+
+    Returns:
+        Groups of span indexes, each in start order
+    """
+    groups: List[List[int]] = []
+    end = 0.0
+    for idx in sorted(range(len(spans)), key=lambda i: spans[i]):
+        start = spans[idx][0]
+        if groups and (
+            start - end <= max_gap or (keyframes and plan_seek(keyframes, start).start <= end)
+        ):
+            groups[-1].append(idx)
+            end = max(end, spans[idx][1])
+        else:
+            groups.append([idx])
+            end = spans[idx][1]
+    return groups
+
+
+@dataclass(slots=True)
+class ExtractPlan:
+    """How the clip-file pipeline cuts a segment out of its source"""
+    copy: bool  # Stream copy from a keyframe (no decode or encode); otherwise decoded, filtered and re-encoded
+    keyframe: Optional[float] = None  # Keyframe a copy starts on
+    notes: List[str] = field(default_factory=list)
+
+    def describe(self) -> str:
+        """One-line summary for the export log"""
+        text = "stream copy" if self.copy else "re-encode"
+        return f"{text} ({'; '.join(self.notes)})" if self.notes else text
+
+
+def plan_extraction(keyframes: Optional[List[float]], start: float, fps: float = 0.0) -> ExtractPlan:
+    """
+    Stream-copy a segment that starts on a keyframe.
+
+    The copy begins with the keyframe, so it decodes on its own, and the
+    segment filters run when the later passes read it. A cut anywhere else
+    would copy frames from before the segment as well, which every later
+    pass would have to decode and drop, so it is re-encoded instead.
+
+    Args:
+        keyframes: Sorted keyframe times of the source (MediaInfo.keyframes)
+        start: Segment start in seconds
+        fps: Source frame rate; a keyframe within half a frame of start counts
+    """
+    if not keyframes:
+        return ExtractPlan(False, notes=["no keyframe index"])
+    slack = max(_SEEK_TOLERANCE, 0.5 / fps if fps else 0.0)
+    idx = bisect.bisect_right(keyframes, start + _SEEK_TOLERANCE) - 1
+    if idx < 0:
+        return ExtractPlan(False, notes=["no keyframe before the start"])
+    key = keyframes[idx]
+    if start - key <= slack:
+        return ExtractPlan(True, key, [f"starts on the keyframe at {key:.3f}s"])
+    return ExtractPlan(False, notes=[f"starts {start - key:.2f}s after the keyframe at {key:.3f}s"])
+
+
+def plan_decoder(
+    profile: GifExportProfile, source: Optional[MediaInfo], crop: str = "", duration: Optional[float] = None
+) -> DecodePlan:
+    """
+    Pick decoder options that skip work the filters would throw away.
+
+    Non-reference frames are skipped (-skip_frame noref) when the source has
+    several frames per GIF frame, so the fps filter would drop most of them
+    anyway. This trades exact frame timing (some frames land one source frame
+    early) for decoding speed, so it is left out for reversed and boomerang
+    GIFs, where the jitter shows on the way back, and for short selections.
+    Decoders that support it decode at a power-of-two fraction of the size
+    (-lowres) as long as the frames stay at least as wide as the GIF. Nothing
+    is skipped without media info.
+
+    Args:
+        duration: Seconds of the source that are decoded, if known
+    """
+    plan = DecodePlan()
+    if source is None:
+        return plan
+
+    rate = (source.fps or 0.0) * (profile.speed_multiplier or 1.0)
+    if rate >= profile.fps * _SKIP_NOREF_RATIO:
+        if profile.reverse or profile.boomerang:
+            plan.notes.append("all frames decoded for exact timing in reverse")
+        elif duration is not None and duration < _SKIP_NOREF_MIN_SECONDS:
+            plan.notes.append(f"all frames decoded for exact timing in {duration:g}s of segments")
+        else:
+            plan.args += ["-skip_frame", "noref"]
+            plan.notes.append(f"{rate:g} fps source for a {profile.fps} fps GIF")
+
+    if profile.width and source.codec in _LOWRES_CODECS:
+        width = int(crop[len("crop="):].split(":")[0]) if crop else source.display_size[0]
+        while plan.lowres < _MAX_LOWRES and width >> (plan.lowres + 1) >= profile.width:
+            plan.lowres += 1
+        if plan.lowres:
+            plan.args += ["-lowres", f"{plan.lowres}"]
+            plan.notes.append(f"{source.codec} decoded at 1/{1 << plan.lowres} size for {profile.width} px")
+    return plan
+
+
+def scale_crop(crop: str, lowres: int) -> str:
+    """A crop filter for frames decoded at 1 / 2**lowres of their size"""
+    if not crop or not lowres:
+        return crop
+    values = [int(v) >> lowres for v in crop[len("crop="):].split(":")]
+    return "crop=" + ":".join(str(v) for v in values)
+
+
+def chain_cost(steps: List[FilterStep], profile: GifExportProfile, source: MediaInfo, crop_size) -> float:
+    """
+    Estimated work of a chain: each filter's cost per pixel times the pixels per second it receives.
+
+    Args:
+        crop_size: (width, height) after the crop step, if there is one
+    """
+    rate = source.fps or float(profile.fps)
+    width, height = source.display_size
+    cost = 0.0
+    for step in steps:
+        cost += rate * width * height * _PIXEL_COST.get(step.name, 0.0)
+        if step.name == "crop":
+            width, height = crop_size
+        elif step.name == "setpts":
+            rate *= profile.speed_multiplier or 1.0
+        elif step.name == "fps":
+            rate = float(profile.fps)
+        elif step.name == "scale":
+            height = height * profile.width / width if width else height
+            width = profile.width
+    return cost
+
+
+def plan_segment_filters(
+    profile: GifExportProfile,
+    source: Optional[MediaInfo] = None,
+    crop: str = "",
+    text_filter: Optional[str] = None,
+    timing: bool = True,
+    lowres: int = 0,
+) -> FilterPlan:
+    """
+    Build a segment's filter chain and rewrite it to do the least work.
+
+    The chain starts as crop, speed, scale, fps, text. Filters that would not
+    change the frames are left out, and fps and scale, which commute, run in
+    whichever order costs less: dropping frames first means fewer of them get
+    scaled. Without media info, fps goes first, since GIFs rarely have more
+    frames per second than their source.
+
+    Args:
+        profile: Export settings
+        source: Probed media info of the segment's file, if known
+        crop: Crop filter for the file's black bars ("" for none)
+        text_filter: drawtext filter for the overlay, if any
+        timing: False leaves out speed and fps (for single frames)
+        lowres: Decoder size reduction from plan_decoder; crop and sizes follow it
+    """
+    steps: List[FilterStep] = []
+    notes: List[str] = []
+    if lowres and source:
+        source = replace(source, width=source.width >> lowres, height=source.height >> lowres)
+    crop = scale_crop(crop, lowres)
+    crop_size = None
+    if crop:
+        steps.append(FilterStep("crop", crop))
+        crop_size = tuple(int(v) for v in crop[len("crop="):].split(":")[:2])
+
+    speed = profile.speed_multiplier or 1.0
+    if timing and speed != 1.0:
+        steps.append(FilterStep("setpts", f"setpts={1.0/speed}*PTS"))
+
+    if profile.width:
+        width = crop_size[0] if crop_size else (source.display_size[0] if source else None)
+        if width == profile.width:
+            notes.append(f"scale skipped, frames are already {width} px wide")
+        else:
+            steps.append(FilterStep("scale", f"scale={profile.width}:-1:flags={profile.scale_filter}"))
+
+    # Kept even when the rates match: it also evens out variable frame rates
+    if timing:
+        steps.append(FilterStep("fps", f"fps={profile.fps}"))
+
+    if text_filter:
+        steps.append(FilterStep("drawtext", text_filter))
+
+    movable = [step for step in steps if step.name in _MOVABLE]
+    if len(movable) < 2:
+        cost = chain_cost(steps, profile, source, crop_size) if source else None
+        return FilterPlan(steps, notes, cost)
+
+    # Try every order of the movable filters in their slots
+    slots = [i for i, step in enumerate(steps) if step.name in _MOVABLE]
+    candidates = []
+    for order in itertools.permutations(movable):
+        candidate = list(steps)
+        for slot, step in zip(slots, order):
+            candidate[slot] = step
+        candidates.append(candidate)
+
+    if source:
+        costs = [chain_cost(c, profile, source, crop_size) for c in candidates]
+        best = min(range(len(candidates)), key=lambda i: costs[i])
+        chosen, cost = candidates[best], costs[best]
+        if chosen != steps:
+            rate = (source.fps or profile.fps) * speed
+            saved = 1 - cost / costs[0] if costs[0] else 0.0
+            notes.append(f"fps before scale, {rate:g} -> {profile.fps} fps, {saved:.0%} less work")
+    else:
+        chosen = next(c for c in candidates if [s.name for s in c if s.name in _MOVABLE][0] == "fps")
+        cost = None
+        notes.append("fps before scale, source frame rate unknown")
+    return FilterPlan(chosen, notes, cost)
@@ -0,0 +1,211 @@
+"""Scratch store of decoded frames, memory-mapped for every export stage (requires NumPy)"""
+
+from __future__ import annotations
+
+import os
+import threading
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterable, Optional
+
+import numpy as np
+
+from gif_converter.ffmpeg.cache import make_cache_key
+
+
+@dataclass(slots=True)
+class FrameSet:
+    """
+    The decoded frames of one source range.
+
+    Frames are planar 4:4:4 YUV (FFmpeg's yuv444p, the same frames the
+    stream pipeline pipes), one after another, in ``path``; the index gives
+    each frame's byte offset and output timestamp.
+    """
+    path: str
+    width: int
+    height: int
+    start: float  # Source range in seconds
+    end: float
+    pts: np.ndarray  # Output timestamp of each frame in seconds, from the range start
+    offsets: np.ndarray  # Byte offset of each frame
+
+    @property
+    def frame_bytes(self) -> int:
+        return self.width * self.height * 3
+
+    def __len__(self) -> int:
+        return len(self.pts)
+
+    def frames(self) -> np.ndarray:
+        """All frames as a read-only (N, 3, height, width) memmap of Y, U and V planes; slices are views"""
+        if not len(self):
+            return np.zeros((0, 3, self.height, self.width), dtype=np.uint8)
+        return np.memmap(self.path, dtype=np.uint8, mode="r", shape=(len(self), 3, self.height, self.width))
+
+    def span(self, start: float, end: float) -> tuple[int, int]:
+        """Frame index range [first, last) for output times start..end (seconds from the range start)"""
+        if len(self) > 1:
+            half = (self.pts[1] - self.pts[0]) / 2
+        else:
+            half = 0.0
+        first = int(np.searchsorted(self.pts, start - half, side="left"))
+        last = int(np.searchsorted(self.pts, end - half, side="left"))
+        return first, max(first, last)
+
+
+class FrameStore:
+    """
+    Decoded frames of source ranges, kept as raw files with a small index.
+
+    Entries are grouped by what produced their frames (source and filter
+    chain); a range is served by any entry of its group that covers it, as
+    a zero-copy slice. Least recently used entries are deleted when the store
+    grows past ``max_bytes``; entries held by a running export are never
+    deleted, by any instance. find() holds the entry it returns until
+    release().
+    """
+
+    # Frame files that running exports still memory-map -> number of holders
+    _held: Dict[str, int] = {}
+    _held_lock = threading.Lock()
+
+    def __init__(self, root: str, max_bytes: int) -> None:
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def find(self, group: str, start: float, end: float) -> Optional[FrameSet]:
+        """Return a held entry of group that covers the source range start..end, or None"""
+        with FrameStore._held_lock, self._lock:
+            for name in sorted(os.listdir(self.root)):
+                if not (name.startswith(group + "_") and name.endswith(".npz")):
+                    continue
+                frame_set = self._load(os.path.join(self.root, name))
+                if frame_set and frame_set.start <= start + 1e-6 and frame_set.end >= end - 1e-6:
+                    try:
+                        os.utime(frame_set.path)
+                    except OSError:
+                        pass
+                    self._hold(frame_set.path)
+                    self.hits += 1
+                    return frame_set
+            self.misses += 1
+            return None
+
+    def path_for(self, group: str, start: float, end: float) -> str:
+        """Where to decode the frames of a new entry"""
+        return os.path.join(self.root, f"{group}_{make_cache_key(start, end)[:16]}.yuv")
+
+    def add(self, path: str, start: float, end: float, width: int, height: int, fps: float) -> FrameSet:
+        """
+        Index a finished decode at path_for(...).
+
+        Frames come from an fps filter, so they are evenly spaced. Call
+        evict() once every entry an export needs is in place.
+        """
+        frame_bytes = width * height * 3
+        count = os.path.getsize(path) // frame_bytes
+        frame_set = FrameSet(
+            path=path,
+            width=width,
+            height=height,
+            start=start,
+            end=end,
+            pts=np.arange(count, dtype=np.float64) / fps,
+            offsets=np.arange(count, dtype=np.int64) * frame_bytes,
+        )
+        index_path = path[:-len(".yuv")] + ".npz"
+        with open(index_path + ".part", "wb") as f:
+            np.savez(
+                f,
+                pts=frame_set.pts,
+                offsets=frame_set.offsets,
+                meta=np.array([width, height, start, end], dtype=np.float64),
+            )
+        os.replace(index_path + ".part", index_path)
+        return frame_set
+
+    def hold(self, paths: Iterable[str]) -> None:
+        """Protect entries from eviction until they are released"""
+        with FrameStore._held_lock:
+            for path in paths:
+                self._hold(path)
+
+    def release(self, paths: Iterable[str]) -> None:
+        """Undo a hold() or find() on the same paths"""
+        with FrameStore._held_lock:
+            for path in paths:
+                count = FrameStore._held.get(path, 0) - 1
+                if count > 0:
+                    FrameStore._held[path] = count
+                else:
+                    FrameStore._held.pop(path, None)
+
+    def evict(self, keep: Iterable[str] = ()) -> None:
+        """Delete least recently used entries until the store fits its size cap, except held ones and those in keep"""
+        # Held under the lock throughout, so find() cannot hand out an entry
+        # that is about to be deleted
+        with FrameStore._held_lock, self._lock:
+            keep = {path for path in set(keep) | set(FrameStore._held) if os.path.dirname(path) == self.root}
+            entries = []
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                if not name.endswith(".yuv") or path in keep:
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+            total = sum(size for _, size, _ in entries) + sum(
+                os.path.getsize(p) for p in keep if os.path.exists(p)
+            )
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                for victim in (path[:-len(".yuv")] + ".npz", path):
+                    try:
+                        os.remove(victim)
+                    except OSError:
+                        pass
+                total -= size
+
+    def stats_text(self) -> str:
+        """One-line hit/miss summary for the export log"""
+        return f"Frame store: {self.hits} hit(s), {self.misses} miss(es)"
+
+    def _hold(self, path: str) -> None:
+        FrameStore._held[path] = FrameStore._held.get(path, 0) + 1
+
+    def _load(self, index_path: str) -> Optional[FrameSet]:
+        path = index_path[:-len(".npz")] + ".yuv"
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(index_path) as index:
+                width, height, start, end = index["meta"]
+                return FrameSet(
+                    path=path,
+                    width=int(width),
+                    height=int(height),
+                    start=float(start),
+                    end=float(end),
+                    pts=index["pts"],
+                    offsets=index["offsets"],
+                )
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def write_frames(stream: BinaryIO, frames: np.ndarray, reverse: bool = False, batch: int = 32) -> None:
+    """Write frames to a binary stream straight from their buffer, optionally last frame first"""
+    if not reverse:
+        for pos in range(0, len(frames), batch):
+            stream.write(memoryview(np.ascontiguousarray(frames[pos:pos + batch])).cast("B"))
+        return
+    for pos in range(len(frames) - 1, -1, -1):
+        stream.write(memoryview(frames[pos]).cast("B"))
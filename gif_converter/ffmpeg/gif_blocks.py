@@ -0,0 +1,267 @@
+"""Block-level GIF reading and stitching (no LZW decoding)"""
+
+from __future__ import annotations
+
+import os
+import struct
+from dataclasses import dataclass
+from typing import BinaryIO, List, Optional
+
+
+def netscape_loop_block(loop_count: int) -> bytes:
+    """
+    NETSCAPE2.0 application extension for a loop count.
+
+    Uses the same convention as FFmpeg's -loop option: 0 loops forever,
+    -1 plays once (no extension at all), N repeats N times.
+    """
+    if loop_count < 0:
+        return b""
+    return b"\x21\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", min(loop_count, 0xFFFF)) + b"\x00"
+
+
+@dataclass(slots=True)
+class GifImageBlock:
+    """One frame of a GIF, as the raw bytes it is stored as"""
+    extensions: bytes  # Extension blocks before the image (graphic control etc.)
+    descriptor: bytes  # 10-byte image descriptor, including the 0x2C introducer
+    color_table: bytes  # Local color table (empty if the frame uses the global one)
+    data: bytes  # LZW minimum code size and image data sub-blocks
+
+    @property
+    def size(self) -> int:
+        return len(self.extensions) + len(self.descriptor) + len(self.color_table) + len(self.data)
+
+    def to_bytes(self) -> bytes:
+        return self.extensions + self.descriptor + self.color_table + self.data
+
+    def with_local_table(self, color_table: bytes) -> GifImageBlock:
+        """The same frame carrying color_table as its local color table"""
+        bits = max(1, (len(color_table) // 3).bit_length() - 1)
+        flags = 0x80 | (self.descriptor[9] & 0x60) | (bits - 1)  # Keep interlace and sort flags
+        descriptor = self.descriptor[:9] + bytes((flags,))
+        return GifImageBlock(self.extensions, descriptor, color_table, self.data)
+
+
+@dataclass(slots=True)
+class GifBlocks:
+    """A GIF split into its header parts and frames"""
+    screen: bytes  # 7-byte logical screen descriptor
+    color_table: bytes  # Global color table (empty if none)
+    header_extensions: bytes  # Application extensions before the first frame (NETSCAPE loop)
+    images: List[GifImageBlock]
+
+    @property
+    def header_size(self) -> int:
+        """Bytes before the first frame"""
+        return 6 + len(self.screen) + len(self.color_table) + len(self.header_extensions)
+
+
+def read_gif_blocks(data: bytes) -> GifBlocks:
+    """
+    Split a GIF file into blocks.
+
+    Application extensions before the first frame belong to the header; every
+    other extension belongs to the frame that follows it.
+    """
+    if data[:3] != b"GIF" or len(data) < 13:
+        raise ValueError("not a GIF file")
+
+    pos = 13
+    flags = data[10]
+    if flags & 0x80:
+        pos += 3 * (2 << (flags & 7))
+    screen = data[6:13]
+    color_table = data[13:pos]
+
+    def skip_sub_blocks(p: int) -> int:
+        while p < len(data):
+            size = data[p]
+            p += 1 + size
+            if size == 0:
+                break
+        return p
+
+    header_end = None
+    images: List[GifImageBlock] = []
+    frame_start = pos
+    while pos < len(data):
+        block = data[pos]
+        if block == 0x3B:  # Trailer
+            break
+        if block == 0x21:  # Extension: introducer, label, sub-blocks
+            if header_end is None and data[pos + 1] == 0xFF and pos == frame_start:
+                pos = skip_sub_blocks(pos + 2)
+                frame_start = pos
+                continue
+            pos = skip_sub_blocks(pos + 2)
+        elif block == 0x2C:  # Image descriptor, optional local color table, LZW data
+            if header_end is None:
+                header_end = frame_start
+            img_flags = data[pos + 9]
+            table_start = pos + 10
+            table_end = table_start
+            if img_flags & 0x80:
+                table_end += 3 * (2 << (img_flags & 7))
+            end = skip_sub_blocks(table_end + 1)
+            images.append(GifImageBlock(
+                extensions=data[frame_start:pos],
+                descriptor=data[pos:table_start],
+                color_table=data[table_start:table_end],
+                data=data[table_end:end],
+            ))
+            pos = frame_start = end
+        else:
+            raise ValueError(f"unexpected GIF block 0x{block:02x} at offset {pos}")
+
+    header_end = header_end if header_end is not None else frame_start
+    return GifBlocks(screen, color_table, data[13 + len(color_table):header_end], images)
+
+
+def stitch_gifs(paths: List[str], output: str) -> int:
+    """
+    Join GIFs of the same size into one, frame blocks copied as they are.
+
+    The header, global color table and loop extension come from the first
+    file. Frames of a later file whose global color table differs get that
+    table as a local color table, so they keep their colors. Every file must
+    start with a frame that covers the whole canvas.
+
+    Returns:
+        Number of frames written
+    """
+    count = 0
+    first = None
+    with open(output, "wb") as out:
+        for path in paths:
+            with open(path, "rb") as f:
+                blocks = read_gif_blocks(f.read())
+            if first is None:
+                first = blocks
+                out.write(b"GIF89a" + blocks.screen + blocks.color_table + blocks.header_extensions)
+            elif blocks.screen[:4] != first.screen[:4]:
+                raise ValueError(f"{path} has a different canvas size")
+
+            own_table = blocks.color_table != first.color_table
+            for image in blocks.images:
+                if own_table and not image.color_table:
+                    image = image.with_local_table(blocks.color_table)
+                out.write(image.to_bytes())
+            count += len(blocks.images)
+        out.write(b"\x3b")
+    return count
+
+
+def _read(f: BinaryIO, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) < size:
+        raise ValueError("truncated GIF file")
+    return data
+
+
+def _copy_sub_blocks(src: BinaryIO, dst: Optional[BinaryIO]) -> None:
+    """Copy data sub-blocks up to and including the terminator (dst None skips them)"""
+    while True:
+        size = _read(src, 1)
+        block = _read(src, size[0])
+        if dst is not None:
+            dst.write(size + block)
+        if not size[0]:
+            return
+
+
+def retime_gif(path: str, output: str, loop_count: int) -> int:
+    """
+    Copy a GIF with a new loop count, without re-encoding.
+
+    The file is streamed block by block, so time is linear in its size and
+    memory use is constant. ``output`` may be ``path`` itself; the original
+    is then replaced only once the new file is complete.
+
+    Args:
+        path: GIF to read
+        output: GIF to write
+        loop_count: FFmpeg-style loop count (0 = forever, -1 = once)
+
+    Returns:
+        Number of frames
+
+    Raises:
+        ValueError: The file is not a GIF
+    """
+    tmp_path = output + ".part"
+    frames = 0
+    try:
+        with open(path, "rb") as src, open(tmp_path, "wb") as dst:
+            head = _read(src, 13)
+            if head[:3] != b"GIF":
+                raise ValueError("not a GIF file")
+            dst.write(b"GIF89a" + head[6:])
+            if head[10] & 0x80:
+                dst.write(_read(src, 3 * (2 << (head[10] & 7))))
+            dst.write(netscape_loop_block(loop_count))
+
+            while True:
+                block = _read(src, 1)
+                if block == b"\x3b":  # Trailer
+                    dst.write(block)
+                    break
+                if block == b"\x2c":  # Image descriptor, optional local color table, LZW data
+                    descriptor = _read(src, 9)
+                    dst.write(block + descriptor)
+                    if descriptor[8] & 0x80:
+                        dst.write(_read(src, 3 * (2 << (descriptor[8] & 7))))
+                    dst.write(_read(src, 1))  # LZW minimum code size
+                    _copy_sub_blocks(src, dst)
+                    frames += 1
+                elif block == b"\x21":
+                    label = _read(src, 1)
+                    if label == b"\xff":  # Application extension: drop any old loop block
+                        size = _read(src, 1)
+                        ident = _read(src, size[0])
+                        if ident == b"NETSCAPE2.0":
+                            _copy_sub_blocks(src, None)
+                            continue
+                        dst.write(block + label + size + ident)
+                    else:
+                        dst.write(block + label)
+                    _copy_sub_blocks(src, dst)
+                else:
+                    raise ValueError(f"unexpected GIF block 0x{block[0]:02x}")
+        os.replace(tmp_path, output)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return frames
+
+
+def pad_gif_duration(path: str, total_cs: int) -> int:
+    """
+    Lengthen the last frame's delay so the GIF plays for total_cs, in place.
+
+    Frames dropped after the last kept one leave no later timestamp for the
+    muxer to take their time from, so it is lost from the end of the GIF.
+    Files that already play that long are left alone.
+
+    Returns:
+        Centiseconds added
+    """
+    with open(path, "r+b") as f:
+        blocks = read_gif_blocks(f.read())
+        offset = blocks.header_size
+        played = 0
+        last = None  # File offset of the last frame's delay field
+        for image in blocks.images:
+            ext = image.extensions.rfind(b"\x21\xf9\x04")
+            last = offset + ext + 4 if ext >= 0 else None
+            if ext >= 0:
+                played += struct.unpack_from("<H", image.extensions, ext + 4)[0]
+            offset += image.size
+        if last is None or played >= total_cs:
+            return 0
+        f.seek(last)
+        delay = struct.unpack("<H", _read(f, 2))[0]
+        added = min(total_cs - played, 0xFFFF - delay)
+        f.seek(last)
+        f.write(struct.pack("<H", delay + added))
+    return added
@@ -0,0 +1,80 @@
+"""History of finished exports, for re-exports that only change the loop count"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional
+
+from gif_converter.models.media import GifExportProfile
+from gif_converter.ffmpeg.engine import GifExportTask
+from gif_converter.ffmpeg.cache import source_fingerprint
+
+
+def _frames_profile(profile: GifExportProfile) -> GifExportProfile:
+    """
+    The profile without the settings that leave the encoded frames alone.
+
+    Speed is not one of them: the fps filter resamples after the speed
+    change, so another speed gives other frames, not just other delays.
+    """
+    return replace(profile, preset_name="", target_max_size_mb=None, loop_count=0)
+
+
+@dataclass(slots=True)
+class ExportRecord:
+    """A finished export and the state of its inputs and output at that time"""
+    task: GifExportTask
+    sources: Dict[str, str]  # Source path -> fingerprint
+    output: str  # Output fingerprint
+
+    @staticmethod
+    def of(task: GifExportTask) -> ExportRecord:
+        """Record a task whose output was just written"""
+        sources = {path: source_fingerprint(path) for path in task.file_lookup.values()}
+        return ExportRecord(task=task, sources=sources, output=source_fingerprint(task.output_path))
+
+    def is_current(self) -> bool:
+        """Check that neither the sources nor the output changed since the export"""
+        if not os.path.exists(self.task.output_path):
+            return False
+        if source_fingerprint(self.task.output_path) != self.output:
+            return False
+        return all(source_fingerprint(path) == fp for path, fp in self.sources.items())
+
+    def differs_only_in_loop_count(self, task: GifExportTask) -> bool:
+        """Check whether task renders the same frames, possibly with another loop count"""
+        old = self.task
+        if task.mode != old.mode or task.file_lookup != old.file_lookup:
+            return False
+        segments = [(s.file_id, s.start, s.end) for s in task.segments]
+        if segments != [(s.file_id, s.start, s.end) for s in old.segments]:
+            return False
+        return _frames_profile(task.profile) == _frames_profile(old.profile)
+
+
+class ExportHistory:
+    """Recent exports, newest last"""
+
+    def __init__(self, max_entries: int = 20) -> None:
+        self._records: List[ExportRecord] = []
+        self._max_entries = max_entries
+
+    def add(self, task: GifExportTask) -> None:
+        """Record a successful export, replacing older records of the same output"""
+        self._records = [r for r in self._records if r.task.output_path != task.output_path]
+        self._records.append(ExportRecord.of(task))
+        del self._records[:-self._max_entries]
+
+    def find_retimable(self, task: GifExportTask) -> Optional[ExportRecord]:
+        """
+        Find an earlier export that task can reuse by rewriting the loop count only.
+
+        Returns:
+            The newest record with the same frames whose output is untouched,
+            or None
+        """
+        for record in reversed(self._records):
+            if record.differs_only_in_loop_count(task) and record.is_current():
+                return record
+        return None
@@ -0,0 +1,240 @@
+"""Bounded process pool for running FFmpeg jobs concurrently"""
+
+from __future__ import annotations
+
+import os
+import re
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set
+
+# Matches the "time=HH:MM:SS.ms" field of FFmpeg's stderr status line
+_TIME_RE = re.compile(r"time=\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+_LINE_SPLIT_RE = re.compile(rb"[\r\n]")
+
+
+def parse_progress_time(line: str) -> Optional[float]:
+    """Extract the current output time in seconds from an FFmpeg status line"""
+    match = _TIME_RE.search(line)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def default_worker_count() -> int:
+    """Number of concurrent FFmpeg jobs to run when none is configured"""
+    return max(1, os.cpu_count() or 1)
+
+
+@dataclass(slots=True)
+class ProcessJob:
+    """A single FFmpeg command to run in the pool"""
+    cmd: List[str]
+    duration: float = 0.0  # Expected output duration in seconds (for progress)
+    label: str = ""  # Prefix for log lines from this job
+
+
+class ProcessPool:
+    """
+    Runs FFmpeg jobs with at most ``max_workers`` live child processes.
+
+    Results are returned in job order regardless of completion order, progress
+    from all workers is merged into one overall fraction, and ``cancel()``
+    terminates every running child process. Where the OS reports it,
+    ``peak_memory_mb`` is the largest resident size of any finished process.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        on_log: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self._max_workers = max_workers or default_worker_count()
+        self._on_log = on_log
+        self._lock = threading.Lock()
+        self._procs: Set[subprocess.Popen] = set()
+        self._log_threads: Dict[subprocess.Popen, threading.Thread] = {}
+        self._cancelled = False
+        self.peak_memory_mb: Optional[float] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self) -> None:
+        """Stop scheduling new jobs and terminate all running processes"""
+        with self._lock:
+            self._cancelled = True
+            procs = list(self._procs)
+        for proc in procs:
+            try:
+                proc.terminate()
+            except Exception:
+                pass
+
+    def run(
+        self,
+        jobs: List[ProcessJob],
+        on_progress: Optional[Callable[[float, int], None]] = None,
+        stop_on_error: bool = True,
+    ) -> List[tuple[bool, str]]:
+        """
+        Run jobs concurrently and wait for all of them.
+
+        Args:
+            jobs: Commands to run
+            on_progress: Called with (overall fraction 0-1, finished job count)
+            stop_on_error: Cancel the remaining jobs after the first failure
+
+        Returns:
+            (success, error message) per job, in job order
+        """
+        if not jobs:
+            return []
+
+        total_duration = sum(job.duration for job in jobs)
+        done_fraction = [0.0] * len(jobs)
+        finished = [0]
+        failed = [False]
+
+        def report(idx: int, fraction: float) -> None:
+            with self._lock:
+                done_fraction[idx] = min(1.0, max(done_fraction[idx], fraction))
+                if total_duration > 0:
+                    overall = sum(f * j.duration for f, j in zip(done_fraction, jobs)) / total_duration
+                else:
+                    overall = sum(done_fraction) / len(jobs)
+                count = finished[0]
+            if on_progress:
+                on_progress(overall, count)
+
+        def work(idx: int) -> tuple[bool, str]:
+            job = jobs[idx]
+            if self._cancelled or (stop_on_error and failed[0]):
+                return False, "Cancelled"
+
+            def on_time(seconds: float) -> None:
+                if job.duration > 0:
+                    report(idx, seconds / job.duration)
+
+            ok, err = self._run_one(job, on_time)
+            with self._lock:
+                finished[0] += 1
+                if not ok:
+                    failed[0] = True
+            report(idx, 1.0)
+            return ok, err
+
+        workers = min(self._max_workers, len(jobs))
+        if workers == 1:
+            results = [work(idx) for idx in range(len(jobs))]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(work, range(len(jobs))))
+
+        if self._cancelled:
+            return [(False, "Cancelled") for _ in jobs]
+        return results
+
+    def spawn(
+        self,
+        job: ProcessJob,
+        on_time: Optional[Callable[[float], None]] = None,
+        **popen_kwargs,
+    ) -> Optional[subprocess.Popen]:
+        """
+        Start a process that ``cancel()`` will terminate.
+
+        Its stderr is forwarded to the log (and parsed for progress) on a
+        background thread; call ``reap()`` to wait for it. Returns None if the
+        pool has already been cancelled.
+        """
+        prefix = f"[{job.label}] " if job.label else ""
+        self._log(f"{prefix}Running: {' '.join(job.cmd)}")
+
+        popen_kwargs.setdefault("stdin", subprocess.DEVNULL)
+        popen_kwargs.setdefault("stdout", subprocess.DEVNULL)
+        with self._lock:
+            if self._cancelled:
+                return None
+            proc = subprocess.Popen(job.cmd, stderr=subprocess.PIPE, **popen_kwargs)
+            self._procs.add(proc)
+
+        def forward(raw: bytes) -> None:
+            line = raw.decode("utf-8", errors="replace").rstrip()
+            if not line:
+                return
+            if on_time is not None:
+                seconds = parse_progress_time(line)
+                if seconds is not None:
+                    on_time(seconds)
+            self._log(prefix + line)
+
+        def pump_stderr() -> None:
+            # FFmpeg rewrites its status line with bare carriage returns, so
+            # split on both line terminators instead of using readline()
+            pending = b""
+            while True:
+                chunk = proc.stderr.read1(65536)
+                if not chunk:
+                    break
+                *lines, pending = _LINE_SPLIT_RE.split(pending + chunk)
+                for raw in lines:
+                    forward(raw)
+            forward(pending)
+            proc.stderr.close()
+
+        thread = threading.Thread(target=pump_stderr, daemon=True)
+        with self._lock:
+            self._log_threads[proc] = thread
+        thread.start()
+        return proc
+
+    def reap(self, proc: subprocess.Popen) -> int:
+        """Wait for a spawned process and its log thread, returning the exit code"""
+        try:
+            code = self._wait(proc)
+            self._log_threads[proc].join()
+        finally:
+            with self._lock:
+                self._procs.discard(proc)
+                self._log_threads.pop(proc, None)
+        return code
+
+    def _wait(self, proc: subprocess.Popen) -> int:
+        """Wait for a process, recording its peak memory where os.wait4 exists"""
+        if not hasattr(os, "wait4"):
+            return proc.wait()
+        try:
+            _, status, usage = os.wait4(proc.pid, 0)
+        except ChildProcessError:
+            return proc.wait()
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss is in bytes on macOS, KB elsewhere
+        rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+        with self._lock:
+            self.peak_memory_mb = max(self.peak_memory_mb or 0.0, rss_mb)
+        return proc.returncode
+
+    def _run_one(self, job: ProcessJob, on_time: Callable[[float], None]) -> tuple[bool, str]:
+        """Run one FFmpeg command, forwarding its log and progress"""
+        try:
+            proc = self.spawn(job, on_time)
+            if proc is None:
+                return False, "Cancelled"
+            code = self.reap(proc)
+
+            if self._cancelled:
+                return False, "Cancelled"
+            return (code == 0), (f"exit code {code}" if code else "")
+
+        except Exception as e:
+            return False, str(e)
+
+    def _log(self, line: str) -> None:
+        if self._on_log:
+            self._on_log(line)
@@ -0,0 +1,242 @@
+"""Target-size solver: finds the best-looking settings that fit a size cap"""
+
+from __future__ import annotations
+
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, List, Optional
+
+from gif_converter.models.media import Segment, GifExportProfile, MediaInfo
+from gif_converter.ffmpeg.estimator import SizeEstimate, SizeEstimator, output_duration
+from gif_converter.ffmpeg.scheduler import default_worker_count
+
+_WIDTHS = (1920, 1280, 854, 640, 480, 360, 320, 240)
+_FPS = (24, 20, 15, 12, 10, 8, 6)
+_COLORS = (256, 128, 64, 32)
+_LOSSY = (20, 40, 80, 120)
+
+# Relative size of error-diffused, ordered and undithered output
+_DITHER_SIZE = {"none": 0.75, "bayer": 0.9, "sierra2_4a": 1.0, "floyd_steinberg": 1.05}
+_DITHER_QUALITY = {"none": -0.4, "bayer": -0.15, "sierra2_4a": 0.0, "floyd_steinberg": 0.0}
+
+
+@dataclass(slots=True)
+class SolverResult:
+    """Settings chosen by the solver and the estimate they were accepted on"""
+    profile: GifExportProfile
+    estimate: SizeEstimate
+    trials: int  # Number of candidate settings that were trial-encoded
+
+
+def quality_score(profile: GifExportProfile, source_width: int) -> float:
+    """
+    Rank settings by expected visual quality (higher is better).
+
+    Resolution matters most, then smooth motion, then palette size; dithering
+    and lossy compression trade quality for size.
+    """
+    width = profile.width or source_width
+    score = math.log2(max(1, width)) + 0.7 * math.log2(max(1, profile.fps))
+    score += 0.3 * math.log2(profile.colors)
+    score += _DITHER_QUALITY.get(profile.dither, 0.0)
+    score -= 0.6 * (profile.lossy_compression or 0) / 200
+    return score
+
+
+def relative_size(profile: GifExportProfile, duration: float, source_width: int, aspect: float) -> float:
+    """
+    Analytic size model, up to a constant factor.
+
+    LZW output grows a little slower than the pixel count, and higher frame
+    rates mean smaller changes between frames, so both enter sub-linearly.
+    """
+    width = profile.width or source_width
+    area = width * (width / aspect if aspect else width)
+    frames = duration * profile.fps
+    bits = {32: 5, 64: 6, 128: 7, 256: 8}.get(profile.colors, 8) / 8
+    lossy = 1 - min(0.5, (profile.lossy_compression or 0) / 400)
+    return frames ** 0.8 * area ** 0.9 * bits * _DITHER_SIZE.get(profile.dither, 1.0) * lossy
+
+
+class TargetSizeSolver:
+    """
+    Searches width, fps, colors, dither and lossy settings for a size cap.
+
+    The analytic model is calibrated with one trial encode of the starting
+    settings, then used to rank a grid of candidates that never exceed the
+    starting settings. The best-looking candidates predicted to fit are
+    trial-encoded in parallel; the highest-quality one whose estimate stays
+    under the cap wins. If none fit, the model is recalibrated from the
+    trials and the next candidates are tried.
+    """
+
+    def __init__(
+        self,
+        ffmpeg: str,
+        segments: List[Segment],
+        file_lookup: Dict[str, str],
+        source_width: int,
+        source_height: int,
+        max_workers: int = 0,
+        parallel: int = 4,
+        max_rounds: int = 3,
+        crop_filters: Optional[Dict[str, str]] = None,
+        source_info: Optional[Dict[str, MediaInfo]] = None,
+        on_log: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self._ffmpeg = ffmpeg
+        self._segments = segments
+        self._file_lookup = file_lookup
+        self._source_width = source_width
+        self._aspect = source_width / source_height if source_height else 0.0
+        self._max_workers = max_workers or default_worker_count()
+        self._parallel = parallel
+        self._max_rounds = max_rounds
+        self._crop_filters = crop_filters
+        self._source_info = source_info
+        self._on_log = on_log
+
+        self._lock = threading.Lock()
+        self._estimators: List[SizeEstimator] = []
+        self._cancelled = False
+        self._trials = 0
+
+    def cancel(self) -> None:
+        """Stop every running trial encode"""
+        with self._lock:
+            self._cancelled = True
+            estimators = list(self._estimators)
+        for estimator in estimators:
+            estimator.cancel()
+
+    def solve(self, profile: GifExportProfile, target_mb: float) -> Optional[SolverResult]:
+        """
+        Find the highest-quality settings predicted to fit target_mb.
+
+        Returns:
+            The chosen settings (the starting ones if they already fit), or None
+            if cancelled or nothing that was tried fits
+        """
+        duration = output_duration(self._segments, profile)
+        if duration <= 0 or target_mb <= 0:
+            return None
+
+        start = replace(profile, width=profile.width or self._source_width)
+        calibration = self._estimate(start, self._max_workers)
+        if calibration is None:
+            return None
+        self._log(f"Current settings: {calibration.size_mb:.2f} MB (target {target_mb:g} MB)")
+        if calibration.high_mb <= target_mb:
+            return SolverResult(profile, calibration, self._trials)
+
+        def model(p: GifExportProfile) -> float:
+            return relative_size(p, duration, self._source_width, self._aspect)
+
+        scale = calibration.size_mb / model(start)
+        candidates = sorted(
+            self._candidates(start),
+            key=lambda p: quality_score(p, self._source_width),
+            reverse=True,
+        )
+        tried = set()
+
+        for round_no in range(1, self._max_rounds + 1):
+            batch = [
+                c for c in candidates
+                if id(c) not in tried and scale * model(c) <= target_mb * 0.95
+            ][:self._parallel]
+            if not batch or self._cancelled:
+                break
+            tried.update(id(c) for c in batch)
+
+            self._log(f"Round {round_no}: trying {len(batch)} setting(s)")
+            estimates = self._estimate_many(batch)
+            if self._cancelled:
+                return None
+
+            fits = [
+                (c, e) for c, e in zip(batch, estimates)
+                if e is not None and e.high_mb <= target_mb
+            ]
+            if fits:
+                best, estimate = fits[0]  # Batches are in quality order
+                self._log(f"Chose {self._describe(best)}: {estimate.size_mb:.2f} MB")
+                return SolverResult(best, estimate, self._trials)
+
+            # Everything came out larger than predicted; trust the worst miss
+            ratios = [
+                e.size_mb / (scale * model(c))
+                for c, e in zip(batch, estimates) if e is not None
+            ]
+            if ratios:
+                scale *= max(1.0, max(ratios))
+
+        self._log(f"No tried settings fit {target_mb:g} MB")
+        return None
+
+    def _candidates(self, start: GifExportProfile) -> List[GifExportProfile]:
+        """Settings grid that never exceeds the starting width, fps or colors"""
+        widths = [start.width] + [w for w in _WIDTHS if w < start.width]
+        fps_values = [start.fps] + [f for f in _FPS if f < start.fps]
+        colors = [c for c in _COLORS if c <= start.colors] or [start.colors]
+        dithers = list(dict.fromkeys([start.dither, "bayer", "none"]))
+        start_lossy = start.lossy_compression or 0
+        lossy_values = [start_lossy]
+        if start.encoder == "builtin":  # Other encoders ignore lossy settings
+            lossy_values += [v for v in _LOSSY if v > start_lossy]
+
+        return [
+            replace(
+                start,
+                width=width,
+                fps=fps,
+                colors=color,
+                dither=dither,
+                lossy_compression=lossy or None,
+            )
+            for width in widths
+            for fps in fps_values
+            for color in colors
+            for dither in dithers
+            for lossy in lossy_values
+        ]
+
+    def _estimate_many(self, profiles: List[GifExportProfile]) -> List[Optional[SizeEstimate]]:
+        """Trial-encode several settings at once, sharing the CPU budget"""
+        per_job = max(1, self._max_workers // len(profiles))
+        with ThreadPoolExecutor(max_workers=len(profiles)) as executor:
+            return list(executor.map(lambda p: self._estimate(p, per_job), profiles))
+
+    def _estimate(self, profile: GifExportProfile, max_workers: int) -> Optional[SizeEstimate]:
+        estimator = SizeEstimator(
+            self._ffmpeg,
+            self._segments,
+            self._file_lookup,
+            max_workers=max_workers,
+            crop_filters=self._crop_filters,
+            source_info=self._source_info,
+        )
+        with self._lock:
+            if self._cancelled:
+                return None
+            self._estimators.append(estimator)
+            self._trials += 1
+
+        estimate = estimator.estimate(profile)
+
+        with self._lock:
+            self._estimators.remove(estimator)
+        if estimate is None and not self._cancelled:
+            self._log(f"Trial failed for {self._describe(profile)}, skipping it")
+        return estimate
+
+    @staticmethod
+    def _describe(profile: GifExportProfile) -> str:
+        lossy = f", lossy {profile.lossy_compression}" if profile.lossy_compression else ""
+        return f"{profile.width}px, {profile.fps} fps, {profile.colors} colors, {profile.dither}{lossy}"
+
+    def _log(self, line: str) -> None:
+        if self._on_log:
+            self._on_log(line)
@@ -3,11 +3,26 @@
 from __future__ import annotations
 
 import json
+import re
 import subprocess
-from typing import Optional
+from typing import List, Optional
 
 from gif_converter.models.media import MediaInfo
 
+# Points in the video that cropdetect looks at, and frames decoded at each
+CROP_SAMPLE_POINTS = 8
+_CROP_SAMPLE_FRAMES = 3
+
+# Crops that remove less than this share of the width and of the height are
+# encoder noise along the edges, not black bars
+_MIN_CROP_FRACTION = 0.02
+
+# Longest a keyframe index may take; it reads the whole file, but decodes nothing
+_KEYFRAME_PROBE_TIMEOUT = 600
+
+_CROPDETECT_LINE = re.compile(r"crop=(\d+):(\d+):(\d+):(\d+)")
+_SHOWINFO_SIZE = re.compile(r"\bs:(\d+)x(\d+)")
+
 
 def probe_media_info(ffprobe_path: str, media_path: str) -> Optional[MediaInfo]:
     """
@@ -82,6 +97,14 @@ def probe_media_info(ffprobe_path: str, media_path: str) -> Optional[MediaInfo]:
             except (ValueError, TypeError):
                 pass
 
+        # Rotation: display matrix side data, or the rotate tag of older muxers
+        rotation = 0
+        for side_data in stream.get("side_data_list", []):
+            if "rotation" in side_data:
+                rotation = int(float(side_data["rotation"]))
+        if not rotation and "rotate" in stream.get("tags", {}):
+            rotation = int(stream["tags"]["rotate"])
+
         return MediaInfo(
             width=width,
             height=height,
@@ -91,10 +114,125 @@ def probe_media_info(ffprobe_path: str, media_path: str) -> Optional[MediaInfo]:
             codec=codec,
             pix_fmt=pix_fmt,
             bitrate=bitrate,
+            rotation=rotation,
         )
 
-    except (subprocess.TimeoutExpired, json.JSONDecodeError, ValueError, KeyError) as e:
+    except (OSError, subprocess.TimeoutExpired, json.JSONDecodeError, ValueError, KeyError) as e:
+        return None
+
+
+def probe_keyframes(ffprobe_path: str, media_path: str) -> Optional[List[float]]:
+    """
+    Index the keyframes of a media file's first video stream.
+
+    ffprobe reads the packet flags without decoding anything, so this costs
+    one pass over the file's data, once per file.
+
+    Args:
+        ffprobe_path: Path to ffprobe executable
+        media_path: Path to media file to index
+
+    Returns:
+        Sorted keyframe times in seconds, on the timeline -ss uses (relative
+        to the file's start time), or None if the file could not be read
+    """
+    cmd = [
+        ffprobe_path,
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags:format=start_time",
+        "-of", "csv=p=1",
+        media_path,
+    ]
+
+    try:
+        result = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            timeout=_KEYFRAME_PROBE_TIMEOUT,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+
+    # Lines look like "packet,12.345000,K__" and, last, "format,0.000000"
+    times = []
+    start_time = 0.0
+    for line in result.stdout.splitlines():
+        fields = line.strip().split(",")
+        try:
+            if fields[0] == "packet" and len(fields) >= 3 and fields[2].startswith("K") and "D" not in fields[2]:
+                times.append(float(fields[1]))
+            elif fields[0] == "format" and len(fields) >= 2:
+                start_time = float(fields[1])
+        except ValueError:
+            continue  # pts_time is N/A for packets without timestamps
+    return sorted(round(t - start_time, 6) for t in times)
+
+
+def crop_sample_times(ranges: List[tuple[float, float]], count: int = CROP_SAMPLE_POINTS) -> List[float]:
+    """Evenly spaced times across the (start, end) ranges, for detect_crop"""
+    total = sum(max(0.0, end - start) for start, end in ranges)
+    times = []
+    for i in range(count if total > 0 else 0):
+        offset = (i + 0.5) * total / count
+        for start, end in ranges:
+            if offset <= end - start:
+                break
+            offset -= max(0.0, end - start)
+        times.append(start + offset)
+    return times
+
+
+def detect_crop(ffmpeg_path: str, media_path: str, times: List[float]) -> Optional[str]:
+    """
+    Find the black bars around a video's picture with FFmpeg's cropdetect.
+
+    A few frames are decoded at each time in one FFmpeg run. The crop covers
+    the picture area of all of them, so a dark scene cannot cut into the
+    picture of the others.
+
+    Args:
+        ffmpeg_path: Path to ffmpeg executable
+        media_path: Path to media file to scan
+        times: Seconds into the file to look at (see crop_sample_times)
+
+    Returns:
+        Crop filter such as "crop=1920:800:0:140", "" if the picture fills
+        the frame, None if no frame could be read
+    """
+    if not times:
+        return None
+
+    cmd = [ffmpeg_path, "-hide_banner", "-nostats"]
+    graph = []
+    for idx, t in enumerate(times):
+        cmd += ["-ss", f"{t:.3f}", "-t", "1", "-i", media_path]
+        graph.append(f"[{idx}:v]trim=end_frame={_CROP_SAMPLE_FRAMES}[c{idx}]")
+    labels = "".join(f"[c{idx}]" for idx in range(len(times)))
+    graph.append(f"{labels}concat=n={len(times)}:v=1:a=0,cropdetect=round=2:skip=0,showinfo")
+    cmd += ["-filter_complex", ";".join(graph), "-an", "-f", "null", "-"]
+
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+    # cropdetect keeps growing its area over the frames, so the last line covers them all
+    crops = _CROPDETECT_LINE.findall(result.stderr)
+    sizes = _SHOWINFO_SIZE.findall(result.stderr)
+    if not crops or not sizes:
         return None
+    width, height, x, y = map(int, crops[-1])
+    frame_width, frame_height = map(int, sizes[-1])
+    if width <= 0 or height <= 0:
+        return None  # Only black frames were found
+    if width > frame_width * (1 - _MIN_CROP_FRACTION) and height > frame_height * (1 - _MIN_CROP_FRACTION):
+        return ""
+    return f"crop={width}:{height}:{x}:{y}"
 
 
 def estimate_gif_size(
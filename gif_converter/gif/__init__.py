@@ -0,0 +1,19 @@
+"""Native GIF encoding for GIF Forge (requires NumPy)"""
+
+from .encoder import GifEncoder, FRAME_PIPE_ARGS, read_bmp_frames
+from .lzw import lzw_encode
+from .optimize import optimize_frames
+from .palette import quantize, read_ppm_frames, write_palette_png
+from .writer import GifWriter
+
+__all__ = [
+    "GifEncoder",
+    "FRAME_PIPE_ARGS",
+    "read_bmp_frames",
+    "lzw_encode",
+    "optimize_frames",
+    "quantize",
+    "read_ppm_frames",
+    "write_palette_png",
+    "GifWriter",
+]
@@ -0,0 +1,277 @@
+"""Built-in GIF encoder for paletted frames piped from FFmpeg"""
+
+from __future__ import annotations
+
+import math
+import multiprocessing
+import struct
+from collections import deque
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor
+from typing import BinaryIO, Callable, Deque, Iterator, List, Optional
+
+import numpy as np
+
+from gif_converter.gif.lzw import color_distances, lossy_threshold, lzw_encode
+from gif_converter.gif.optimize import DISPOSE_PREVIOUS, FramePatch, drop_duplicates, optimize_frames
+from gif_converter.gif.writer import GifWriter, table_bits
+
+# FFmpeg arguments that make the final stage write paletted BMP frames to stdout
+FRAME_PIPE_ARGS = ["-f", "image2pipe", "-c:v", "bmp", "pipe:1"]
+
+# Lossy settings shared by the frames handed to one worker process
+_worker_distances: Optional[List[List[int]]] = None
+_worker_threshold = 0
+
+
+def _init_worker(distances: Optional[List[List[int]]], threshold: int) -> None:
+    global _worker_distances, _worker_threshold
+    _worker_distances = distances
+    _worker_threshold = threshold
+
+
+def _encode_frame(
+    pixels: bytes, min_code_size: int, full_pixels: Optional[bytes] = None
+) -> tuple[bytes, Optional[bytes]]:
+    """Compress a frame, plus its full-frame version when it is a patch"""
+    data = lzw_encode(pixels, min_code_size, _worker_distances, _worker_threshold)
+    if full_pixels is None:
+        return data, None
+    return data, lzw_encode(full_pixels, min_code_size, _worker_distances, _worker_threshold)
+
+
+def _read_exact(stream: BinaryIO, size: int) -> bytes:
+    data = stream.read(size)
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise EOFError("truncated BMP frame")
+        data += chunk
+    return data
+
+
+def read_bmp_frames(stream: BinaryIO) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """
+    Parse a stream of 8-bit BMP images, as written by FFmpeg's image2pipe muxer.
+
+    Yields:
+        (indices, palette): (height, width) uint8 palette indices, top row
+        first, and the (256, 3) uint8 RGB palette
+    """
+    while True:
+        head = stream.read(14)
+        if not head:
+            return
+        if len(head) < 14:
+            head += _read_exact(stream, 14 - len(head))
+        if head[:2] != b"BM":
+            raise ValueError("frame stream is not BMP")
+        file_size, data_offset = struct.unpack_from("<I4xI", head, 2)
+        body = _read_exact(stream, file_size - 14)
+
+        dib_size, width, height, _, bpp = struct.unpack_from("<IiiHH", body, 0)
+        if bpp != 8:
+            raise ValueError(f"expected 8-bit paletted frames, got {bpp}-bit")
+        colors_used = struct.unpack_from("<I", body, 32)[0] or 256
+
+        palette = np.frombuffer(body, np.uint8, colors_used * 4, dib_size).reshape(-1, 4)
+        rgb = np.zeros((256, 3), dtype=np.uint8)
+        rgb[:colors_used] = palette[:, 2::-1]  # BGRA -> RGB
+
+        stride = (width + 3) & ~3
+        rows = np.frombuffer(body, np.uint8, stride * abs(height), data_offset - 14)
+        indices = rows.reshape(abs(height), stride)[:, :width]
+        if height > 0:
+            indices = indices[::-1]  # Bottom-up rows
+        yield indices, rgb
+
+
+def frame_delay(index: int, fps: float, count: int = 1) -> int:
+    """Delay in centiseconds of ``count`` frames from ``index`` on, spreading rounding error over frames"""
+    return math.floor(100 * (index + count) / fps + 0.5) - math.floor(100 * index / fps + 0.5)
+
+
+class GifEncoder:
+    """
+    Encodes paletted frames into a GIF, compressing frames in parallel.
+
+    The color table is sized for the profile's color count (paletteuse never
+    uses more), and each frame's LZW stream is built in a worker process;
+    frames are written in order as their streams complete.
+
+    With ``optimize`` set, frames are reduced to patches over the previous
+    frame (see optimize_frames). Each patch is also compressed as a full
+    frame; the smaller of the two is written and the difference is reported.
+
+    With ``dedupe`` limits, near-duplicate frames are dropped and their time
+    is added to the delay of the frame shown instead (see drop_duplicates).
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        fps: float,
+        loop_count: int = 0,
+        colors: int = 256,
+        lossy: int = 0,
+        optimize: bool = False,
+        dedupe: Optional[tuple[int, int, float]] = None,
+        max_workers: int = 1,
+        on_log: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self._output_path = output_path
+        self._fps = fps
+        self._loop_count = loop_count
+        self._colors = colors
+        self._lossy = lossy
+        self._optimize = optimize
+        self._dedupe = dedupe
+        self._max_workers = max(1, max_workers)
+        self._on_log = on_log
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        self._cancelled = True
+
+    def encode(self, stream: BinaryIO) -> tuple[bool, str]:
+        """
+        Read frames from stream until it ends and write the GIF.
+
+        Returns:
+            (success, error message)
+        """
+        frames = read_bmp_frames(stream)
+        try:
+            first = next(frames, None)
+        except (ValueError, EOFError) as e:
+            return False, str(e)
+        if first is None:
+            return False, "no frames received"
+
+        indices, full_palette = first
+        table_size = 1 << table_bits(max(2, self._colors))
+        palette = full_palette[:table_size]
+
+        # The last entry is palettegen's reserved transparent slot, which
+        # paletteuse leaves unused; the optimizer uses it for unchanged pixels
+        transparent = table_size - 1
+        usable = transparent if self._optimize else table_size
+
+        # Anything outside the usable entries (there should be nothing) maps to its closest entry
+        distances = np.array(color_distances(full_palette))
+        remap = np.argmin(distances[:, :usable], axis=1).astype(np.uint8)
+        remap[:usable] = np.arange(usable)
+
+        threshold = lossy_threshold(self._lossy)
+        table_distances = None
+        if threshold:
+            # Lossy matching must never swap a color for transparency or back
+            table = distances[:table_size, :table_size].copy()
+            if self._optimize:
+                table[transparent, :] = table[:, transparent] = threshold + 1
+                table[transparent, transparent] = 0
+            table_distances = table.tolist()
+
+        executor: Optional[Executor] = None
+        if self._max_workers > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=self._max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(table_distances, threshold),
+            )
+        else:
+            _init_worker(table_distances, threshold)
+
+        height, width = indices.shape
+
+        def full_frames() -> Iterator[np.ndarray]:
+            frame = indices
+            while frame is not None:
+                if frame.shape != (height, width):
+                    raise ValueError("frame size changed mid-stream")
+                yield remap[frame]
+                item = next(frames, None)
+                frame = item[0] if item else None
+
+        spans: Deque[int] = deque()
+        source = full_frames()
+        if self._dedupe:
+            luma = np.rint(full_palette.astype(np.float32) @ np.float32([0.299, 0.587, 0.114]))
+            source = drop_duplicates(source, luma.astype(np.uint8), self._dedupe, spans)
+
+        if self._optimize:
+            patches = optimize_frames(source, transparent)
+        else:
+            patches = (FramePatch(frame=f, indices=f) for f in source)
+
+        count = 0
+        shown = 0  # Input frames covered by the frames written so far
+        stored_bytes = 0
+        full_bytes = 0
+        restores = 0
+        try:
+            with open(self._output_path, "wb") as f:
+                writer = GifWriter(f, width, height, palette, self._loop_count)
+                min_code_size = writer.min_code_size
+                pending: Deque[tuple[FramePatch, Future]] = deque()
+
+                def write(patch: FramePatch, result: tuple[bytes, Optional[bytes]]) -> None:
+                    nonlocal count, shown, stored_bytes, full_bytes, restores
+                    data, full_data = result
+                    span = spans.popleft() if self._dedupe else 1
+                    delay = frame_delay(shown, self._fps, span)
+                    shown += span
+                    if full_data is not None and len(full_data) <= len(data):
+                        # The patch did not pay off; a full opaque frame shows the same image
+                        writer.write_frame(full_data, delay, disposal=patch.disposal)
+                        data = full_data
+                    else:
+                        h, w = patch.indices.shape
+                        writer.write_frame(
+                            data, delay, patch.left, patch.top, w, h, patch.disposal, patch.transparent
+                        )
+                    stored_bytes += len(data)
+                    full_bytes += len(full_data if full_data is not None else data)
+                    restores += patch.disposal == DISPOSE_PREVIOUS
+                    count += 1
+
+                for patch in patches:
+                    if self._cancelled:
+                        return False, "Cancelled"
+
+                    pixels = patch.indices.tobytes()
+                    full_pixels = None if patch.is_full_frame else patch.frame.tobytes()
+                    if executor:
+                        future = executor.submit(_encode_frame, pixels, min_code_size, full_pixels)
+                        pending.append((patch, future))
+                        if len(pending) > self._max_workers * 2:
+                            patch, future = pending.popleft()
+                            write(patch, future.result())
+                    else:
+                        write(patch, _encode_frame(pixels, min_code_size, full_pixels))
+
+                while pending:
+                    patch, future = pending.popleft()
+                    write(patch, future.result())
+                writer.close()
+        except (ValueError, EOFError, OSError, BrokenExecutor) as e:
+            return False, str(e)
+        finally:
+            if executor:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        lossy_text = f", lossy {self._lossy}" if threshold else ""
+        self._log(f"Built-in encoder: {count} frame(s), {table_size} colors{lossy_text}")
+        if self._dedupe:
+            self._log(f"Dedupe: removed {shown - count} of {shown} frames")
+        if self._optimize and full_bytes:
+            saved = full_bytes - stored_bytes
+            self._log(
+                f"Frame optimizer: saved {saved / 1024:.0f} KB of {full_bytes / 1024:.0f} KB "
+                f"({100 * saved / full_bytes:.0f}%), {restores} frame(s) restore the previous canvas"
+            )
+        return True, ""
+
+    def _log(self, line: str) -> None:
+        if self._on_log:
+            self._on_log(line)
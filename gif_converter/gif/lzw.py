@@ -0,0 +1,144 @@
+"""LZW compression of GIF image data, with optional lossy matching"""
+
+from __future__ import annotations
+
+from array import array
+from typing import List, Optional
+
+import numpy as np
+
+_MAX_CODES = 4096
+_MAX_CODE_BITS = 12
+
+# Per-channel weights for color distances (green matters most to the eye)
+_CHANNEL_WEIGHTS = np.array([0.30, 0.59, 0.11]) * 3
+
+
+def color_distances(palette: np.ndarray) -> List[List[int]]:
+    """
+    Pairwise weighted RGB distances between palette entries.
+
+    Args:
+        palette: (N, 3) uint8 array of RGB colors
+
+    Returns:
+        N lists of N rounded distances, indexed [from][to]
+    """
+    rgb = palette.astype(np.float64)
+    diff = rgb[:, None, :] - rgb[None, :, :]
+    dist = np.sqrt((diff * diff * _CHANNEL_WEIGHTS).sum(axis=-1))
+    return np.rint(dist).astype(np.int32).tolist()
+
+
+def lossy_threshold(lossy: int) -> int:
+    """Largest color distance a pixel may be moved by at a lossy level (0-200)"""
+    return int(round(max(0, min(200, lossy)) * 0.3))
+
+
+def lzw_encode(
+    indices: bytes,
+    min_code_size: int,
+    distances: Optional[List[List[int]]] = None,
+    threshold: int = 0,
+) -> bytes:
+    """
+    Compress one image's palette indices into a GIF LZW code stream.
+
+    With a threshold, a pixel that would end the current string is instead
+    replaced by a similar color if the string can continue with it, as long
+    as the two colors are at most ``threshold`` apart. Longer strings mean
+    fewer codes, which is where the size saving comes from; every pixel stays
+    within the threshold of its original color.
+
+    Args:
+        indices: Palette indices, row by row
+        min_code_size: LZW minimum code size (bits per index, 2-8)
+        distances: Palette distance table from color_distances() (lossy only)
+        threshold: Maximum distance for lossy matches (0 = lossless)
+
+    Returns:
+        Packed code stream, without sub-block framing
+    """
+    clear = 1 << min_code_size
+    end = clear + 1
+    first_free = clear + 2
+    lossy = distances is not None and threshold > 0
+
+    codes = array("H")
+    widths = array("B")
+    emit_code = codes.append
+    emit_width = widths.append
+
+    table = {}
+    children = {} if lossy else None
+    next_code = first_free
+    code_size = min_code_size + 1
+
+    emit_code(clear)
+    emit_width(code_size)
+
+    if not indices:
+        emit_code(end)
+        emit_width(code_size)
+        return pack_codes(codes, widths)
+
+    it = iter(indices)
+    prefix = next(it)
+    for px in it:
+        key = (prefix << 8) | px
+        code = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+
+        if lossy:
+            # Continue the string with the closest known follower, if close enough
+            best = -1
+            best_dist = threshold + 1
+            row = distances[px]
+            for child in children.get(prefix, ()):
+                d = row[child]
+                if d < best_dist:
+                    best, best_dist = child, d
+            if best >= 0:
+                prefix = table[(prefix << 8) | best]
+                continue
+
+        emit_code(prefix)
+        emit_width(code_size)
+
+        if next_code < _MAX_CODES:
+            # The decoder learns each code one step later, so widen only once
+            # the previous code no longer fits
+            if next_code >= (1 << code_size) and code_size < _MAX_CODE_BITS:
+                code_size += 1
+            table[key] = next_code
+            if lossy:
+                children.setdefault(prefix, []).append(px)
+            next_code += 1
+        else:
+            emit_code(clear)
+            emit_width(code_size)
+            table.clear()
+            if lossy:
+                children.clear()
+            next_code = first_free
+            code_size = min_code_size + 1
+        prefix = px
+
+    emit_code(prefix)
+    emit_width(code_size)
+    if next_code >= (1 << code_size) and code_size < _MAX_CODE_BITS:
+        code_size += 1
+    emit_code(end)
+    emit_width(code_size)
+    return pack_codes(codes, widths)
+
+
+def pack_codes(codes: array, widths: array) -> bytes:
+    """Pack variable-width codes LSB-first into bytes"""
+    values = np.frombuffer(codes, dtype=np.uint16).astype(np.uint32)
+    sizes = np.frombuffer(widths, dtype=np.uint8)
+    shifts = np.arange(_MAX_CODE_BITS, dtype=np.uint32)
+    bits = ((values[:, None] >> shifts) & 1).astype(np.uint8)
+    return np.packbits(bits[shifts[None, :] < sizes[:, None]], bitorder="little").tobytes()
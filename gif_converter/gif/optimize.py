@@ -0,0 +1,154 @@
+"""Inter-frame optimization: store only what changed between frames"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Deque, Iterable, Iterator, Optional
+
+import numpy as np
+
+# GIF disposal methods
+DISPOSE_NONE = 1  # Leave the frame on the canvas
+DISPOSE_PREVIOUS = 3  # Restore the canvas to what it was before the frame
+
+
+@dataclass(slots=True)
+class FramePatch:
+    """The part of a frame that has to be stored, and how to composite it"""
+    frame: np.ndarray  # Full frame (palette indices), for a full-frame fallback
+    indices: np.ndarray  # Patch pixels; unchanged pixels hold the transparent index
+    left: int = 0
+    top: int = 0
+    disposal: int = DISPOSE_NONE
+    transparent: Optional[int] = None  # Transparent index used in the patch
+
+    @property
+    def is_full_frame(self) -> bool:
+        return self.transparent is None and self.indices.shape == self.frame.shape
+
+
+def changed_box(a: np.ndarray, b: np.ndarray) -> Optional[tuple[int, int, int, int]]:
+    """Bounding box (top, bottom, left, right) of pixels that differ, or None"""
+    diff = a != b
+    rows = np.flatnonzero(diff.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(diff.any(axis=0))
+    return int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1
+
+
+def _box_area(box: Optional[tuple[int, int, int, int]]) -> int:
+    if box is None:
+        return 0
+    top, bottom, left, right = box
+    return (bottom - top) * (right - left)
+
+
+def is_duplicate(a: np.ndarray, b: np.ndarray, limits: tuple[int, int, float]) -> bool:
+    """
+    Check whether two luma frames are near-duplicates, with mpdecimate's rule.
+
+    Args:
+        a, b: (height, width) luma frames
+        limits: (hi, lo, frac): no 8x8 block may differ by more than hi in
+            total, and at most frac of the blocks by more than lo
+    """
+    hi, lo, frac = limits
+    h, w = (a.shape[0] // 8) * 8, (a.shape[1] // 8) * 8
+    if not h or not w:
+        return np.array_equal(a, b)
+    diff = np.abs(a[:h, :w].astype(np.int16) - b[:h, :w].astype(np.int16))
+    blocks = diff.reshape(h // 8, 8, w // 8, 8).sum(axis=(1, 3))
+    if (blocks > hi).any():
+        return False
+    return float((blocks > lo).mean()) <= frac
+
+
+def drop_duplicates(
+    frames: Iterable[np.ndarray],
+    luma: np.ndarray,
+    limits: tuple[int, int, float],
+    spans: Deque[int],
+) -> Iterator[np.ndarray]:
+    """
+    Skip frames that are near-duplicates of the last frame kept.
+
+    A frame is yielded once the next kept frame (or the end) is found, and
+    right before that the number of input frames it stands for is appended
+    to spans, so the consumer can fold the dropped frames' time into its
+    delay.
+
+    Args:
+        frames: Full frames of palette indices, in order
+        luma: Luma (0-255) of every palette entry
+        limits: Duplicate limits, see is_duplicate
+        spans: Receives the input frame count of every yielded frame
+    """
+    kept = None
+    kept_luma = None
+    count = 0
+    for frame in frames:
+        frame_luma = luma[frame]
+        if kept is not None and is_duplicate(kept_luma, frame_luma, limits):
+            count += 1
+            continue
+        if kept is not None:
+            spans.append(count)
+            yield kept
+        kept, kept_luma, count = frame, frame_luma, 1
+    if kept is not None:
+        spans.append(count)
+        yield kept
+
+
+def optimize_frames(frames: Iterable[np.ndarray], transparent: int) -> Iterator[FramePatch]:
+    """
+    Turn full frames into patches over the previous canvas.
+
+    Each frame is cropped to the box of pixels that differ from what the
+    viewer currently shows, and pixels inside the box that did not change are
+    set to the transparent index. One frame of lookahead picks each frame's
+    disposal: if the next frame is closer to the canvas from before this
+    frame (a flash or a brief overlay), the frame restores that canvas when
+    it is done, otherwise it stays.
+
+    Args:
+        frames: Full frames of palette indices, in order
+        transparent: Palette index reserved for transparency (unused by frames)
+    """
+    it = iter(frames)
+    cur = next(it, None)
+    base: Optional[np.ndarray] = None  # Canvas shown before the current frame
+
+    while cur is not None:
+        nxt = next(it, None)
+
+        if base is None:
+            patch = FramePatch(frame=cur, indices=cur)
+        else:
+            box = changed_box(cur, base)
+            if box is None:
+                # Nothing changed; GIF frames need at least one pixel
+                box = (0, 1, 0, 1)
+            top, bottom, left, right = box
+            region = cur[top:bottom, left:right]
+            same = region == base[top:bottom, left:right]
+            patch = FramePatch(
+                frame=cur,
+                indices=np.where(same, np.uint8(transparent), region),
+                left=left,
+                top=top,
+                transparent=transparent,
+            )
+
+        next_base = cur
+        if nxt is not None and base is not None:
+            keep_cost = _box_area(changed_box(nxt, cur))
+            restore_cost = _box_area(changed_box(nxt, base))
+            if restore_cost < keep_cost:
+                patch.disposal = DISPOSE_PREVIOUS
+                next_base = base
+
+        yield patch
+        base = next_base
+        cur = nxt
@@ -0,0 +1,149 @@
+"""Palette quantization from sampled frames"""
+
+from __future__ import annotations
+
+import re
+import struct
+import zlib
+from typing import Iterator, List
+
+import numpy as np
+
+# Pixels the quantizer looks at; frames are subsampled evenly down to this
+MAX_PALETTE_PIXELS = 1 << 19
+
+# Pixels used by the k-means refinement after median cut
+_REFINE_PIXELS = 1 << 16
+_REFINE_ITERATIONS = 3
+
+_PPM_HEADER = re.compile(rb"P6\s+(\d+)\s+(\d+)\s+255\s")
+
+# palettegen's reserved transparent entry, kept in the last slot
+_TRANSPARENT = (0, 255, 0, 0)
+
+
+def read_ppm_frames(data: bytes) -> Iterator[np.ndarray]:
+    """
+    Parse binary PPM (P6) images, as written by FFmpeg's ppm encoder.
+
+    Yields:
+        (height, width, 3) uint8 RGB frames
+    """
+    pos = 0
+    while pos < len(data):
+        header = _PPM_HEADER.match(data, pos)
+        if not header:
+            raise ValueError("expected 8-bit binary PPM frames")
+        width, height = int(header.group(1)), int(header.group(2))
+        pos = header.end()
+        size = width * height * 3
+        if pos + size > len(data):
+            raise ValueError("truncated PPM frame")
+        yield np.frombuffer(data, np.uint8, size, pos).reshape(height, width, 3)
+        pos += size
+
+
+def sample_pixels(frames: List[np.ndarray], max_pixels: int = MAX_PALETTE_PIXELS) -> np.ndarray:
+    """All pixels of the frames as an (N, 3) array, evenly thinned to at most max_pixels"""
+    pixels = np.concatenate([f.reshape(-1, 3) for f in frames]) if frames else np.zeros((0, 3), np.uint8)
+    step = -(-len(pixels) // max_pixels)
+    return pixels[::max(1, step)]
+
+
+def median_cut(pixels: np.ndarray, count: int) -> np.ndarray:
+    """
+    Split the color cube into up to count boxes of about equal pixel weight.
+
+    The box with the largest (channel range x pixel count) is split at the
+    median of its widest channel until there are count boxes or no box can
+    be split.
+
+    Returns:
+        (K, 3) float64 box means, K <= count
+    """
+    if not len(pixels):
+        return np.zeros((0, 3))
+
+    def score(box: np.ndarray) -> float:
+        return float(np.ptp(box, axis=0).max()) * len(box) if len(box) > 1 else -1.0
+
+    boxes = [pixels]
+    scores = [score(pixels)]
+    while len(boxes) < count:
+        idx = int(np.argmax(scores))
+        if scores[idx] <= 0:
+            break
+        box = boxes.pop(idx)
+        scores.pop(idx)
+        channel = int(np.argmax(np.ptp(box, axis=0)))
+        order = np.argsort(box[:, channel], kind="stable")
+        half = len(box) // 2
+        for part in (box[order[:half]], box[order[half:]]):
+            boxes.append(part)
+            scores.append(score(part))
+    return np.array([box.mean(axis=0) for box in boxes])
+
+
+def refine_palette(pixels: np.ndarray, palette: np.ndarray, iterations: int = _REFINE_ITERATIONS) -> np.ndarray:
+    """Move palette entries to the mean of their closest pixels (k-means steps)"""
+    step = -(-len(pixels) // _REFINE_PIXELS)
+    sample = pixels[::max(1, step)].astype(np.float32)
+    palette = palette.astype(np.float32)
+    for _ in range(iterations):
+        nearest = np.empty(len(sample), dtype=np.intp)
+        for pos in range(0, len(sample), 8192):
+            block = sample[pos:pos + 8192]
+            dist = (block ** 2).sum(1)[:, None] - 2 * block @ palette.T + (palette ** 2).sum(1)[None, :]
+            nearest[pos:pos + 8192] = dist.argmin(axis=1)
+        counts = np.bincount(nearest, minlength=len(palette))
+        sums = np.zeros_like(palette)
+        np.add.at(sums, nearest, sample)
+        used = counts > 0
+        palette[used] = sums[used] / counts[used, None]
+    return palette
+
+
+def quantize(frames: List[np.ndarray], colors: int) -> np.ndarray:
+    """
+    Build a palette for the frames.
+
+    Like palettegen, one entry is reserved for transparency, so the palette
+    has at most colors - 1 entries.
+
+    Returns:
+        (K, 3) uint8 palette
+    """
+    pixels = sample_pixels(frames)
+    palette = median_cut(pixels, max(1, colors - 1))
+    if len(palette):
+        palette = refine_palette(pixels, palette)
+    return np.clip(np.rint(palette), 0, 255).astype(np.uint8)
+
+
+def write_palette_png(path: str, palette: np.ndarray) -> None:
+    """
+    Write a palette as the 16x16 RGBA image palettegen produces.
+
+    Unused entries repeat the last color and the final entry is palettegen's
+    transparent color, so paletteuse and the built-in encoder treat the file
+    exactly like one from palettegen.
+    """
+    entries = np.zeros((256, 4), dtype=np.uint8)
+    count = min(len(palette), 255)
+    if count:
+        entries[:count, :3] = palette[:count]
+        entries[:count, 3] = 255
+        entries[count:255] = entries[count - 1]
+    entries[255] = _TRANSPARENT
+
+    rows = entries.reshape(16, 16 * 4)
+    raw = b"".join(b"\x00" + row.tobytes() for row in rows)  # Filter type 0 per row
+
+    def chunk(kind: bytes, body: bytes) -> bytes:
+        return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", 16, 16, 8, 6, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw, 9)))
+        f.write(chunk(b"IEND", b""))
@@ -0,0 +1,103 @@
+"""Low-level GIF89a file writer"""
+
+from __future__ import annotations
+
+import struct
+from typing import BinaryIO, Optional
+
+import numpy as np
+
+from gif_converter.ffmpeg.gif_blocks import netscape_loop_block
+
+
+def sub_blocks(data: bytes) -> bytes:
+    """Frame data as GIF sub-blocks (at most 255 bytes each) plus the terminator"""
+    parts = []
+    for pos in range(0, len(data), 255):
+        chunk = data[pos:pos + 255]
+        parts.append(bytes((len(chunk),)))
+        parts.append(chunk)
+    parts.append(b"\x00")
+    return b"".join(parts)
+
+
+def table_bits(colors: int) -> int:
+    """Bits per index of the smallest GIF color table with room for colors entries"""
+    bits = 1
+    while (1 << bits) < colors:
+        bits += 1
+    return bits
+
+
+def graphic_control_block(delay_cs: int, disposal: int = 0, transparent: Optional[int] = None) -> bytes:
+    """Graphic control extension: frame delay, disposal method and transparency"""
+    flags = (disposal & 7) << 2
+    if transparent is not None:
+        flags |= 1
+    return struct.pack(
+        "<BBBBHBB", 0x21, 0xF9, 4, flags, max(0, min(delay_cs, 0xFFFF)), transparent or 0, 0
+    )
+
+
+class GifWriter:
+    """
+    Writes a GIF89a file frame by frame.
+
+    Frames arrive already LZW-compressed; the writer only lays out the header,
+    global color table, loop extension, per-frame blocks and trailer.
+    """
+
+    def __init__(
+        self,
+        stream: BinaryIO,
+        width: int,
+        height: int,
+        palette: np.ndarray,
+        loop_count: int = 0,
+    ) -> None:
+        """
+        Args:
+            stream: Binary file object to write to
+            width: Canvas width
+            height: Canvas height
+            palette: (N, 3) uint8 RGB global color table; N must be a power of two
+            loop_count: FFmpeg-style loop count (0 = forever, -1 = once)
+        """
+        self._stream = stream
+        self.width = width
+        self.height = height
+        self.bits = table_bits(len(palette))
+
+        flags = 0x80 | ((self.bits - 1) << 4) | (self.bits - 1)
+        stream.write(b"GIF89a")
+        stream.write(struct.pack("<HHBBB", width, height, flags, 0, 0))
+        stream.write(np.ascontiguousarray(palette, dtype=np.uint8).tobytes())
+        stream.write(netscape_loop_block(loop_count))
+
+    @property
+    def min_code_size(self) -> int:
+        """LZW minimum code size for frames using the global color table"""
+        return max(2, self.bits)
+
+    def write_frame(
+        self,
+        lzw_data: bytes,
+        delay_cs: int,
+        left: int = 0,
+        top: int = 0,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        disposal: int = 0,
+        transparent: Optional[int] = None,
+    ) -> None:
+        """Write one compressed frame (a full-canvas image unless a rectangle is given)"""
+        width = self.width if width is None else width
+        height = self.height if height is None else height
+        self._stream.write(graphic_control_block(delay_cs, disposal, transparent))
+        self._stream.write(struct.pack("<BHHHHB", 0x2C, left, top, width, height, 0))
+        self._stream.write(bytes((self.min_code_size,)))
+        self._stream.write(sub_blocks(lzw_data))
+
+    def close(self) -> None:
+        """Write the trailer"""
+        self._stream.write(b"\x3b")
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import List, Optional
 from enum import Enum
 import uuid
 
@@ -39,6 +39,9 @@ class MediaInfo:
     codec: str
     pix_fmt: str
     bitrate: Optional[int] = None
+    crop: Optional[str] = None  # Crop filter that removes black bars ("" if none), None until detected
+    rotation: int = 0  # Display rotation in degrees, which FFmpeg applies before any filter
+    keyframes: Optional[List[float]] = None  # Sorted keyframe times in seconds, for seeking; None until indexed
 
     @property
     def fps(self) -> float:
@@ -48,6 +51,13 @@ class MediaInfo:
         except Exception:
             return 0.0
 
+    @property
+    def display_size(self) -> tuple[int, int]:
+        """Frame size as filters see it, after rotation"""
+        if self.rotation % 180:
+            return self.height, self.width
+        return self.width, self.height
+
     @property
     def aspect_ratio(self) -> float:
         """Calculate aspect ratio"""
@@ -166,8 +176,15 @@ class GifExportProfile:
     text_overlay: Optional[TextOverlay] = None
 
     # Advanced
+    auto_crop: bool = False  # Crop away black bars (letterboxing) before scaling
     scale_filter: str = "lanczos"  # Scaling algorithm: lanczos, bicubic, bilinear
     lossy_compression: Optional[int] = None  # Lossy compression value (0-200, lower is better quality)
+    pipeline: str = "fused"  # fused (one filter graph), stream (raw frames over pipes) or files (intermediate clips)
+    encoder: str = "auto"  # auto or ffmpeg (FFmpeg's GIF muxer), builtin (slower; lossy compression and frame optimization)
+    optimize_frames: bool = False  # Store only pixels that changed from the previous frame (built-in encoder)
+    palette_engine: str = "palettegen"  # palettegen (every frame) or sampled (NumPy quantizer over sampled frames)
+    dedupe_threshold: int = 0  # Drop near-duplicate frames, folding their time into the previous delay (0 = off, 12 = FFmpeg's default)
+    segment_palettes: str = "off"  # Merged GIFs: off, on (one palette per segment) or auto (keep the smaller result)
 
 
 # Preset configurations
@@ -4,12 +4,14 @@ from __future__ import annotations
 
 import os
 import uuid
+from dataclasses import replace
 from typing import Dict, Optional, List
 
 from PySide6 import QtWidgets, QtCore, QtGui
 
 from gif_converter.models.media import (
     MediaFile,
+    MediaInfo,
     Segment,
     GifExportProfile,
     TextOverlay,
@@ -18,8 +20,17 @@ from gif_converter.models.media import (
     GIF_PRESETS,
 )
 from gif_converter.models.qt_models import FileListModel, SegmentTableModel
-from gif_converter.ffmpeg.gif_exporter import GifExporter, GifExportTask
+from gif_converter.ffmpeg.gif_exporter import (
+    GifExporter,
+    GifExportTask,
+    BatchExporter,
+    SizeEstimateWorker,
+    TargetSizeWorker,
+)
+from gif_converter.ffmpeg.batch import build_batch_tasks, shared_palette_conflicts, DEFAULT_NAME_TEMPLATE
 from gif_converter.ffmpeg.utils import estimate_gif_size, format_size_mb
+from gif_converter.ffmpeg.cache import default_cache_dir, default_frame_store_dir
+from gif_converter.ffmpeg.history import ExportHistory
 
 
 class MainWindow(QtWidgets.QMainWindow):
@@ -31,6 +42,29 @@ class MainWindow(QtWidgets.QMainWindow):
         self._thread_pool = QtCore.QThreadPool.globalInstance()
         self._global_order_counter = 0
 
+        # Sampled size estimates start once settings stop changing; results
+        # from older generations are dropped
+        self._estimated_mb: Optional[float] = None
+        self._estimate_generation = 0
+        self._estimate_workers: Dict[int, SizeEstimateWorker] = {}
+        self._estimate_timer = QtCore.QTimer(self)
+        self._estimate_timer.setSingleShot(True)
+        self._estimate_timer.setInterval(600)
+        self._estimate_timer.timeout.connect(self._start_sampled_estimate)
+
+        # Same for the target-size search, which waits for the target to settle
+        self._solve_generation = 0
+        self._solve_workers: Dict[int, TargetSizeWorker] = {}
+        self._solve_timer = QtCore.QTimer(self)
+        self._solve_timer.setSingleShot(True)
+        self._solve_timer.setInterval(800)
+        self._solve_timer.timeout.connect(self._auto_adjust_for_size)
+
+        # Finished exports; a re-export that only changes the loop count
+        # rewrites the earlier GIF instead of encoding again
+        self._export_history = ExportHistory()
+        self._export_task: Optional[GifExportTask] = None
+
         self._build_ui()
         self._connect_actions()
         self._restore_theme()
@@ -137,7 +171,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.radioFullVideo.setToolTip("Convert entire video to GIF")
         self.radioSegment.setToolTip("Convert selected segment to GIF")
         self.radioMerged.setToolTip("Merge all segments into one GIF")
-        self.radioBatch.setToolTip("Create separate GIF for each segment")
+        self.radioBatch.setToolTip("Create separate GIF for each segment (or each file without segments)")
 
         self.radioSegment.setChecked(True)
 
@@ -146,6 +180,26 @@ class MainWindow(QtWidgets.QMainWindow):
         mode_layout.addWidget(self.radioMerged)
         mode_layout.addWidget(self.radioBatch)
 
+        self.txtBatchTemplate = QtWidgets.QLineEdit(DEFAULT_NAME_TEMPLATE)
+        self.txtBatchTemplate.setToolTip(
+            "Batch file name template.\n"
+            "Fields: {name}, {index}, {file_index}, {start}, {end}\n"
+            "Files without time ranges are exported in full."
+        )
+        self.txtBatchTemplate.setEnabled(False)
+        self.radioBatch.toggled.connect(self.txtBatchTemplate.setEnabled)
+        mode_layout.addWidget(self.txtBatchTemplate)
+
+        self.chkSharedPalette = QtWidgets.QCheckBox("Shared palette")
+        self.chkSharedPalette.setToolTip(
+            "Build one palette from all segments and use it for every GIF of the batch:\n"
+            "colors match across the set and the palette is generated only once\n"
+            "(all GIFs need the same frame size)"
+        )
+        self.chkSharedPalette.setEnabled(False)
+        self.radioBatch.toggled.connect(self.chkSharedPalette.setEnabled)
+        mode_layout.addWidget(self.chkSharedPalette)
+
         left_layout.addWidget(mode_group)
         left_layout.addStretch()
 
@@ -315,6 +369,14 @@ class MainWindow(QtWidgets.QMainWindow):
         self.cmbDither.setCurrentText("Sierra2_4a")
         grid.addWidget(self.cmbDither, 1, 3)
 
+        self.chkAutoCrop = QtWidgets.QCheckBox("Auto-crop black bars")
+        self.chkAutoCrop.setChecked(False)
+        self.chkAutoCrop.setToolTip(
+            "Cut away letterbox and pillarbox bars found when the file was loaded,\n"
+            "before scaling, so no pixels or bytes are spent on them"
+        )
+        grid.addWidget(self.chkAutoCrop, 2, 0, 1, 4)
+
         layout.addLayout(grid)
 
         # Target file size
@@ -453,17 +515,146 @@ class MainWindow(QtWidgets.QMainWindow):
         self.chkOptimizePalette.setChecked(True)
         opt_layout.addWidget(self.chkOptimizePalette)
 
+        pipeline_layout = QtWidgets.QHBoxLayout()
+        pipeline_layout.addWidget(QtWidgets.QLabel("Pipeline:"))
+        self.cmbPipeline = QtWidgets.QComboBox()
+        self.cmbPipeline.addItems(["Single Pass", "Streamed", "Clip Files"])
+        self.cmbPipeline.setCurrentText("Single Pass")
+        self.cmbPipeline.setToolTip(
+            "Single Pass: one FFmpeg filter graph, falls back to clip files on failure\n"
+            "Streamed: raw frames piped between FFmpeg stages, nothing written to disk\n"
+            "Clip Files: intermediate clips extracted in parallel"
+        )
+        pipeline_layout.addWidget(self.cmbPipeline)
+        pipeline_layout.addWidget(QtWidgets.QLabel("Encoder:"))
+        self.cmbEncoder = QtWidgets.QComboBox()
+        self.cmbEncoder.addItems(["Auto", "FFmpeg", "Built-in"])
+        self.cmbEncoder.setCurrentText("Auto")
+        self.cmbEncoder.setToolTip(
+            "Auto / FFmpeg: FFmpeg's GIF encoder (lossy compression is not supported)\n"
+            "Built-in: lossy compression and frame optimization, but much slower\n"
+            "(needs NumPy)"
+        )
+        pipeline_layout.addWidget(self.cmbEncoder)
+        pipeline_layout.addWidget(QtWidgets.QLabel("Palette:"))
+        self.cmbPaletteEngine = QtWidgets.QComboBox()
+        self.cmbPaletteEngine.addItems(["All Frames", "Sampled"])
+        self.cmbPaletteEngine.setCurrentText("All Frames")
+        self.cmbPaletteEngine.setToolTip(
+            "All Frames: FFmpeg's palettegen reads every frame\n"
+            "Sampled: quantized from a fixed sample of evenly spaced frames and keyframes,\n"
+            "so palette time does not grow with the duration (needs NumPy)"
+        )
+        pipeline_layout.addWidget(self.cmbPaletteEngine)
+        pipeline_layout.addStretch()
+        opt_layout.addLayout(pipeline_layout)
+
+        merged_layout = QtWidgets.QHBoxLayout()
+        merged_layout.addWidget(QtWidgets.QLabel("Merged GIF Palettes:"))
+        self.cmbSegmentPalettes = QtWidgets.QComboBox()
+        self.cmbSegmentPalettes.addItems(["One Palette", "Per Segment", "Auto (Smaller)"])
+        self.cmbSegmentPalettes.setCurrentText("One Palette")
+        self.cmbSegmentPalettes.setToolTip(
+            "One Palette: one palette over all merged segments\n"
+            "Per Segment: each segment gets its own palette, stored as local color tables;\n"
+            "less banding when segments come from different scenes, up to 768 bytes per frame\n"
+            "Auto: encode both ways and keep the smaller GIF (the log shows both sizes)"
+        )
+        merged_layout.addWidget(self.cmbSegmentPalettes)
+        merged_layout.addStretch()
+        opt_layout.addLayout(merged_layout)
+
         lossy_layout = QtWidgets.QHBoxLayout()
         lossy_layout.addWidget(QtWidgets.QLabel("Lossy Compression:"))
         self.spinLossy = QtWidgets.QSpinBox()
         self.spinLossy.setRange(0, 200)
         self.spinLossy.setValue(0)
         self.spinLossy.setSpecialValueText("None")
-        self.spinLossy.setToolTip("Lower = better quality, higher = smaller size")
+        self.spinLossy.setEnabled(False)  # Follows the encoder choice
+        self.spinLossy.setToolTip("Lower = better quality, higher = smaller size (built-in encoder only)")
         lossy_layout.addWidget(self.spinLossy)
+        lossy_layout.addWidget(QtWidgets.QLabel("Drop Duplicates:"))
+        self.spinDedupe = QtWidgets.QSpinBox()
+        self.spinDedupe.setRange(0, 64)
+        self.spinDedupe.setValue(0)
+        self.spinDedupe.setSpecialValueText("Off")
+        self.spinDedupe.setToolTip(
+            "Drop frames that barely differ from the previous one and show that\n"
+            "frame longer instead; higher = more frames count as duplicates\n"
+            "(12 suits screen recordings and slides)"
+        )
+        lossy_layout.addWidget(self.spinDedupe)
         lossy_layout.addStretch()
         opt_layout.addLayout(lossy_layout)
 
+        self.chkOptimizeFrames = QtWidgets.QCheckBox("Optimize frames (store only changed pixels)")
+        self.chkOptimizeFrames.setChecked(False)
+        self.chkOptimizeFrames.setEnabled(False)  # Follows the encoder choice
+        self.chkOptimizeFrames.setToolTip(
+            "Crop each frame to the area that changed and make unchanged pixels\n"
+            "transparent; big savings for screen recordings and static backgrounds\n"
+            "(built-in encoder only)"
+        )
+        opt_layout.addWidget(self.chkOptimizeFrames)
+
+        jobs_layout = QtWidgets.QHBoxLayout()
+        jobs_layout.addWidget(QtWidgets.QLabel("Parallel Jobs:"))
+        self.spinWorkers = QtWidgets.QSpinBox()
+        self.spinWorkers.setRange(0, 256)
+        self.spinWorkers.setValue(0)
+        self.spinWorkers.setSpecialValueText("Auto")
+        self.spinWorkers.setToolTip("Maximum number of FFmpeg processes to run at once (Auto = one per CPU core)")
+        jobs_layout.addWidget(self.spinWorkers)
+        jobs_layout.addWidget(QtWidgets.QLabel("Reverse Memory:"))
+        self.spinReverseMemory = QtWidgets.QSpinBox()
+        self.spinReverseMemory.setRange(64, 65536)
+        self.spinReverseMemory.setValue(1024)
+        self.spinReverseMemory.setSuffix(" MB")
+        self.spinReverseMemory.setToolTip(
+            "Memory for frames held while reversing (reverse and boomerang);\n"
+            "longer exports are reversed in parts that fit"
+        )
+        jobs_layout.addWidget(self.spinReverseMemory)
+        jobs_layout.addStretch()
+        opt_layout.addLayout(jobs_layout)
+
+        cache_layout = QtWidgets.QHBoxLayout()
+        self.chkClipCache = QtWidgets.QCheckBox("Cache clips and palettes, up to")
+        self.chkClipCache.setChecked(True)
+        self.chkClipCache.setToolTip(
+            "Keep clips from the Clip Files pipeline and generated palettes on disk so\n"
+            "re-exports of the same ranges and filters skip extraction and palette\n"
+            "generation (e.g. after dither, loop or lossy changes)"
+        )
+        self.spinCacheSize = QtWidgets.QSpinBox()
+        self.spinCacheSize.setRange(64, 100000)
+        self.spinCacheSize.setValue(2048)
+        self.spinCacheSize.setSuffix(" MB")
+        self.chkClipCache.toggled.connect(self.spinCacheSize.setEnabled)
+        cache_layout.addWidget(self.chkClipCache)
+        cache_layout.addWidget(self.spinCacheSize)
+        cache_layout.addStretch()
+        opt_layout.addLayout(cache_layout)
+
+        store_layout = QtWidgets.QHBoxLayout()
+        self.chkFrameStore = QtWidgets.QCheckBox("Keep decoded frames, up to")
+        self.chkFrameStore.setChecked(False)
+        self.chkFrameStore.setToolTip(
+            "Decode each segment once to raw frames in the temp folder; palette generation,\n"
+            "size estimates and exports read them from there, so changing colors, dither,\n"
+            "loop or lossy settings decodes nothing (needs NumPy and free disk space)"
+        )
+        self.spinFrameStoreSize = QtWidgets.QSpinBox()
+        self.spinFrameStoreSize.setRange(256, 200000)
+        self.spinFrameStoreSize.setValue(4096)
+        self.spinFrameStoreSize.setSuffix(" MB")
+        self.spinFrameStoreSize.setEnabled(False)
+        self.chkFrameStore.toggled.connect(self.spinFrameStoreSize.setEnabled)
+        store_layout.addWidget(self.chkFrameStore)
+        store_layout.addWidget(self.spinFrameStoreSize)
+        store_layout.addStretch()
+        opt_layout.addLayout(store_layout)
+
         layout.addWidget(opt_group)
         layout.addStretch()
 
@@ -597,10 +788,20 @@ class MainWindow(QtWidgets.QMainWindow):
         # Settings change handlers
         self.cmbPreset.currentTextChanged.connect(self._on_preset_changed)
         self.cmbResolution.currentTextChanged.connect(self._on_resolution_changed)
+        self.cmbEncoder.currentTextChanged.connect(self._on_encoder_changed)
+        self.chkAutoCrop.toggled.connect(self._update_size_estimate)
+        self.chkAutoCrop.toggled.connect(self._scan_crops_async)
         self.spinWidth.valueChanged.connect(self._update_size_estimate)
         self.spinFps.valueChanged.connect(self._update_size_estimate)
         self.cmbColors.currentTextChanged.connect(self._update_size_estimate)
+        self.cmbPaletteEngine.currentTextChanged.connect(self._update_size_estimate)
         self.cmbDither.currentTextChanged.connect(self._update_size_estimate)
+        self.spinLossy.valueChanged.connect(self._update_size_estimate)
+        self.spinDedupe.valueChanged.connect(self._update_size_estimate)
+        self.cmbSpeed.currentTextChanged.connect(self._update_size_estimate)
+        self.chkBoomerang.toggled.connect(self._update_size_estimate)
+        self.chkOptimizeFrames.toggled.connect(self._update_size_estimate)
+        self.chkFrameStore.toggled.connect(self._update_size_estimate)
         self.chkTargetSize.toggled.connect(self.spinTargetSize.setEnabled)
         self.chkTargetSize.toggled.connect(self._on_target_size_changed)
         self.spinTargetSize.valueChanged.connect(self._on_target_size_changed)
@@ -608,6 +809,10 @@ class MainWindow(QtWidgets.QMainWindow):
         # Text overlay enable/disable
         self.chkTextOverlay.toggled.connect(self._on_text_overlay_toggled)
 
+        # Export mode decides whether files alone are enough to export
+        for radio in (self.radioFullVideo, self.radioSegment, self.radioMerged, self.radioBatch):
+            radio.toggled.connect(self._check_export_enabled)
+
         # Enable export when segments exist
         self.segmentModel.dataChanged.connect(self._check_export_enabled)
         self.segmentModel.rowsInserted.connect(self._check_export_enabled)
@@ -629,8 +834,11 @@ class MainWindow(QtWidgets.QMainWindow):
         has_files = self.fileModel.rowCount() > 0
         has_segments = self.segmentModel.has_segments()
 
-        # Enable if we have files (for full video mode) or segments
-        enable = has_files if self.radioFullVideo.isChecked() else has_segments
+        # Enable if we have files (for full video and batch mode) or segments
+        if self.radioFullVideo.isChecked() or self.radioBatch.isChecked():
+            enable = has_files
+        else:
+            enable = has_segments
 
         self.btnExport.setEnabled(enable)
         self.btnPreview.setEnabled(enable)
@@ -662,11 +870,12 @@ class MainWindow(QtWidgets.QMainWindow):
         self._check_export_enabled()
 
     def _probe_file_async(self, media_file: MediaFile) -> None:
-        """Probe media file asynchronously"""
-        from gif_converter.ffmpeg.utils import probe_media_info
+        """Probe media file asynchronously, then index its keyframes in the same task"""
+        from gif_converter.ffmpeg.utils import probe_keyframes, probe_media_info
 
         class _ProbeWorker(QtCore.QObject):
             done = QtCore.Signal(object)
+            indexed = QtCore.Signal(object)
 
             def __init__(self, path: str, ffprobe: str):
                 super().__init__()
@@ -687,26 +896,80 @@ class MainWindow(QtWidgets.QMainWindow):
             def run(self):
                 info = probe_media_info(self._w._ffprobe, self._w._path)
                 self._w.done.emit(info)
+                if info is not None:
+                    # Indexed once per file, so segment seeks land on keyframes; this can take
+                    # a while on long files, and exports started before it seek without it
+                    self._w.indexed.emit(probe_keyframes(self._w._ffprobe, self._w._path))
 
-        def on_done_and_cleanup(info):
+        def cleanup():
             try:
-                if info is None:
-                    QtWidgets.QMessageBox.warning(
-                        self, "Probe failed",
-                        f"Could not read media info for:\n{media_file.path}"
-                    )
-                else:
-                    self.fileModel.update_info(media_file.id, info)
-                    self._update_size_estimate()
-            finally:
-                try:
-                    self._active_probe_workers.remove(worker)
-                except:
-                    pass
-
-        worker.done.connect(on_done_and_cleanup)
+                self._active_probe_workers.remove(worker)
+            except:
+                pass
+
+        def on_done(info):
+            if info is None:
+                QtWidgets.QMessageBox.warning(
+                    self, "Probe failed",
+                    f"Could not read media info for:\n{media_file.path}"
+                )
+                cleanup()
+            else:
+                self.fileModel.update_info(media_file.id, info)
+                self._update_size_estimate()
+                self._scan_crops_async()
+
+        def on_indexed(keyframes):
+            media_file.info.keyframes = keyframes
+            cleanup()
+
+        worker.done.connect(on_done)
+        worker.indexed.connect(on_indexed)
         self._thread_pool.start(_ProbeRunnable(worker))
 
+    def _scan_crops_async(self) -> None:
+        """Detect the black bars of probed files not scanned yet, asynchronously, while auto-crop is on"""
+        if not self.chkAutoCrop.isChecked():
+            return
+        from gif_converter.ffmpeg.utils import crop_sample_times, detect_crop
+
+        class _CropWorker(QtCore.QObject):
+            done = QtCore.Signal(object)
+
+        class _CropRunnable(QtCore.QRunnable):
+            def __init__(self, w: _CropWorker, ffmpeg: str, path: str, duration: float):
+                super().__init__()
+                self._w = w
+                self._ffmpeg = ffmpeg
+                self._path = path
+                self._duration = duration
+
+            def run(self):
+                times = crop_sample_times([(0.0, self._duration)])
+                self._w.done.emit(detect_crop(self._ffmpeg, self._path, times))
+
+        if not hasattr(self, "_active_crop_scans"):
+            self._active_crop_scans = {}
+
+        def scan(media_file: MediaFile) -> None:
+            worker = _CropWorker()
+            self._active_crop_scans[media_file.id] = worker
+
+            def on_done(crop):
+                # None when the scan failed; exports then scan the file's segments themselves
+                self._active_crop_scans.pop(media_file.id, None)
+                media_file.info.crop = crop
+                self._update_size_estimate()
+
+            worker.done.connect(on_done)
+            self._thread_pool.start(
+                _CropRunnable(worker, self._ff_bins["ffmpeg"], media_file.path, media_file.info.duration)
+            )
+
+        for media_file in self.fileModel.files():
+            if media_file.info and media_file.info.crop is None and media_file.id not in self._active_crop_scans:
+                scan(media_file)
+
     def _on_clear_all(self) -> None:
         """Clear all files and segments"""
         self.fileModel.clear()
@@ -811,9 +1074,20 @@ class MainWindow(QtWidgets.QMainWindow):
             return
 
         preset = GIF_PRESETS[preset_name]
+        self._apply_encoding_settings(preset)
+
+        if preset.target_max_size_mb:
+            self.chkTargetSize.setChecked(True)
+            self.spinTargetSize.setValue(int(preset.target_max_size_mb))
+        else:
+            self.chkTargetSize.setChecked(False)
+
+        self._update_size_estimate()
 
-        # Apply preset resolution
-        if preset.width:
+    def _apply_encoding_settings(self, profile: GifExportProfile) -> None:
+        """Show a profile's resolution, fps, colors, dither and lossy settings"""
+        # Resolution
+        if profile.width:
             # Map width to resolution preset
             res_map = {
                 640: "360p",
@@ -823,15 +1097,15 @@ class MainWindow(QtWidgets.QMainWindow):
                 2560: "1440p (2K)",
                 3840: "2160p (4K)",
             }
-            res_text = res_map.get(preset.width, "Custom")
+            res_text = res_map.get(profile.width, "Custom")
             self.cmbResolution.setCurrentText(res_text)
             if res_text == "Custom":
-                self.spinWidth.setValue(preset.width)
+                self.spinWidth.setValue(profile.width)
         else:
             self.cmbResolution.setCurrentText("Auto (Source)")
 
-        self.spinFps.setValue(preset.fps)
-        self.cmbColors.setCurrentText(str(preset.colors))
+        self.spinFps.setValue(profile.fps)
+        self.cmbColors.setCurrentText(str(profile.colors))
 
         dither_map = {
             "none": "None",
@@ -839,21 +1113,13 @@ class MainWindow(QtWidgets.QMainWindow):
             "sierra2_4a": "Sierra2_4a",
             "floyd_steinberg": "Floyd-Steinberg",
         }
-        self.cmbDither.setCurrentText(dither_map.get(preset.dither, "Sierra2_4a"))
-
-        if preset.target_max_size_mb:
-            self.chkTargetSize.setChecked(True)
-            self.spinTargetSize.setValue(int(preset.target_max_size_mb))
-        else:
-            self.chkTargetSize.setChecked(False)
+        self.cmbDither.setCurrentText(dither_map.get(profile.dither, "Sierra2_4a"))
 
-        if preset.lossy_compression is not None:
-            self.spinLossy.setValue(preset.lossy_compression)
+        if profile.lossy_compression is not None:
+            self.spinLossy.setValue(profile.lossy_compression)
         else:
             self.spinLossy.setValue(0)
 
-        self._update_size_estimate()
-
     def _on_resolution_changed(self, resolution_text: str) -> None:
         """Handle resolution preset change"""
         if resolution_text == "Custom":
@@ -863,6 +1129,12 @@ class MainWindow(QtWidgets.QMainWindow):
             self.spinWidth.setVisible(False)
         self._update_size_estimate()
 
+    def _on_encoder_changed(self, encoder_text: str) -> None:
+        """Enable the settings only the built-in encoder supports"""
+        self.spinLossy.setEnabled(encoder_text == "Built-in")
+        self.chkOptimizeFrames.setEnabled(encoder_text == "Built-in")
+        self._update_size_estimate()
+
     def _get_resolution_width(self) -> Optional[int]:
         """Get width from resolution selection"""
         res_text = self.cmbResolution.currentText()
@@ -886,67 +1158,78 @@ class MainWindow(QtWidgets.QMainWindow):
         return 640  # Default
 
     def _on_target_size_changed(self) -> None:
-        """Handle target file size change - auto-adjust settings"""
-        if not self.chkTargetSize.isChecked():
-            self._update_size_estimate()
+        """Handle target file size change - search for settings that fit"""
+        self._update_size_estimate()
+
+        # A new target makes any running search stale
+        self._solve_generation += 1
+        self._solve_timer.stop()
+        for worker in self._solve_workers.values():
+            worker.cancel()
+
+        if self.chkTargetSize.isChecked():
+            self._solve_timer.start()
+
+    def _auto_adjust_for_size(self) -> None:
+        """Search for the best-looking settings that fit the target size (off the UI thread)"""
+        file = self.fileModel.file_at(0)
+        segments = self._estimate_segments()
+        if not file or not file.info or not segments:
             return
 
-        # Auto-adjust settings to meet target
         target_mb = self.spinTargetSize.value()
+        generation = self._solve_generation
+        worker = TargetSizeWorker(
+            generation,
+            self._ff_bins["ffmpeg"],
+            segments,
+            {f.id: f.path for f in self.fileModel.files()},
+            self._picture_size(file),
+            self._build_export_profile(),
+            target_mb,
+            max_workers=self.spinWorkers.value(),
+            crop_filters=self._crop_filters(),
+            source_info=self._source_info(),
+        )
+        worker.logLine.connect(self._append_log)
+        worker.finished.connect(self._on_auto_adjust_finished)
+        self._solve_workers[generation] = worker
 
-        # Get estimated size with current settings
-        self._update_size_estimate()
+        self.statusBar().showMessage(f"Finding settings under {target_mb} MB...")
+        self._thread_pool.start(worker)
+
+    def _on_auto_adjust_finished(self, generation: int, result) -> None:
+        """Apply the settings found by the target-size search"""
+        self._solve_workers.pop(generation, None)
+        if generation != self._solve_generation:
+            return
+
+        target_mb = self.spinTargetSize.value()
+        if result is None:
+            self.statusBar().showMessage(f"No settings found under {target_mb} MB", 8000)
+            return
+
+        self._apply_encoding_settings(result.profile)
+        self.statusBar().showMessage(
+            f"Settings adjusted for {target_mb} MB "
+            f"(~{format_size_mb(result.estimate.size_mb)}, {result.trials} trial encode(s))",
+            8000,
+        )
 
-        # Parse current estimate
-        estimate_text = self.lblEstimatedSize.text()
-        if "MB" in estimate_text or "KB" in estimate_text:
-            # Extract number
-            import re
-            match = re.search(r'([\d.]+)\s*(MB|KB)', estimate_text)
-            if match:
-                current_size = float(match.group(1))
-                unit = match.group(2)
-                if unit == "KB":
-                    current_size /= 1024
-
-                # If over target, suggest adjustments
-                if current_size > target_mb:
-                    self._auto_adjust_for_size(target_mb, current_size)
-
-    def _auto_adjust_for_size(self, target_mb: float, current_mb: float) -> None:
-        """Auto-adjust settings to meet target file size"""
-        # Calculate how much we need to reduce
-        ratio = target_mb / current_mb
-
-        # Strategy: Reduce resolution, FPS, and colors progressively
-        if ratio < 0.3:  # Need 70%+ reduction
-            # Aggressive: Reduce resolution significantly
-            self.cmbResolution.setCurrentText("360p")
-            self.spinFps.setValue(10)
-            self.cmbColors.setCurrentText("128")
-            self.spinLossy.setValue(min(100, int(80 * (1 - ratio))))
-        elif ratio < 0.5:  # Need 50-70% reduction
-            # Moderate: Reduce to 480p
-            self.cmbResolution.setCurrentText("480p (SD)")
-            self.spinFps.setValue(12)
-            self.cmbColors.setCurrentText("256")
-            self.spinLossy.setValue(min(80, int(60 * (1 - ratio))))
-        elif ratio < 0.7:  # Need 30-50% reduction
-            # Light: Reduce to 720p
-            current_res = self.cmbResolution.currentText()
-            if "1080p" in current_res or "1440p" in current_res or "2160p" in current_res:
-                self.cmbResolution.setCurrentText("720p (HD)")
-            self.spinFps.setValue(15)
-            self.spinLossy.setValue(min(60, int(40 * (1 - ratio))))
-        else:  # Need <30% reduction
-            # Minor: Just add lossy compression
-            self.spinLossy.setValue(min(40, int(30 * (1 - ratio))))
-
-        # Update estimate to reflect changes
-        QtCore.QTimer.singleShot(100, self._update_size_estimate)
+    def _estimate_segments(self) -> List[Segment]:
+        """Segments the size estimate is based on for the current export mode"""
+        if self.radioFullVideo.isChecked():
+            file = self.fileModel.file_at(0)
+            if not file or not file.info:
+                return []
+            return [Segment.new(file.id, 0.0, file.info.duration, 1)]
+        return self.segmentModel.all_segments_in_global_order()
 
     def _update_size_estimate(self) -> None:
-        """Update estimated file size"""
+        """Show a quick formula estimate, then schedule a sampled one"""
+        self._cancel_sampled_estimate()
+        self._estimated_mb = None
+
         # Get first file info for estimation
         if self.fileModel.rowCount() == 0:
             self.lblEstimatedSize.setText("No files loaded")
@@ -958,21 +1241,19 @@ class MainWindow(QtWidgets.QMainWindow):
             return
 
         # Calculate duration based on mode
-        if self.radioFullVideo.isChecked():
-            duration = file.info.duration
-        else:
-            segments = self.segmentModel.all_segments_in_global_order()
-            if not segments:
-                self.lblEstimatedSize.setText("No segments")
-                return
-            duration = sum(seg.duration for seg in segments)
+        segments = self._estimate_segments()
+        if not segments:
+            self.lblEstimatedSize.setText("No segments")
+            return
+        duration = sum(seg.duration for seg in segments)
 
         if self.chkBoomerang.isChecked():
             duration *= 2  # Boomerang plays forward and backward
 
         # Get settings
-        width = self._get_resolution_width() or file.info.width
-        height = int(width / file.info.aspect_ratio) if file.info.aspect_ratio else file.info.height
+        source_width, source_height = self._picture_size(file)
+        width = self._get_resolution_width() or source_width
+        height = int(width * source_height / source_width) if source_width else source_height
         fps = self.spinFps.value()
         colors = int(self.cmbColors.currentText())
 
@@ -988,21 +1269,27 @@ class MainWindow(QtWidgets.QMainWindow):
         estimated_mb = estimate_gif_size(duration, width, height, fps, colors, dither)
 
         # Apply lossy compression reduction (rough estimate)
-        lossy = self.spinLossy.value()
+        lossy = self.spinLossy.value() if self.spinLossy.isEnabled() else 0
         if lossy > 0:
             # Lossy compression can reduce size by 20-50%
             reduction = min(0.5, lossy / 400)  # Max 50% reduction
             estimated_mb *= (1 - reduction)
 
-        # Show estimate
-        size_str = format_size_mb(estimated_mb)
+        # Show estimate until the sampled one arrives
+        self._estimated_mb = estimated_mb
+        self._show_size_estimate(f"~{format_size_mb(estimated_mb)}", estimated_mb, estimated_mb)
+        self._estimate_timer.start()
 
-        # Check against target
+    def _show_size_estimate(self, size_str: str, low_mb: float, high_mb: float) -> None:
+        """Show an estimate and how its range compares to the target size"""
         if self.chkTargetSize.isChecked():
             target_mb = self.spinTargetSize.value()
-            if estimated_mb > target_mb:
+            if low_mb > target_mb:
                 self.lblEstimatedSize.setText(f"{size_str} (⚠ Over target of {target_mb} MB)")
                 self.lblEstimatedSize.setStyleSheet("font-size: 12pt; color: #cc6600;")
+            elif high_mb > target_mb:
+                self.lblEstimatedSize.setText(f"{size_str} (⚠ May exceed target of {target_mb} MB)")
+                self.lblEstimatedSize.setStyleSheet("font-size: 12pt; color: #b38600;")
             else:
                 self.lblEstimatedSize.setText(f"{size_str} (✓ Under target)")
                 self.lblEstimatedSize.setStyleSheet("font-size: 12pt; color: #00aa00;")
@@ -1010,6 +1297,67 @@ class MainWindow(QtWidgets.QMainWindow):
             self.lblEstimatedSize.setText(size_str)
             self.lblEstimatedSize.setStyleSheet("font-size: 12pt; color: #0066cc;")
 
+    def _cancel_sampled_estimate(self) -> None:
+        """Invalidate the pending or running sampled estimate"""
+        self._estimate_generation += 1
+        self._estimate_timer.stop()
+        for worker in self._estimate_workers.values():
+            worker.cancel()
+
+    def _start_sampled_estimate(self) -> None:
+        """Trial-encode sample windows with the current settings off the UI thread"""
+        segments = self._estimate_segments()
+        if not segments:
+            return
+
+        generation = self._estimate_generation
+        worker = SizeEstimateWorker(
+            generation,
+            self._ff_bins["ffmpeg"],
+            segments,
+            {f.id: f.path for f in self.fileModel.files()},
+            self._build_export_profile(),
+            frame_store_dir=self._frame_store_dir(),
+            crop_filters=self._crop_filters(),
+            source_info=self._source_info(),
+        )
+        worker.finished.connect(self._on_sampled_estimate)
+        self._estimate_workers[generation] = worker
+        self._thread_pool.start(worker)
+
+    def _on_sampled_estimate(self, generation: int, estimate) -> None:
+        """Replace the formula estimate with the sampled one, unless settings changed since"""
+        self._estimate_workers.pop(generation, None)
+        if generation != self._estimate_generation or estimate is None:
+            return
+
+        self._estimated_mb = estimate.size_mb
+        if estimate.exact:
+            size_str = f"{format_size_mb(estimate.size_mb)} (encoded)"
+        else:
+            size_str = f"{format_size_mb(estimate.size_mb)} ±{format_size_mb(estimate.margin_mb)} (sampled)"
+        self._show_size_estimate(size_str, estimate.low_mb, estimate.high_mb)
+
+    def _frame_store_dir(self) -> Optional[str]:
+        """Frame store root for exports and estimates, or None when disabled"""
+        return default_frame_store_dir() if self.chkFrameStore.isChecked() else None
+
+    def _crop_filters(self) -> Dict[str, str]:
+        """Black-bar crops detected so far, by file id"""
+        return {f.id: f.info.crop for f in self.fileModel.files() if f.info and f.info.crop is not None}
+
+    def _source_info(self) -> Dict[str, MediaInfo]:
+        """Copies of the media info of every probed file, by file id, so a late keyframe index leaves running tasks alone"""
+        return {f.id: replace(f.info) for f in self.fileModel.files() if f.info}
+
+    def _picture_size(self, file: MediaFile) -> tuple[int, int]:
+        """Source frame size of a probed file, without its black bars when auto-crop is on"""
+        crop = file.info.crop if self.chkAutoCrop.isChecked() else None
+        if crop:
+            width, height = crop[len("crop="):].split(":")[:2]
+            return int(width), int(height)
+        return file.info.width, file.info.height
+
     def _build_export_profile(self) -> GifExportProfile:
         """Build export profile from UI settings"""
         # Dithering
@@ -1035,6 +1383,20 @@ class MainWindow(QtWidgets.QMainWindow):
         }
         loop = loop_map.get(self.cmbLoop.currentText(), 0)
 
+        # Pipeline
+        pipeline_map = {"Single Pass": "fused", "Streamed": "stream", "Clip Files": "files"}
+        pipeline = pipeline_map.get(self.cmbPipeline.currentText(), "fused")
+
+        # Encoder
+        encoder_map = {"Auto": "auto", "FFmpeg": "ffmpeg", "Built-in": "builtin"}
+        encoder = encoder_map.get(self.cmbEncoder.currentText(), "auto")
+
+        # Palette engine
+        palette_map = {"All Frames": "palettegen", "Sampled": "sampled"}
+        palette_engine = palette_map.get(self.cmbPaletteEngine.currentText(), "palettegen")
+        segment_palettes_map = {"One Palette": "off", "Per Segment": "on", "Auto (Smaller)": "auto"}
+        segment_palettes = segment_palettes_map.get(self.cmbSegmentPalettes.currentText(), "off")
+
         # Text overlay
         text_overlay = None
         if self.chkTextOverlay.isChecked() and self.txtOverlayText.text().strip():
@@ -1080,6 +1442,13 @@ class MainWindow(QtWidgets.QMainWindow):
             optimize_palette=self.chkOptimizePalette.isChecked(),
             lossy_compression=self.spinLossy.value() if self.spinLossy.value() > 0 else None,
             text_overlay=text_overlay,
+            auto_crop=self.chkAutoCrop.isChecked(),
+            pipeline=pipeline,
+            encoder=encoder,
+            optimize_frames=self.chkOptimizeFrames.isChecked(),
+            palette_engine=palette_engine,
+            dedupe_threshold=self.spinDedupe.value(),
+            segment_palettes=segment_palettes,
         )
 
         return profile
@@ -1099,6 +1468,10 @@ class MainWindow(QtWidgets.QMainWindow):
         # Get segments
         segments = self.segmentModel.all_segments_in_global_order()
 
+        if mode == ExportMode.BATCH:
+            self._start_batch_export(segments)
+            return
+
         # For full video mode, create a segment covering entire video
         if mode == ExportMode.FULL_VIDEO:
             if self.fileModel.rowCount() == 0:
@@ -1137,7 +1510,19 @@ class MainWindow(QtWidgets.QMainWindow):
             profile=profile,
             output_path=dest,
             mode=mode,
+            max_workers=self.spinWorkers.value(),
+            cache_dir=default_cache_dir() if self.chkClipCache.isChecked() else None,
+            cache_max_mb=self.spinCacheSize.value(),
+            reverse_memory_mb=self.spinReverseMemory.value(),
+            frame_store_dir=self._frame_store_dir(),
+            frame_store_mb=self.spinFrameStoreSize.value(),
+            crop_filters=self._crop_filters(),
+            source_info=self._source_info(),
         )
+        previous = self._export_history.find_retimable(task)
+        if previous:
+            task.retime_from = previous.task.output_path
+        self._export_task = task
 
         # Start export
         self._exporter = GifExporter(task)
@@ -1153,6 +1538,76 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self._thread_pool.start(self._exporter)
 
+    def _start_batch_export(self, segments: List[Segment]) -> None:
+        """Export one GIF per segment (or per file without segments) into a directory"""
+        last_dir = QtCore.QSettings().value("batch_dir", os.path.expanduser("~"))
+        out_dir = QtWidgets.QFileDialog.getExistingDirectory(self, "Export GIFs To", last_dir)
+        if not out_dir:
+            return
+        QtCore.QSettings().setValue("batch_dir", out_dir)
+
+        tasks = build_batch_tasks(
+            self._ff_bins["ffmpeg"],
+            self.fileModel.files(),
+            segments,
+            self._build_export_profile(),
+            out_dir,
+            self.txtBatchTemplate.text().strip() or DEFAULT_NAME_TEMPLATE,
+            cache_dir=default_cache_dir() if self.chkClipCache.isChecked() else None,
+            cache_max_mb=self.spinCacheSize.value(),
+            reverse_memory_mb=self.spinReverseMemory.value(),
+            frame_store_dir=self._frame_store_dir(),
+            frame_store_mb=self.spinFrameStoreSize.value(),
+            crop_filters=self._crop_filters(),
+            source_info=self._source_info(),
+        )
+        if not tasks:
+            QtWidgets.QMessageBox.information(self, "Nothing to export", "No segments or ready files to export.")
+            return
+
+        shared_palette = self.chkSharedPalette.isChecked()
+        conflicts = shared_palette_conflicts(tasks) if shared_palette else []
+        if conflicts:
+            reply = QtWidgets.QMessageBox.question(
+                self, "Shared palette not possible",
+                "These GIFs cannot share one palette: " + "; ".join(conflicts) + ".\n\n"
+                "Export them with a palette each instead?",
+            )
+            if reply != QtWidgets.QMessageBox.StandardButton.Yes:
+                return
+            shared_palette = False
+
+        self._exporter = BatchExporter(
+            tasks,
+            cpu_budget=self.spinWorkers.value(),
+            shared_palette=shared_palette,
+        )
+        self._exporter.progressChanged.connect(self._on_export_progress)
+        self._exporter.logLine.connect(self._append_log)
+        self._exporter.finished.connect(self._on_batch_finished)
+
+        self.progress.setValue(0)
+        self.lblStage.setText("Starting...")
+        self.btnCancel.setEnabled(True)
+        self.btnExport.setEnabled(False)
+        self._log_dock.show()
+
+        self._thread_pool.start(self._exporter)
+
+    def _on_batch_finished(self, ok: bool, message: str, size_mb: float) -> None:
+        """Handle batch export completion"""
+        self.btnCancel.setEnabled(False)
+        self.btnExport.setEnabled(True)
+        self.lblStage.setText("Done" if ok else "Failed")
+
+        if ok:
+            QtWidgets.QMessageBox.information(
+                self, "Batch export complete",
+                f"{message}\n\nTotal size: {format_size_mb(size_mb)}"
+            )
+        else:
+            QtWidgets.QMessageBox.warning(self, "Batch export failed", message)
+
     def _on_export_progress(self, value: int, stage: str) -> None:
         """Update export progress"""
         self.progress.setValue(value)
@@ -1165,6 +1620,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.lblStage.setText("Done" if ok else "Failed")
 
         if ok:
+            self._export_history.add(self._export_task)
             size_str = format_size_mb(size_mb)
             QtWidgets.QMessageBox.information(
                 self, "Export complete",
@@ -0,0 +1,95 @@
+"""Tests for batch task building and output names"""
+
+from dataclasses import replace
+
+import pytest
+
+from gif_converter.ffmpeg.batch import build_batch_tasks, format_output_name, shared_palette_conflicts
+from gif_converter.models.media import GifExportProfile, MediaFile, MediaInfo, Segment
+
+
+def media_file(file_id, path, width=1280, height=720, duration=10.0):
+    info = MediaInfo(width, height, 30, 1, duration, "h264", "yuv420p")
+    return MediaFile(id=file_id, path=path, info=info)
+
+
+@pytest.mark.parametrize("template, expected", [
+    ("{name}_{index:03d}", "clip_007.gif"),
+    ("{name}-{file_index}-{start:.1f}-{end:.1f}", "clip-2-1.5-4.0.gif"),
+    ("already.GIF", "already.GIF"),
+    ("{unknown}", "clip_007.gif"),  # Falls back to the default template
+    ("{name", "clip_007.gif"),
+    ('a<b>c:d"e/f\\g|h?i*j', "a_b_c_d_e_f_g_h_i_j.gif"),
+    ("tab\there", "tab_here.gif"),
+    ("  ", "gif_007.gif"),
+])
+def test_format_output_name(template, expected):
+    seg = Segment("s", "f", 1.5, 4.0, 7)
+    assert format_output_name(template, media_file("f", "/videos/clip.mp4"), seg, 7, 2) == expected
+
+
+def test_batch_names_stay_unique():
+    files = [media_file("a", "/one/clip.mp4"), media_file("b", "/two/CLIP.mp4")]
+    segments = [
+        Segment("1", "a", 0.0, 1.0, 1),
+        Segment("2", "a", 2.0, 3.0, 2),
+        Segment("3", "b", 0.0, 1.0, 3),
+    ]
+    tasks = build_batch_tasks("ffmpeg", files, segments, GifExportProfile(), "/out", "{name}")
+    names = [task.output_path.replace("\\", "/") for task in tasks]
+    assert names == ["/out/clip.gif", "/out/clip_2.gif", "/out/CLIP_3.gif"]
+
+
+def test_files_without_segments_are_exported_whole():
+    files = [media_file("a", "/v/a.mp4"), media_file("b", "/v/b.mp4", duration=4.0)]
+    tasks = build_batch_tasks("ffmpeg", files, [Segment("1", "a", 1.0, 2.0, 1)], GifExportProfile(), "/out")
+    assert [(s.file_id, s.start, s.end) for t in tasks for s in t.segments] == [("a", 1.0, 2.0), ("b", 0.0, 4.0)]
+
+
+def batch(files, profile=None):
+    segments = [Segment(str(i), f.id, 0.0, 1.0, i) for i, f in enumerate(files, start=1)]
+    return build_batch_tasks(
+        "ffmpeg", files, segments, profile or GifExportProfile(), "/out",
+        source_info={f.id: f.info for f in files},
+    )
+
+
+def test_shared_palette_same_settings_and_size():
+    tasks = batch([media_file("a", "/v/a.mp4"), media_file("b", "/v/b.mp4")])
+    assert shared_palette_conflicts(tasks) == []
+    assert shared_palette_conflicts([]) == []
+
+
+@pytest.mark.parametrize("change", [{"colors": 64}, {"palette_engine": "sampled"}, {"dither": "bayer"}])
+def test_shared_palette_mixed_settings(change):
+    tasks = batch([media_file("a", "/v/a.mp4"), media_file("b", "/v/b.mp4")])
+    tasks[1] = replace(tasks[1], profile=replace(tasks[1].profile, **change))
+    assert shared_palette_conflicts(tasks) == ["the GIFs use different export settings"]
+
+
+def test_shared_palette_mixed_frame_sizes():
+    files = [media_file("a", "/v/a.mp4"), media_file("b", "/v/b.mp4", 640, 480)]
+    assert shared_palette_conflicts(batch(files)) == ["the GIFs have different frame sizes (640x480, 1280x720)"]
+    # A fixed width scales both to the same width, but the heights still differ
+    conflicts = shared_palette_conflicts(batch(files, GifExportProfile(width=480)))
+    assert conflicts == ["the GIFs have different frame sizes (480x270, 480x360)"]
+    # Same aspect ratio: both scale to the same size
+    files[1] = media_file("b", "/v/b.mp4", 640, 360)
+    assert shared_palette_conflicts(batch(files, GifExportProfile(width=480))) == []
+
+
+def test_shared_palette_unknown_sizes_are_not_checked():
+    files = [media_file("a", "/v/a.mp4"), media_file("b", "/v/b.mp4", 640, 480)]
+    tasks = batch(files)
+    tasks[1] = replace(tasks[1], source_info={})
+    assert shared_palette_conflicts(tasks) == []
+
+
+def test_shared_palette_sizes_after_auto_crop():
+    files = [media_file("a", "/v/a.mp4"), media_file("b", "/v/b.mp4", 1280, 960)]
+    profile = GifExportProfile(auto_crop=True)
+    tasks = [replace(t, crop_filters={"a": "", "b": "crop=1280:720:0:120"}) for t in batch(files, profile)]
+    assert shared_palette_conflicts(tasks) == []
+    # A crop that was not detected yet leaves the size unknown
+    tasks = [replace(t, crop_filters={"a": ""}) for t in tasks]
+    assert shared_palette_conflicts(tasks) == []
@@ -0,0 +1,140 @@
+"""Tests for the built-in GIF encoder: LZW code streams and file layout"""
+
+import io
+import random
+import struct
+
+import numpy as np
+import pytest
+
+from gif_converter.gif.lzw import color_distances, lossy_threshold, lzw_encode
+from gif_converter.gif.writer import GifWriter, graphic_control_block, sub_blocks
+
+
+def lzw_decode(data: bytes, min_code_size: int) -> bytes:
+    """Reference GIF LZW decoder (the variable code width of giflib and browsers)"""
+    clear = 1 << min_code_size
+    end = clear + 1
+    stream = int.from_bytes(data, "little")
+    pos = 0
+    code_size = min_code_size + 1
+    table = []
+    prev = None
+    out = bytearray()
+    while True:
+        code = (stream >> pos) & ((1 << code_size) - 1)
+        pos += code_size
+        assert pos <= len(data) * 8, "code stream ended without an end code"
+        if code == clear:
+            table = [bytes((i,)) for i in range(clear)] + [b"", b""]
+            code_size = min_code_size + 1
+            prev = None
+            continue
+        if code == end:
+            return bytes(out)
+        if code < len(table):
+            entry = table[code]
+            if prev is not None and len(table) < 4096:
+                table.append(prev + entry[:1])
+        else:
+            assert code == len(table) and prev is not None, f"invalid code {code}"
+            entry = prev + prev[:1]
+            table.append(entry)
+        out += entry
+        prev = entry
+        if len(table) == (1 << code_size) and code_size < 12:
+            code_size += 1
+
+
+def noise(count: int, colors: int, seed: int, run: int = 1) -> bytes:
+    """Random indices, each repeated run times"""
+    rng = random.Random(seed)
+    return bytes(rng.randrange(colors) for _ in range(count // run) for _ in range(run))
+
+
+@pytest.mark.parametrize("min_code_size", [2, 3, 5, 8])
+@pytest.mark.parametrize("count", [0, 1, 2, 3, 7, 8, 9, 255, 1000])
+def test_lossless_round_trip_small(min_code_size, count):
+    indices = noise(count, 1 << min_code_size, seed=count)
+    assert lzw_decode(lzw_encode(indices, min_code_size), min_code_size) == indices
+
+
+@pytest.mark.parametrize("min_code_size", [2, 4, 8])
+def test_lossless_round_trip_through_table_resets(min_code_size):
+    # Enough distinct strings to fill the 4096-entry table several times,
+    # so the codes cross every width up to 12 bits and the encoder clears
+    indices = noise(60000, 1 << min_code_size, seed=min_code_size)
+    data = lzw_encode(indices, min_code_size)
+    assert lzw_decode(data, min_code_size) == indices
+
+
+def test_lossless_round_trip_long_runs():
+    # Repeated strings hit the KwKwK case (a code used as soon as it is made)
+    indices = bytes([1]) * 5000 + noise(5000, 4, seed=7, run=50) + bytes([0, 1] * 3000)
+    assert lzw_decode(lzw_encode(indices, 2), 2) == indices
+
+
+@pytest.mark.parametrize("lossy", [20, 80, 200])
+def test_lossy_keeps_every_pixel_within_threshold(lossy):
+    rng = np.random.default_rng(lossy)
+    palette = rng.integers(0, 256, size=(256, 3), dtype=np.uint8)
+    distances = color_distances(palette)
+    threshold = lossy_threshold(lossy)
+    indices = noise(40000, 256, seed=lossy, run=4)
+
+    data = lzw_encode(indices, 8, distances, threshold)
+    decoded = lzw_decode(data, 8)
+
+    assert len(decoded) == len(indices)
+    assert all(distances[a][b] <= threshold for a, b in zip(indices, decoded))
+    assert len(data) <= len(lzw_encode(indices, 8))
+
+
+def test_lossy_zero_is_lossless():
+    palette = np.arange(16 * 3, dtype=np.uint8).reshape(16, 3)
+    indices = noise(5000, 16, seed=3)
+    data = lzw_encode(indices, 4, color_distances(palette), lossy_threshold(0))
+    assert data == lzw_encode(indices, 4)
+    assert lzw_decode(data, 4) == indices
+
+
+def test_sub_blocks():
+    data = bytes(range(256)) * 3
+    framed = sub_blocks(data)
+    assert framed[0] == 255 and framed[256] == 255 and framed[512] == 255
+    assert framed[768] == 768 - 3 * 255
+    assert framed[-1] == 0
+    assert len(framed) == len(data) + 4 + 1
+
+
+def test_writer_header_loop_and_frame():
+    palette = np.array([[0, 0, 0], [255, 0, 0], [0, 255, 0], [0, 0, 255]], dtype=np.uint8)
+    indices = bytes([0, 1, 2, 3] * 6)
+    out = io.BytesIO()
+    writer = GifWriter(out, 6, 4, palette, loop_count=3)
+    writer.write_frame(lzw_encode(indices, writer.min_code_size), delay_cs=7)
+    writer.close()
+    gif = out.getvalue()
+
+    assert gif[:6] == b"GIF89a"
+    width, height, flags = struct.unpack_from("<HHB", gif, 6)
+    assert (width, height) == (6, 4)
+    assert flags & 0x80 and flags & 7 == 1  # Global table of 2 ** (1 + 1) colors
+    assert gif[13:25] == palette.tobytes()
+    assert gif[25:44] == b"\x21\xff\x0bNETSCAPE2.0\x03\x01\x03\x00\x00"
+    pos = 44
+    assert gif[pos:pos + 8] == graphic_control_block(7)
+    assert struct.unpack_from("<HHHH", gif, pos + 9) == (0, 0, 6, 4)
+    assert gif[pos + 18] == writer.min_code_size == 2
+    assert gif[-1:] == b"\x3b"
+
+
+@pytest.mark.parametrize("loop_count, block", [
+    (0, b"\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00"),
+    (-1, b""),
+])
+def test_writer_loop_extension(loop_count, block):
+    palette = np.zeros((2, 3), dtype=np.uint8)
+    out = io.BytesIO()
+    GifWriter(out, 1, 1, palette, loop_count=loop_count).close()
+    assert out.getvalue()[13 + 6:] == block + b"\x3b"
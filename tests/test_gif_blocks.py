@@ -0,0 +1,159 @@
+"""Tests for block-level GIF reading, stitching and rewriting"""
+
+import struct
+
+import pytest
+
+from gif_converter.ffmpeg.gif_blocks import pad_gif_duration, read_gif_blocks, retime_gif, stitch_gifs
+from gif_converter.gif.lzw import lzw_encode
+from gif_converter.gif.writer import sub_blocks
+
+WIDTH, HEIGHT = 4, 2
+RED = bytes([255, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0])
+GREEN = bytes([0, 255, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0])
+BLUE = bytes([0, 0, 255, 0, 0, 0, 0, 0, 0, 0, 0, 0])
+NETSCAPE = b"\x21\xff\x0bNETSCAPE2.0"
+
+
+def make_gif(path, palette, frames, loop_count=0):
+    """
+    Write a 4x2 GIF with a 4-color global table.
+
+    Args:
+        frames: (delay in cs, local color table or None) per frame
+    """
+    out = [b"GIF89a", struct.pack("<HHBBB", WIDTH, HEIGHT, 0x80 | 0x10 | 1, 0, 0), palette]
+    if loop_count >= 0:
+        out.append(NETSCAPE + b"\x03\x01" + struct.pack("<H", loop_count) + b"\x00")
+    for delay, local in frames:
+        out.append(b"\x21\xf9\x04\x00" + struct.pack("<H", delay) + b"\x00\x00")
+        out.append(struct.pack("<BHHHHB", 0x2C, 0, 0, WIDTH, HEIGHT, 0x81 if local else 0))
+        out.append(local or b"")
+        out.append(b"\x02" + sub_blocks(lzw_encode(bytes([0, 1, 2, 3] * 2), 2)))
+    out.append(b"\x3b")
+    path.write_bytes(b"".join(out))
+    return str(path)
+
+
+def delays(data):
+    """Frame delays of a GIF in cs"""
+    result = []
+    for image in read_gif_blocks(data).images:
+        ext = image.extensions.rfind(b"\x21\xf9\x04")
+        result.append(struct.unpack_from("<H", image.extensions, ext + 4)[0])
+    return result
+
+
+def test_read_gif_blocks(tmp_path):
+    data = open(make_gif(tmp_path / "a.gif", RED, [(4, None), (6, BLUE)], loop_count=2), "rb").read()
+    blocks = read_gif_blocks(data)
+    assert blocks.screen == data[6:13]
+    assert blocks.color_table == RED
+    assert blocks.header_extensions == NETSCAPE + b"\x03\x01\x02\x00\x00"
+    assert [image.color_table for image in blocks.images] == [b"", BLUE]
+    assert blocks.header_size + sum(image.size for image in blocks.images) == len(data) - 1
+    assert delays(data) == [4, 6]
+
+
+def test_read_gif_blocks_rejects_other_files():
+    with pytest.raises(ValueError):
+        read_gif_blocks(b"\x89PNG\r\n\x1a\n" + bytes(16))
+
+
+def test_stitch_keeps_every_file_s_colors(tmp_path):
+    first = make_gif(tmp_path / "a.gif", RED, [(4, None), (5, BLUE)], loop_count=3)
+    second = make_gif(tmp_path / "b.gif", GREEN, [(6, None), (7, BLUE), (8, None)], loop_count=0)
+    output = str(tmp_path / "out.gif")
+
+    assert stitch_gifs([first, second], output) == 5
+
+    data = open(output, "rb").read()
+    blocks = read_gif_blocks(data)
+    assert blocks.color_table == RED
+    # Frames of the second file that used its global table now carry it locally
+    assert [image.color_table for image in blocks.images] == [b"", BLUE, GREEN, BLUE, GREEN]
+    assert delays(data) == [4, 5, 6, 7, 8]
+    # One loop extension, the first file's
+    assert data.count(NETSCAPE) == 1
+    assert blocks.header_extensions == NETSCAPE + b"\x03\x01\x03\x00\x00"
+    assert data.endswith(b"\x3b")
+
+
+def test_stitch_same_global_table_adds_no_local_tables(tmp_path):
+    paths = [make_gif(tmp_path / f"{i}.gif", RED, [(4, None)]) for i in range(3)]
+    output = str(tmp_path / "out.gif")
+    assert stitch_gifs(paths, output) == 3
+    data = open(output, "rb").read()
+    assert all(not image.color_table for image in read_gif_blocks(data).images)
+    assert data.count(NETSCAPE) == 1
+
+
+def test_stitch_rejects_other_canvas_sizes(tmp_path):
+    first = make_gif(tmp_path / "a.gif", RED, [(4, None)])
+    second = tmp_path / "b.gif"
+    data = bytearray(open(make_gif(second, RED, [(4, None)]), "rb").read())
+    data[6:8] = struct.pack("<H", WIDTH * 2)
+    second.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        stitch_gifs([first, str(second)], str(tmp_path / "out.gif"))
+
+
+@pytest.mark.parametrize("old_loop, new_loop", [(0, 5), (3, 0), (2, -1), (-1, 4)])
+def test_retime_rewrites_only_the_loop_count(tmp_path, old_loop, new_loop):
+    path = make_gif(tmp_path / "a.gif", RED, [(4, None), (6, BLUE), (8, None)], loop_count=old_loop)
+    output = str(tmp_path / "out.gif")
+
+    assert retime_gif(path, output, new_loop) == 3
+
+    before = read_gif_blocks(open(path, "rb").read())
+    data = open(output, "rb").read()
+    after = read_gif_blocks(data)
+    assert data.count(NETSCAPE) == (new_loop >= 0)
+    if new_loop >= 0:
+        assert after.header_extensions == NETSCAPE + b"\x03\x01" + struct.pack("<H", new_loop) + b"\x00"
+    assert (after.screen, after.color_table) == (before.screen, before.color_table)
+    assert [image.to_bytes() for image in after.images] == [image.to_bytes() for image in before.images]
+
+
+def test_retime_in_place(tmp_path):
+    path = make_gif(tmp_path / "a.gif", RED, [(4, None), (6, BLUE)], loop_count=0)
+    frames = read_gif_blocks(open(path, "rb").read()).images
+
+    assert retime_gif(path, path, 7) == 2
+
+    blocks = read_gif_blocks(open(path, "rb").read())
+    assert blocks.header_extensions == NETSCAPE + b"\x03\x01\x07\x00\x00"
+    assert blocks.images == frames
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.gif"]
+
+
+def test_retime_leaves_output_alone_on_bad_input(tmp_path):
+    path = tmp_path / "a.gif"
+    make_gif(path, RED, [(4, None)])
+    path.write_bytes(path.read_bytes()[:-8])  # Truncated mid-frame
+    output = tmp_path / "out.gif"
+    output.write_bytes(b"old")
+
+    with pytest.raises(ValueError):
+        retime_gif(str(path), str(output), 1)
+    assert output.read_bytes() == b"old"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.gif", "out.gif"]
+
+
+def test_pad_lengthens_the_last_frame_in_place(tmp_path):
+    path = make_gif(tmp_path / "a.gif", RED, [(4, None), (6, BLUE), (5, None)])
+    size = len(open(path, "rb").read())
+
+    assert pad_gif_duration(path, 25) == 10
+
+    data = open(path, "rb").read()
+    assert delays(data) == [4, 6, 15]
+    assert len(data) == size
+
+
+def test_pad_leaves_long_enough_files_alone(tmp_path):
+    path = make_gif(tmp_path / "a.gif", RED, [(4, None), (6, None)])
+    data = open(path, "rb").read()
+    assert pad_gif_duration(path, 10) == 0
+    assert pad_gif_duration(path, 3) == 0
+    assert open(path, "rb").read() == data
@@ -0,0 +1,48 @@
+"""Tests for finding earlier exports that only need a new loop count"""
+
+from dataclasses import replace
+
+from gif_converter.ffmpeg.engine import GifExportTask
+from gif_converter.ffmpeg.history import ExportHistory
+from gif_converter.models.media import ExportMode, GifExportProfile, Segment
+
+
+def export(tmp_path, **profile):
+    source = tmp_path / "video.mp4"
+    if not source.exists():
+        source.write_bytes(b"video")
+    output = tmp_path / "out.gif"
+    output.write_bytes(b"GIF89a")
+    return GifExportTask(
+        ffmpeg="ffmpeg",
+        segments=[Segment("s", "f", 1.0, 3.0, 1)],
+        file_lookup={"f": str(source)},
+        profile=GifExportProfile(**profile),
+        output_path=str(output),
+        mode=ExportMode.SINGLE_SEGMENT,
+    )
+
+
+def test_loop_count_and_labels_are_retimable(tmp_path):
+    history = ExportHistory()
+    task = export(tmp_path, loop_count=0)
+    history.add(task)
+    again = replace(task, profile=replace(task.profile, loop_count=5, preset_name="Other", target_max_size_mb=8.0))
+    assert history.find_retimable(again).task is task
+
+
+def test_speed_changes_the_frames(tmp_path):
+    history = ExportHistory()
+    task = export(tmp_path)
+    history.add(task)
+    faster = replace(task, profile=replace(task.profile, speed_multiplier=2.0))
+    assert history.find_retimable(faster) is None
+
+
+def test_changed_output_is_not_reused(tmp_path):
+    history = ExportHistory()
+    task = export(tmp_path)
+    history.add(task)
+    with open(task.output_path, "ab") as f:
+        f.write(b"edited")
+    assert history.find_retimable(replace(task, profile=replace(task.profile, loop_count=2))) is None
@@ -0,0 +1,127 @@
+"""Tests for the target-size solver, with trial encodes replaced by a size model"""
+
+from dataclasses import replace
+
+import pytest
+
+from gif_converter.ffmpeg import solver
+from gif_converter.ffmpeg.estimator import SizeEstimate
+from gif_converter.ffmpeg.solver import TargetSizeSolver, quality_score, relative_size
+from gif_converter.models.media import GifExportProfile, Segment
+
+SOURCE_WIDTH, SOURCE_HEIGHT = 1280, 720
+DURATION = 10.0
+MB_PER_MODEL_UNIT = 3e-7  # The "true" scale the solver has to calibrate
+
+
+def model(profile):
+    return relative_size(profile, DURATION, SOURCE_WIDTH, SOURCE_WIDTH / SOURCE_HEIGHT)
+
+
+class FakeEstimator:
+    """Stands in for SizeEstimator: sizes follow the model, times a per-test error"""
+
+    error = staticmethod(lambda profile: 1.0)
+    trials = []
+
+    def __init__(self, ffmpeg, segments, file_lookup, **kwargs):
+        pass
+
+    def estimate(self, profile):
+        FakeEstimator.trials.append(profile)
+        size = MB_PER_MODEL_UNIT * model(profile) * FakeEstimator.error(profile)
+        return SizeEstimate(size_mb=size, low_mb=size * 0.98, high_mb=size * 1.02, samples=5)
+
+    def cancel(self):
+        pass
+
+
+@pytest.fixture
+def make_solver(monkeypatch):
+    monkeypatch.setattr(solver, "SizeEstimator", FakeEstimator)
+    monkeypatch.setattr(FakeEstimator, "trials", [])
+    monkeypatch.setattr(FakeEstimator, "error", staticmethod(lambda profile: 1.0))
+
+    def make(**kwargs):
+        logs = []
+        return TargetSizeSolver(
+            "ffmpeg",
+            [Segment("s", "f", 0.0, DURATION, 0)],
+            {"f": "video.mp4"},
+            SOURCE_WIDTH,
+            SOURCE_HEIGHT,
+            max_workers=4,
+            on_log=logs.append,
+            **kwargs,
+        ), logs
+    return make
+
+
+START = GifExportProfile(width=SOURCE_WIDTH, fps=20, colors=256, dither="sierra2_4a")
+
+
+def test_fitting_settings_are_kept(make_solver):
+    target_solver, _ = make_solver()
+    target = MB_PER_MODEL_UNIT * model(START) * 1.5
+    result = target_solver.solve(START, target)
+    assert result.profile == START
+    assert result.trials == 1
+
+
+def test_calibrated_model_picks_the_best_fitting_grid_point(make_solver):
+    target_solver, _ = make_solver(parallel=3)
+    target = MB_PER_MODEL_UNIT * model(START) / 4
+
+    result = target_solver.solve(START, target)
+
+    # One calibration trial of the starting settings, then a single round
+    assert FakeEstimator.trials[0] == START
+    assert result.trials == 4
+    assert result.estimate.high_mb <= target
+    # The winner is the best-looking grid point the calibrated model says fits
+    grid = target_solver._candidates(START)
+    predicted = [c for c in grid if MB_PER_MODEL_UNIT * model(c) <= target * 0.95]
+    best = max(predicted, key=lambda c: quality_score(c, SOURCE_WIDTH))
+    assert quality_score(result.profile, SOURCE_WIDTH) == quality_score(best, SOURCE_WIDTH)
+    # Trials ran in quality order, and none exceeded the starting settings
+    scores = [quality_score(p, SOURCE_WIDTH) for p in FakeEstimator.trials[1:]]
+    assert scores == sorted(scores, reverse=True)
+    for p in FakeEstimator.trials:
+        assert p.width <= START.width and p.fps <= START.fps and p.colors <= START.colors
+
+
+def test_underestimates_recalibrate_the_model(make_solver):
+    # Everything but the starting settings comes out 60% larger than the model says
+    FakeEstimator.error = staticmethod(lambda profile: 1.0 if profile == START else 1.6)
+    target_solver, logs = make_solver(parallel=2)
+    target = MB_PER_MODEL_UNIT * model(START) / 4
+
+    result = target_solver.solve(START, target)
+
+    assert result is not None
+    assert result.estimate.high_mb <= target
+    assert any(line.startswith("Round 2") for line in logs)
+    assert result.trials == 1 + 2 + 2
+
+
+def test_nothing_fits(make_solver):
+    FakeEstimator.error = staticmethod(lambda profile: 1.0 if profile == START else 100.0)
+    target_solver, logs = make_solver(parallel=2, max_rounds=2)
+    assert target_solver.solve(START, MB_PER_MODEL_UNIT * model(START) / 4) is None
+    assert logs[-1].startswith("No tried settings fit")
+
+
+def test_cancelled_solver_runs_no_trials(make_solver):
+    target_solver, _ = make_solver()
+    target_solver.cancel()
+    assert target_solver.solve(START, 1.0) is None
+    assert FakeEstimator.trials == []
+
+
+def test_candidates_never_exceed_the_start(make_solver):
+    target_solver, _ = make_solver()
+    start = replace(START, width=640, fps=12, colors=128)
+    grid = target_solver._candidates(start)
+    assert start in grid
+    assert all(c.width <= 640 and c.fps <= 12 and c.colors <= 128 for c in grid)
+    assert {c.dither for c in grid} == {"sierra2_4a", "bayer", "none"}